@@ -0,0 +1,159 @@
+'''
+Stand-in for 'nrfutil device' used by the benchmarks. The latency of every invocation is emulated with
+FAKE_NRFUTIL_ATTACH (J-Link attach, seconds) and FAKE_NRFUTIL_OP (per operation, seconds) on top of the
+real process start-up. FAKE_NRFUTIL_SNRS lists the debuggers and FAKE_NRFUTIL_DEVICE the device version.
+Programmed and written words are kept per SNR in FAKE_NRFUTIL_STATE so they can be read back, writes can only
+clear bits like on the real NVM.
+Operations print JSON lines progress messages, FAKE_NRFUTIL_LOW_VOLTAGE lists SNRs that report low voltage
+on stderr and then hang until FAKE_NRFUTIL_TIMEOUT, like nrfutil retrying the connection.
+'''
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loguru import logger
+from src.modules.intel_hex import IntelHex
+
+# Anything on stderr is an nrfutil error
+logger.remove()
+
+ATTACH_LATENCY = float(os.environ.get('FAKE_NRFUTIL_ATTACH', '0.05'))
+OP_LATENCY = float(os.environ.get('FAKE_NRFUTIL_OP', '0.01'))
+SNRS = [snr for snr in os.environ.get('FAKE_NRFUTIL_SNRS', '1000000001').split(',') if snr]
+DEVICE_VERSION = os.environ.get('FAKE_NRFUTIL_DEVICE', 'NRF52840_xxAA_REV3')
+STATE_DIR = os.environ.get('FAKE_NRFUTIL_STATE')
+LOW_VOLTAGE = [snr for snr in os.environ.get('FAKE_NRFUTIL_LOW_VOLTAGE', '').split(',') if snr]
+TIMEOUT = float(os.environ.get('FAKE_NRFUTIL_TIMEOUT', '5'))
+PROGRESS_STEPS = ['Erasing', 'Programming', 'Verifying']
+# UICR and OTP of all supported devices are above this address, flash below
+UICR_START = 0x00FF8000
+
+
+def option(args: list, name: str, default=None):
+    if name in args and args.index(name) + 1 < len(args):
+        return args[args.index(name) + 1]
+    return default
+
+
+def load_memory(snr: str) -> dict:
+    if not STATE_DIR or not os.path.exists(os.path.join(STATE_DIR, f'{snr}.json')):
+        return {}
+    with open(os.path.join(STATE_DIR, f'{snr}.json'), 'r') as f:
+        return json.load(f)
+
+
+def save_memory(snr: str, memory: dict):
+    if STATE_DIR:
+        with open(os.path.join(STATE_DIR, f'{snr}.json'), 'w') as f:
+            json.dump(memory, f)
+
+
+def progress(name: str, description: str, percentage: int, step: int, steps: int):
+    message = {
+        'type': 'task_progress',
+        'data': {
+            'taskId': '1',
+            'progress': {
+                'name': name,
+                'description': description,
+                'progressPercentage': percentage,
+                'step': step,
+                'amountOfSteps': steps,
+            },
+        },
+    }
+    print(json.dumps(message), flush=True)
+
+
+def execute(args: list, snr: str) -> dict:
+    device = {'serialNumber': snr}
+    time.sleep(OP_LATENCY)
+    match args[0]:
+        case 'program':
+            memory = load_memory(snr)
+            for addr, data in IntelHex.from_file(option(args, '--firmware')).segments():
+                data = b'\xff' * (addr % 4) + data + b'\xff' * ((-(addr + len(data))) % 4)
+                for offset in range(0, len(data), 4):
+                    memory[str(addr - addr % 4 + offset)] = int.from_bytes(data[offset : offset + 4], 'little')
+            save_memory(snr, memory)
+            for step, description in enumerate(PROGRESS_STEPS, 1):
+                for percentage in (0, 50, 100):
+                    progress('program', description, percentage, step, len(PROGRESS_STEPS))
+        case 'device-info':
+            device['deviceInfo'] = {
+                'jlink': {
+                    'deviceVersion': DEVICE_VERSION,
+                    'deviceFamily': DEVICE_VERSION[:5],
+                    'protectionStatus': 'NRFDL_PROTECTION_STATUS_NONE',
+                }
+            }
+        case 'protection-get':
+            device['protectionStatus'] = 'None'
+        case 'x-read':
+            addr = int(option(args, '--address'), 16)
+            length = int(option(args, '--bytes', '4'))
+            memory = load_memory(snr)
+            values = []
+            for word_addr in range(addr, addr + length, 4):
+                values += list(memory.get(str(word_addr), 0xFFFFFFFF).to_bytes(4, 'little'))
+            device['memoryData'] = [{'address': addr, 'values': values[:length]}]
+        case 'x-write':
+            memory = load_memory(snr)
+            addr = str(int(option(args, '--address'), 16))
+            memory[addr] = memory.get(addr, 0xFFFFFFFF) & int(option(args, '--value'), 16)
+            save_memory(snr, memory)
+        case 'erase' if '--uicr' in args:
+            save_memory(snr, {addr: value for addr, value in load_memory(snr).items() if int(addr) < UICR_START})
+        case 'recover' | 'erase':
+            save_memory(snr, {})
+    return device
+
+
+def main(args: list) -> int:
+    if not args or args[0] != 'device':
+        print('Only nrfutil device is emulated', file=sys.stderr)
+        return 1
+    args = args[1:]
+
+    if batch_path := option(args, '--x-append-batch'):
+        operations = []
+        if os.path.exists(batch_path):
+            with open(batch_path, 'r') as f:
+                operations = json.load(f)
+        operations.append([arg for arg in args if arg not in ('--x-append-batch', batch_path)])
+        with open(batch_path, 'w') as f:
+            json.dump(operations, f)
+        return 0
+
+    if args[0] == 'list':
+        time.sleep(OP_LATENCY * len(SNRS))
+        print(json.dumps({'devices': [{'serialNumber': snr} for snr in SNRS]}))
+        return 0
+
+    snr = option(args, '--serial-number', SNRS[0] if SNRS else '0')
+    if snr not in SNRS:
+        print(f'Device {snr} not found', file=sys.stderr)
+        return 1
+    time.sleep(ATTACH_LATENCY)
+    if snr in LOW_VOLTAGE:
+        print('Error: Failed to connect, LOW_VOLTAGE', file=sys.stderr, flush=True)
+        time.sleep(TIMEOUT)
+        return 1
+
+    if args[0] == 'x-execute-batch':
+        with open(option(args, '--batch-path'), 'r') as f:
+            operations = json.load(f)
+        for operation in operations:
+            execute(operation, snr)
+        print(json.dumps({'devices': [{'serialNumber': snr}]}))
+        return 0
+
+    print(json.dumps({'devices': [execute(args, snr)]}))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
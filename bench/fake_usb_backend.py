@@ -0,0 +1,384 @@
+'''
+In-memory pyusb backend emulating the RF test dongle, bulk OUT endpoint 0x01 and bulk IN endpoint 0x82.
+'''
+
+import array
+import errno
+import heapq
+import struct
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace as Descriptor
+import usb.backend
+import usb.core
+import usb.util
+
+VENDOR_ID = 0x1915
+PRODUCT_ID = 0x0103
+EP_OUT = 0x01
+EP_IN = 0x82
+MAX_PACKET_SIZE = 64
+
+CMD_FIRMWARE_VERSION = 1
+CMD_SEND_PACKET = 11
+CMD_STATUS_PACKET = 12
+CMD_ACK_PAYLOAD = 13
+CMD_SET_ESB_CONFIG = 14
+CMD_SET_TARGET = 15
+CMD_BROADCAST = 16
+CMD_SEND_LONG_PACKET = 17
+CMD_SET_PROTOCOL = 18
+
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+PROTOCOL_V2_HEADER = 0xA2
+FRAME_OK = 0
+FRAME_UNKNOWN_COMMAND = 1
+FRAME_INVALID_LENGTH = 2
+FRAME_INVALID_PARAMETER = 3
+TX_RECORD_HEADER = 0xA3
+TX_RECORD = struct.Struct('<BBBBIB')
+# ESB default of 3 retransmits with 600 us delay
+ESB_ATTEMPTS = 4
+ESB_GIVE_UP = 0.0024
+
+RF_CMD_RX_STATS = 6
+RF_CMD_RX_STATS_READ = 7
+RF_CMD_START = 8
+RF_CMD_ARM = 0x80
+RF_CMD_COMMAND_WINDOWS = 0x40
+RF_CMD_CANCEL = 9
+RF_CMD_PING = 10
+RF_CMD_HOP_LIST = 11
+
+FIRMWARE_VERSION = (1, 6, 0)
+
+
+class FakeDongle:
+    '''
+    Dongle state, the DUT ACK arrives esb_latency seconds after a packet is sent if the DUT is present.
+    Payloads put in ack_payloads are returned one per ACK, like the DUT's queued ESB ACK payloads.
+    With a command_interval a DUT running a test only ACKs in a command_window every command_interval seconds,
+    and not at all if the test was started without command windows.
+    Protocol v2 packets are answered with one packet of responses, like the dongle firmware, and each packet
+    sent pushes a TX record when its ACK arrives or the retransmits give up.
+    '''
+
+    def __init__(self, serial: str = 'FAKE0001', bus: int = 1, address: int = 1):
+        self.serial = serial
+        self.bus = bus
+        self.address = address
+        self.esb_latency = 0.001
+        self.usb_latency = 0.0
+        self.dut_present = True
+        self.ack_time: float | None = None
+        self.in_queue: deque = deque()
+        self.lock = threading.Condition()
+        # (due time, packet) of the pushed IN packets
+        self.scheduled: list = []
+        self.commands = 0
+        self.ack_payloads: deque = deque()
+        self.ack_payload = b''
+        self.esb_pair = 1
+        self.esb_channel = 40
+        self.target: bytes | None = None
+        self.broadcasts = 0
+        self.command_interval = 0.0
+        self.command_window = 0.01
+        self.test_start: float | None = None
+        self.command_windows = False
+        self.armed_windows = False
+        # Answer to the last ping, returned with the ACK of the next packet
+        self.ping_answer: bytes | None = None
+        self.hop_channels: list = []
+        self.protocol = PROTOCOL_V1
+        self.sent_ack_payload = b''
+
+    def listening(self) -> bool:
+        if not self.command_interval or self.test_start is None:
+            return True
+        if not self.command_windows:
+            return False
+        period = self.command_interval + self.command_window
+        return (time.monotonic() - self.test_start) % period >= self.command_interval
+
+    def send_packet(self, payload: bytes, seq: int | None = None):
+        self.ack_payload = b''
+        self.ack_time = None
+        self.sent_ack_payload = b''
+        if not self.dut_present or not self.listening():
+            if seq is not None:
+                self.push_tx_record(seq, False, time.monotonic() + ESB_GIVE_UP)
+            return
+        self.ack_time = time.monotonic() + self.esb_latency
+        rf_cmd = payload[5]
+        if self.ping_answer is not None:
+            self.ack_payloads.append(self.ping_answer)
+            self.ping_answer = None
+        if rf_cmd == RF_CMD_HOP_LIST:
+            offset, count, total = payload[0], payload[1], payload[2]
+            self.hop_channels = (self.hop_channels + [0] * total)[:total]
+            self.hop_channels[offset : offset + count] = payload[6 : 6 + count]
+            self.test_start = None
+        elif rf_cmd == RF_CMD_PING:
+            self.ping_answer = struct.pack('<BBHI', payload[0], RF_CMD_PING, 0, 50)
+            self.test_start = None
+        elif rf_cmd in (RF_CMD_CANCEL, RF_CMD_RX_STATS, RF_CMD_RX_STATS_READ) or rf_cmd & RF_CMD_ARM:
+            self.test_start = None
+            self.armed_windows = bool(rf_cmd & RF_CMD_COMMAND_WINDOWS)
+        else:
+            self.test_start = self.ack_time
+            self.command_windows = bool(rf_cmd & RF_CMD_COMMAND_WINDOWS)
+        if self.ack_payloads:
+            self.sent_ack_payload = self.ack_payloads.popleft()
+        if seq is not None:
+            self.push_tx_record(seq, True, self.ack_time)
+
+    def push_tx_record(self, seq: int, acked: bool, due: float):
+        ack_payload = self.sent_ack_payload if acked else b''
+        record = TX_RECORD.pack(
+            TX_RECORD_HEADER,
+            seq,
+            0 if acked else 1,
+            1 if acked else ESB_ATTEMPTS,
+            int((due - time.monotonic()) * 1e6),
+            len(ack_payload),
+        )
+        heapq.heappush(self.scheduled, (due, record + ack_payload))
+
+    def deliver(self):
+        '''
+        Moves the pushed packets that are due to the IN queue.
+        '''
+        now = time.monotonic()
+        while self.scheduled and self.scheduled[0][0] <= now:
+            self.in_queue.append(heapq.heappop(self.scheduled)[1])
+
+    def status_take(self) -> bool:
+        sent = self.ack_time is not None and time.monotonic() >= self.ack_time
+        if sent:
+            self.ack_time = None
+            self.ack_payload = self.sent_ack_payload
+        return sent
+
+    def ack_payload_take(self) -> bytes:
+        payload, self.ack_payload = self.ack_payload, b''
+        return payload
+
+    def broadcast(self, payload: bytes):
+        self.broadcasts += 1
+        if payload[5] == RF_CMD_START:
+            self.test_start = time.monotonic()
+            self.command_windows = self.armed_windows
+
+    def handle(self, data: bytes):
+        self.commands += 1
+        if not data:
+            return
+        if self.protocol == PROTOCOL_V2 and data[0] == PROTOCOL_V2_HEADER:
+            self.handle_frames(data)
+            return
+        usb_cmd = data[-1]
+        if usb_cmd == CMD_FIRMWARE_VERSION:
+            self.in_queue.append(bytes([0, *FIRMWARE_VERSION]))
+        elif usb_cmd == CMD_SEND_PACKET:
+            self.send_packet(data[:6])
+        elif usb_cmd == CMD_SEND_LONG_PACKET:
+            self.send_packet(data[:-1])
+        elif usb_cmd == CMD_STATUS_PACKET:
+            self.in_queue.append(bytes([self.status_take()]))
+        elif usb_cmd == CMD_SET_ESB_CONFIG:
+            self.esb_pair, self.esb_channel = data[0], data[1]
+        elif usb_cmd == CMD_SET_TARGET:
+            self.target = bytes(data[:4]) if any(data[:4]) else None
+        elif usb_cmd == CMD_BROADCAST:
+            self.broadcast(data[:6])
+        elif usb_cmd == CMD_ACK_PAYLOAD:
+            payload = self.ack_payload_take()
+            self.in_queue.append(bytes([len(payload)]) + payload)
+        elif usb_cmd == CMD_SET_PROTOCOL:
+            if data[0] in (PROTOCOL_V1, PROTOCOL_V2):
+                self.protocol = data[0]
+
+    def handle_frame(self, seq: int, cmd: int, payload: bytes) -> tuple[int, bytes]:
+        if cmd == CMD_FIRMWARE_VERSION:
+            return FRAME_OK, bytes(FIRMWARE_VERSION)
+        if cmd == CMD_SEND_PACKET:
+            self.send_packet(payload, seq)
+        elif cmd == CMD_STATUS_PACKET:
+            return FRAME_OK, bytes([self.status_take()])
+        elif cmd == CMD_ACK_PAYLOAD:
+            return FRAME_OK, self.ack_payload_take()
+        elif cmd == CMD_SET_ESB_CONFIG:
+            if len(payload) < 2:
+                return FRAME_INVALID_LENGTH, b''
+            self.esb_pair, self.esb_channel = payload[0], payload[1]
+        elif cmd == CMD_SET_TARGET:
+            if len(payload) < 4:
+                return FRAME_INVALID_LENGTH, b''
+            self.target = bytes(payload[:4]) if any(payload[:4]) else None
+        elif cmd == CMD_BROADCAST:
+            self.broadcast(payload)
+        elif cmd == CMD_SET_PROTOCOL:
+            if not payload or payload[0] not in (PROTOCOL_V1, PROTOCOL_V2):
+                return FRAME_INVALID_PARAMETER, b''
+            self.protocol = payload[0]
+        else:
+            return FRAME_UNKNOWN_COMMAND, b''
+        return FRAME_OK, b''
+
+    def handle_frames(self, data: bytes):
+        response = bytearray([PROTOCOL_V2_HEADER])
+        offset = 1
+        while offset + 3 <= len(data):
+            length, seq, cmd = data[offset : offset + 3]
+            payload = data[offset + 3 : offset + 3 + length]
+            if len(payload) < length:
+                response += bytes([0, seq, cmd, FRAME_INVALID_LENGTH])
+                break
+            status, answer = self.handle_frame(seq, cmd, payload)
+            response += bytes([len(answer), seq, cmd, status]) + answer
+            offset += 3 + length
+        self.in_queue.append(bytes(response[:MAX_PACKET_SIZE]))
+
+
+class FakeBackend(usb.backend.IBackend):
+    def __init__(self, dongles: list[FakeDongle] | None = None):
+        self.dongles = dongles if dongles is not None else [FakeDongle()]
+
+    def enumerate_devices(self):
+        return iter(self.dongles)
+
+    def get_device_descriptor(self, dev):
+        return Descriptor(
+            bLength=18,
+            bDescriptorType=1,
+            bcdUSB=0x0200,
+            bDeviceClass=0,
+            bDeviceSubClass=0,
+            bDeviceProtocol=0,
+            bMaxPacketSize0=64,
+            idVendor=VENDOR_ID,
+            idProduct=PRODUCT_ID,
+            bcdDevice=0x0100,
+            iManufacturer=1,
+            iProduct=2,
+            iSerialNumber=3,
+            bNumConfigurations=1,
+            address=dev.address,
+            bus=dev.bus,
+            port_number=dev.address,
+            port_numbers=(dev.address,),
+            speed=usb.util.SPEED_FULL,
+        )
+
+    def get_configuration_descriptor(self, dev, config):
+        return Descriptor(
+            bLength=9,
+            bDescriptorType=2,
+            wTotalLength=32,
+            bNumInterfaces=1,
+            bConfigurationValue=1,
+            iConfiguration=0,
+            bmAttributes=0x80,
+            bMaxPower=50,
+            extra_descriptors=[],
+        )
+
+    def get_interface_descriptor(self, dev, intf, alt, config):
+        return Descriptor(
+            bLength=9,
+            bDescriptorType=4,
+            bInterfaceNumber=0,
+            bAlternateSetting=0,
+            bNumEndpoints=2,
+            bInterfaceClass=0xFF,
+            bInterfaceSubClass=0xFF,
+            bInterfaceProtocol=0xFF,
+            iInterface=0,
+            extra_descriptors=[],
+        )
+
+    def get_endpoint_descriptor(self, dev, ep, intf, alt, config):
+        return Descriptor(
+            bLength=7,
+            bDescriptorType=5,
+            bEndpointAddress=[EP_OUT, EP_IN][ep],
+            bmAttributes=usb.util.ENDPOINT_TYPE_BULK,
+            wMaxPacketSize=MAX_PACKET_SIZE,
+            bInterval=6,
+            bRefresh=0,
+            bSynchAddress=0,
+            extra_descriptors=[],
+        )
+
+    def open_device(self, dev):
+        return dev
+
+    def close_device(self, dev_handle):
+        pass
+
+    def set_configuration(self, dev_handle, config_value):
+        pass
+
+    def get_configuration(self, dev_handle):
+        return 1
+
+    def set_interface_altsetting(self, dev_handle, intf, altsetting):
+        pass
+
+    def claim_interface(self, dev_handle, intf):
+        pass
+
+    def release_interface(self, dev_handle, intf):
+        pass
+
+    def clear_halt(self, dev_handle, ep):
+        pass
+
+    def is_kernel_driver_active(self, dev_handle, intf):
+        return False
+
+    def bulk_write(self, dev_handle, ep, intf, data, timeout):
+        if dev_handle.usb_latency:
+            time.sleep(dev_handle.usb_latency)
+        with dev_handle.lock:
+            dev_handle.handle(bytes(data))
+            dev_handle.lock.notify_all()
+        return len(data)
+
+    def bulk_read(self, dev_handle, ep, intf, buff, timeout):
+        if dev_handle.usb_latency:
+            time.sleep(dev_handle.usb_latency)
+        deadline = time.monotonic() + timeout / 1000
+        with dev_handle.lock:
+            while True:
+                dev_handle.deliver()
+                if dev_handle.in_queue:
+                    break
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise usb.core.USBTimeoutError('Operation timed out', -7, errno.ETIMEDOUT)
+                if dev_handle.scheduled:
+                    wait = min(wait, dev_handle.scheduled[0][0] - time.monotonic())
+                dev_handle.lock.wait(max(0.0, wait))
+            data = dev_handle.in_queue.popleft()
+        length = min(len(data), len(buff))
+        buff[:length] = array.array('B', data[:length])
+        return length
+
+    def ctrl_transfer(self, dev_handle, bmRequestType, bRequest, wValue, wIndex, data, timeout):
+        # Only string descriptors are supported
+        if bRequest != 0x06 or wValue >> 8 != 0x03:
+            raise usb.core.USBError('Pipe error', -9, errno.EPIPE)
+        index = wValue & 0xFF
+        if index == 0:
+            descriptor = bytes([4, 3, 0x09, 0x04])
+        else:
+            text = {1: 'Nordic Semiconductor', 2: 'Nordic Semiconductor RF test', 3: dev_handle.serial}.get(index, '')
+            encoded = text.encode('utf-16-le')
+            descriptor = bytes([len(encoded) + 2, 3]) + encoded
+        length = min(len(descriptor), len(data))
+        data[:length] = array.array('B', descriptor[:length])
+        return length
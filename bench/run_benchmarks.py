@@ -0,0 +1,251 @@
+'''
+Offline benchmarks of the host side orchestration, run against bench/fake_nrfutil.py on PATH and the in-memory
+dongle from bench/fake_usb_backend.py, so no debugger or dongle is needed.
+
+Run from the repository root:
+    python -m bench.run_benchmarks [--iterations 20] [--json results.json]
+'''
+
+import os
+import sys
+import json
+import tempfile
+import time
+from dataclasses import replace
+from argparse import ArgumentParser
+from typing import Callable, List
+from loguru import logger
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def install_fake_nrfutil(bin_dir: str):
+    '''
+    Puts an nrfutil executable running fake_nrfutil.py first on PATH.
+    '''
+    script = os.path.join(BENCH_DIR, 'fake_nrfutil.py')
+    if sys.platform == 'win32':
+        with open(os.path.join(bin_dir, 'nrfutil.cmd'), 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(bin_dir, 'nrfutil')
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, 0o755)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(name: str, operation: Callable, iterations: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        operation()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        operation_start = time.perf_counter()
+        operation()
+        samples.append(time.perf_counter() - operation_start)
+    total = time.perf_counter() - start
+    return {
+        'name': name,
+        'iterations': iterations,
+        'mean_ms': 1000 * sum(samples) / len(samples),
+        'p50_ms': 1000 * percentile(samples, 0.50),
+        'p90_ms': 1000 * percentile(samples, 0.90),
+        'p99_ms': 1000 * percentile(samples, 0.99),
+        'max_ms': 1000 * max(samples),
+        'ops_per_s': iterations / total,
+    }
+
+
+def print_results(results: List[dict]):
+    print(f'{"operation":<34}{"n":>5}{"mean":>10}{"p50":>10}{"p90":>10}{"p99":>10}{"max":>10}{"ops/s":>10}')
+    for result in results:
+        print(
+            f'{result["name"]:<34}{result["iterations"]:>5}'
+            f'{result["mean_ms"]:>10.2f}{result["p50_ms"]:>10.2f}{result["p90_ms"]:>10.2f}'
+            f'{result["p99_ms"]:>10.2f}{result["max_ms"]:>10.2f}{result["ops_per_s"]:>10.1f}'
+        )
+    print('All times in ms')
+
+
+def run(args) -> List[dict]:
+    # Imported after PATH is set up, so the modules only ever see the fake nrfutil
+    from bench.fake_usb_backend import FakeBackend, FakeDongle
+    from src.modules.nrfutil_wrapper import API as Nrfutil
+    from src.modules import rf_test_dongle_api
+    from src.modules.rf_test_dongle_api import API as Dongle, RadioConfig
+    import src.core.logic as core
+    from src.modules.event_loop import event_loop
+
+    snrs = [int(snr) for snr in os.environ['FAKE_NRFUTIL_SNRS'].split(',')]
+    snr = snrs[0]
+
+    def fake_backend(serial: str) -> FakeBackend:
+        # One emulated dongle per connection, like a dongle claimed by one process
+        fake = FakeDongle(serial=serial, address=int(serial[-4:]))
+        fake.esb_latency = args.esb_latency
+        fake.usb_latency = args.usb_latency
+        return FakeBackend([fake])
+
+    backend = fake_backend('FAKE0001')
+    dongle = backend.dongles[0]
+
+    core.firmware_cache.path = None
+    core.device_cache.path = None
+    device = core.detect_device(snr)
+
+    def radio_config() -> RadioConfig:
+        return RadioConfig(
+            first_channel=40,
+            last_channel=80,
+            radio_power=0,
+            data_rate=3,
+            rf_cmd=0,
+            fem_config=0,
+            usb_cmd=rf_test_dongle_api.CMD_SEND_PACKET,
+        )
+
+    def session_ops():
+        debugger = Nrfutil(snr)
+        with debugger.session():
+            debugger.write(0x10001084, 0xFFFFFFFF)
+            debugger.write(0x10001088, 0xFFFFFFFF)
+            debugger.reset()
+
+    def flash_cold():
+        core.firmware_cache.invalidate(snr)
+        core.flash_device(snr, device, '', None)
+
+    def reconfigure():
+        # The test started by the previous call is running, the new config waits for a command window
+        dongle.command_interval = args.command_interval
+        try:
+            core.start_test(radio_config(), command_windows=True)
+        finally:
+            dongle.command_interval = 0.0
+
+    def dongle_open():
+        Dongle(backend=open_backend).close()
+
+    open_backend = fake_backend('FAKE0002')
+    shared_dongle = Dongle(backend=fake_backend('FAKE0003'))
+    shared_dongle.set_config(radio_config())
+    v1_dongle = Dongle(backend=fake_backend('FAKE0004'), protocol=rf_test_dongle_api.PROTOCOL_V1)
+    v1_dongle.set_config(radio_config())
+    rf_test_dongle_api.session_backend = backend
+    session = rf_test_dongle_api.get_session()
+
+    benchmarks = [
+        ('nrfutil.get_debuggers', lambda: Nrfutil().get_debuggers()),
+        ('nrfutil.get_device_version', lambda: Nrfutil(snr).get_device_version()),
+        ('nrfutil.read', lambda: Nrfutil(snr).read(0x10001084)),
+        ('nrfutil.write', lambda: Nrfutil(snr).write(0x10001084, 0xFFFFFFFF)),
+        ('nrfutil.reset', lambda: Nrfutil(snr).reset()),
+        ('nrfutil.session (2 writes, reset)', session_ops),
+        ('nrfutil.read_words (16 words)', lambda: Nrfutil(snr).read_words(0x10001080, 16)),
+        ('nrfutil.write_words (4 words)', lambda: Nrfutil(snr).write_words({0x10001084 + 4 * i: i for i in range(4)})),
+        ('core.detect_device (cached)', lambda: core.detect_device(snr)),
+        ('core.flash_device (cold)', flash_cold),
+        ('core.flash_device (warm)', lambda: core.flash_device(snr, device, '', None)),
+        ('core.flash_fleet', lambda: core.flash_fleet('', snrs=snrs)),
+        ('dongle.open', dongle_open),
+        ('dongle.get_dongle_version', shared_dongle.get_dongle_version),
+        ('dongle.send_cmd', shared_dongle.send_cmd),
+        ('dongle.send_cmd (protocol v1)', v1_dongle.send_cmd),
+        ('dongle.ping', shared_dongle.ping),
+        ('dongle.ping (protocol v1)', v1_dongle.ping),
+        ('session.send_cmd', lambda: session.send_cmd(radio_config())),
+        ('core.start_test', lambda: core.start_test(radio_config(), command_windows=True)),
+        ('core.start_test (reconfigure)', reconfigure),
+        ('core.stop_test', core.stop_test),
+        ('core.ping', core.ping),
+        (
+            'core.start_hop_sweep (40 channels)',
+            lambda: core.start_hop_sweep(
+                replace(radio_config(), rf_cmd=core.TestModes.RX_sweep.value), list(range(80, 0, -2)), 5
+            ),
+        ),
+        ('core.start_group_test', lambda: core.start_group_test(radio_config(), snrs)),
+        ('core.detect_device (sequential)', lambda: [core.detect_device(snr, refresh=True) for snr in snrs]),
+        ('core.detect_devices_async', lambda: event_loop.run(core.detect_devices_async(snrs, refresh=True))),
+        ('core.start_test_async', lambda: event_loop.run(core.start_test_async(radio_config()))),
+    ]
+
+    try:
+        import src.gui.logic as gui_logic
+
+        benchmarks += [
+            ('FlashFWTask.run', lambda: gui_logic.FlashFWTask(str(snr), '').run()),
+            (
+                'gui start_rf_test',
+                lambda: event_loop.run(
+                    gui_logic.start_rf_test(
+                        RadioConfig(
+                            first_channel='40',
+                            last_channel='80',
+                            radio_power='0',
+                            data_rate='BLE 1 Mbit',
+                            rf_cmd='Modulated TX',
+                            fem_config=0,
+                            usb_cmd=rf_test_dongle_api.CMD_SEND_PACKET,
+                        )
+                    )
+                ),
+            ),
+        ]
+    except ImportError as err:
+        logger.warning(f'Skipping QThread task benchmarks: {err}')
+
+    results = []
+    for name, operation in benchmarks:
+        if args.filter and args.filter not in name:
+            continue
+        iterations = max(1, args.iterations // 4) if 'flash' in name.lower() else args.iterations
+        results.append(measure(name, operation, iterations))
+    session.close()
+    event_loop.stop()
+    return results
+
+
+def main() -> int:
+    parser = ArgumentParser(prog='rf_test benchmarks', description='Offline benchmarks with fake nrfutil and dongle')
+    parser.add_argument('-n', '--iterations', help='Iterations per operation', type=int, default=20)
+    parser.add_argument('-k', '--filter', help='Only run operations containing this text')
+    parser.add_argument('--attach', help='Emulated J-Link attach latency in s', type=float, default=0.05)
+    parser.add_argument('--op', help='Emulated nrfutil operation latency in s', type=float, default=0.01)
+    parser.add_argument('--snrs', help='Number of emulated debuggers', type=int, default=4)
+    parser.add_argument('--esb-latency', help='Emulated ESB ACK latency in s', type=float, default=0.001)
+    parser.add_argument(
+        '--command-interval', help='Emulated DUT command window interval in s', type=float, default=0.05
+    )
+    parser.add_argument('--usb-latency', help='Emulated USB transfer latency in s', type=float, default=0.0)
+    parser.add_argument('--json', help='Write the results as JSON to this file')
+    parser.add_argument('-V', '--verbose', help='Enable verbose logging', action='store_true')
+    args = parser.parse_args()
+
+    logger.configure(handlers=[{'sink': sys.stderr, 'level': 'DEBUG' if args.verbose else 'WARNING'}])
+
+    with tempfile.TemporaryDirectory(prefix='rf_test_bench_') as tmp_dir:
+        state_dir = os.path.join(tmp_dir, 'state')
+        os.makedirs(state_dir)
+        install_fake_nrfutil(tmp_dir)
+        os.environ['FAKE_NRFUTIL_ATTACH'] = str(args.attach)
+        os.environ['FAKE_NRFUTIL_OP'] = str(args.op)
+        os.environ['FAKE_NRFUTIL_SNRS'] = ','.join(str(1000000001 + i) for i in range(args.snrs))
+        os.environ['FAKE_NRFUTIL_STATE'] = state_dir
+        results = run(args)
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,7 +9,10 @@
 #define LOG_LEVEL LOG_LEVEL_DBG
 LOG_MODULE_REGISTER(main);
 
-#define RF_TEST_VERSION 0x010000
+/* 1.1.0 ACK payloads, 1.2.0 ESB config, 1.3.0 targets and broadcast, 1.4.0 long packets,
+ * 1.5.0 protocol v2, 1.6.0 TX records
+ */
+#define RF_TEST_VERSION 0x010600
 
 #define LOOPBACK_OUT_EP_ADDR 0x01
 #define LOOPBACK_IN_EP_ADDR 0x81
@@ -22,10 +25,94 @@ LOG_MODULE_REGISTER(main);
 #define CMD_INIT_RF 10
 #define CMD_SEND_PACKET 11
 #define CMD_STATUS_PACKET 12
+#define CMD_ACK_PAYLOAD 13
+#define CMD_SET_ESB_CONFIG 14
+#define CMD_SET_TARGET 15
+#define CMD_BROADCAST 16
+/* ESB payload of up to CONFIG_ESB_MAX_PAYLOAD_LENGTH bytes followed by the command byte */
+#define CMD_SEND_LONG_PACKET 17
+#define CMD_SET_PROTOCOL 18
+
+/* Protocol v2 packets start with this header byte, followed by frames of length, sequence number,
+ * command and payload. The responses have a status byte after the command.
+ */
+#define PROTOCOL_V1 1
+#define PROTOCOL_V2 2
+#define PROTOCOL_V2_HEADER 0xA2
+#define FRAME_HEADER_LEN 3
+#define FRAME_RESPONSE_HEADER_LEN 4
+/* With protocol v2 a TX record is pushed on the IN endpoint when each ESB transaction finishes */
+#define TX_RECORD_HEADER 0xA3
+#define IN_QUEUE_LEN 8
+/* Retry interval of IN packets while the endpoint is busy */
+#define IN_RETRY_US 250
+
+enum frame_status {
+	FRAME_OK,
+	FRAME_UNKNOWN_COMMAND,
+	FRAME_INVALID_LENGTH,
+	FRAME_INVALID_PARAMETER,
+	FRAME_ESB_ERROR,
+	FRAME_NO_SPACE,
+};
+
+enum tx_status {
+	TX_ACKED,
+	TX_NO_ACK,
+};
+
+typedef struct __packed {
+	uint8_t header;
+	/* Sequence number of the CMD_SEND_PACKET frame */
+	uint8_t seq;
+	uint8_t status;
+	uint8_t attempts;
+	/* From esb_write_payload to the ESB event */
+	uint32_t latency_us;
+	uint8_t ack_length;
+	uint8_t ack_payload[CONFIG_ESB_MAX_PAYLOAD_LENGTH];
+} tx_record_t;
+
+/* Packets in the ESB TX FIFO, in the order their events arrive */
+struct tx_entry {
+	uint32_t start;
+	uint8_t seq;
+	bool notify;
+};
+
+struct in_packet {
+	uint8_t length;
+	uint8_t data[LOOPBACK_BULK_EP_MPS];
+};
+
+#define DEFAULT_ESB_PAIR 1
+#define DEFAULT_ESB_CHANNEL 40
+
+/* Broadcasts are not acknowledged, so they are sent a few times */
+#define BROADCAST_REPEATS 3
 
 static uint8_t loopback_buf[LOOPBACK_BULK_EP_MPS];
 static volatile bool rf_sent_successfully = false;
 static struct esb_payload rf_payload;
+static struct esb_payload ack_payload;
+static volatile bool ack_payload_received = false;
+static uint8_t esb_pair = DEFAULT_ESB_PAIR;
+static uint8_t esb_channel = DEFAULT_ESB_CHANNEL;
+/* Pipe 0 reaches all DUTs of the pair, pipe 1 the DUT set with CMD_SET_TARGET */
+static uint8_t target_pipe;
+static uint8_t protocol_version = PROTOCOL_V1;
+static uint8_t response_buf[LOOPBACK_BULK_EP_MPS];
+static int response_len;
+static struct tx_entry tx_entries[CONFIG_ESB_TX_FIFO_SIZE];
+static uint8_t tx_head;
+static uint8_t tx_count;
+/* Sequence number of the v2 frame being handled */
+static uint8_t frame_seq;
+
+static void in_work_handler(struct k_work *work);
+
+K_MSGQ_DEFINE(in_msgq, sizeof(struct in_packet), IN_QUEUE_LEN, 4);
+static K_WORK_DELAYABLE_DEFINE(in_work, in_work_handler);
 
 struct usb_loopback_config {
 	struct usb_if_descriptor if0;
@@ -90,6 +177,7 @@ USBD_CLASS_DESCR_DEFINE(primary, 0) struct usb_loopback_config loopback_cfg = {
 /* usb.rst vendor handler end */
 
 void parse_commands(uint8_t ep, uint8_t *usb_out_data, int length);
+int esb_initialize(void);
 
 static void loopback_interface_config(struct usb_desc_header *head, uint8_t bInterfaceNumber)
 {
@@ -135,8 +223,6 @@ static void loopback_out_cb(uint8_t ep, enum usb_dc_ep_cb_status_code ep_status)
 	usb_read(ep, NULL, 0, &bytes_to_read);
 	LOG_DBG("ep 0x%x, bytes to read %d ", ep, bytes_to_read);
 	usb_read(ep, loopback_buf, bytes_to_read, NULL);
-	for (int i = 0; i < bytes_to_read; i++)
-		LOG_DBG("%x", loopback_buf[i]);
 	parse_commands(ep, loopback_buf, bytes_to_read);
 }
 
@@ -196,9 +282,317 @@ USBD_DEFINE_CFG_DATA(loopback_config) = {
 	.endpoint = ep_cfg,
 };
 
+/* IN packets are queued, as TX records from the ESB interrupt and responses share the endpoint */
+static void in_work_handler(struct k_work *work)
+{
+	struct in_packet packet;
+
+	while (k_msgq_peek(&in_msgq, &packet) == 0) {
+		int ret = usb_write(0x82, packet.data, packet.length, NULL);
+
+		if (ret == -EAGAIN) {
+			k_work_reschedule(&in_work, K_USEC(IN_RETRY_US));
+			return;
+		}
+		if (ret) {
+			LOG_ERR("usb IN write error %d", ret);
+		}
+		k_msgq_get(&in_msgq, &packet, K_NO_WAIT);
+	}
+}
+
+/* Can be called from interrupts */
+static void in_write(const uint8_t *data, uint8_t length)
+{
+	struct in_packet packet = { .length = length };
+
+	memcpy(packet.data, data, length);
+	if (k_msgq_put(&in_msgq, &packet, K_NO_WAIT)) {
+		LOG_ERR("IN queue full, packet dropped");
+		return;
+	}
+	k_work_schedule(&in_work, K_NO_WAIT);
+}
+
+/* Writes the payload to the ESB TX FIFO and remembers it for its TX event */
+static int tx_write(struct esb_payload *payload, uint8_t seq, bool notify)
+{
+	unsigned int key = irq_lock();
+	int err = esb_write_payload(payload);
+
+	if (!err) {
+		struct tx_entry *entry = &tx_entries[(tx_head + tx_count) % ARRAY_SIZE(tx_entries)];
+
+		entry->start = k_cycle_get_32();
+		entry->seq = seq;
+		entry->notify = notify;
+		tx_count++;
+	}
+	irq_unlock(key);
+	return err;
+}
+
+static void tx_complete(enum tx_status status, uint32_t attempts)
+{
+	struct tx_entry entry;
+	tx_record_t record;
+
+	if (!tx_count) {
+		return;
+	}
+	entry = tx_entries[tx_head];
+	tx_head = (tx_head + 1) % ARRAY_SIZE(tx_entries);
+	tx_count--;
+	if (!entry.notify || protocol_version != PROTOCOL_V2) {
+		return;
+	}
+	record.header = TX_RECORD_HEADER;
+	record.seq = entry.seq;
+	record.status = status;
+	record.attempts = MIN(attempts, UINT8_MAX);
+	record.latency_us = sys_cpu_to_le32(k_cyc_to_us_floor32(k_cycle_get_32() - entry.start));
+	record.ack_length = (status == TX_ACKED && ack_payload_received) ? ack_payload.length : 0;
+	memcpy(record.ack_payload, ack_payload.data, record.ack_length);
+	in_write((uint8_t *)&record, offsetof(tx_record_t, ack_payload) + record.ack_length);
+}
+
+static int send_packet(const uint8_t *data, uint8_t length)
+{
+	if (length > CONFIG_ESB_MAX_PAYLOAD_LENGTH) {
+		LOG_ERR("Packet too long %d", length);
+		return -EINVAL;
+	}
+	ack_payload_received = false;
+	/* Clears the flag left by broadcasts, which always succeed */
+	rf_sent_successfully = false;
+	rf_payload.length = length;
+	rf_payload.pipe = target_pipe;
+	rf_payload.noack = false;
+	memcpy(rf_payload.data, data, length);
+	if (tx_write(&rf_payload, frame_seq, true)) {
+		LOG_ERR("Failed to send payload");
+		return -EIO;
+	}
+	return 0;
+}
+
+/* Reads and clears the sent successfully flag */
+static uint8_t status_take(void)
+{
+	uint8_t sent = rf_sent_successfully;
+
+	if (sent) {
+		rf_sent_successfully = false;
+	}
+	return sent;
+}
+
+/* Copies and clears the payload of the last ESB ACK, returns the length, 0 if there was none */
+static uint8_t ack_payload_take(uint8_t *buf)
+{
+	uint8_t length = ack_payload_received ? ack_payload.length : 0;
+
+	memcpy(buf, ack_payload.data, length);
+	ack_payload_received = false;
+	return length;
+}
+
+static int set_esb_config(uint8_t pair, uint8_t channel)
+{
+	int err;
+
+	if (pair == 0 || pair == 0xFF || channel > 100) {
+		LOG_ERR("Invalid ESB config, pair %d channel %d", pair, channel);
+		return -EINVAL;
+	}
+	esb_pair = pair;
+	esb_channel = channel;
+	target_pipe = 0;
+	esb_disable();
+	tx_head = 0;
+	tx_count = 0;
+	err = esb_initialize();
+	if (err) {
+		LOG_ERR("ESB init failed %d", err);
+		return err;
+	}
+	LOG_INF("ESB pair %d channel %d", esb_pair, esb_channel);
+	return 0;
+}
+
+/* Pipe 1 address of the DUT, all zero to address every DUT on pipe 0 */
+static int set_target(const uint8_t *addr)
+{
+	int err;
+
+	if (!(addr[0] | addr[1] | addr[2] | addr[3])) {
+		target_pipe = 0;
+		return 0;
+	}
+	err = esb_set_base_address_1(addr);
+	if (err) {
+		LOG_ERR("Failed to set target address %d", err);
+		return err;
+	}
+	target_pipe = 1;
+	return 0;
+}
+
+/* Sent to all DUTs of the pair without ACK, the DUTs would answer at the same time */
+static int broadcast(const uint8_t *data, uint8_t length)
+{
+	int err = 0;
+
+	if (length > CONFIG_ESB_MAX_PAYLOAD_LENGTH) {
+		return -EINVAL;
+	}
+	rf_payload.length = length;
+	rf_payload.pipe = 0;
+	rf_payload.noack = true;
+	memcpy(rf_payload.data, data, length);
+	for (int i = 0; i < BROADCAST_REPEATS; i++) {
+		if (tx_write(&rf_payload, 0, false)) {
+			LOG_ERR("Failed to send broadcast");
+			err = -EIO;
+		}
+	}
+	return err;
+}
+
+static void response_add(uint8_t seq, uint8_t cmd, uint8_t status, const uint8_t *payload, uint8_t length)
+{
+	if (response_len + FRAME_RESPONSE_HEADER_LEN + length > sizeof(response_buf)) {
+		/* The host packs frames so their responses fit, this only happens on host errors */
+		status = FRAME_NO_SPACE;
+		length = 0;
+		if (response_len + FRAME_RESPONSE_HEADER_LEN > sizeof(response_buf)) {
+			return;
+		}
+	}
+	response_buf[response_len++] = length;
+	response_buf[response_len++] = seq;
+	response_buf[response_len++] = cmd;
+	response_buf[response_len++] = status;
+	memcpy(&response_buf[response_len], payload, length);
+	response_len += length;
+}
+
+static uint8_t frame_status(int err)
+{
+	if (err == -EINVAL) {
+		return FRAME_INVALID_PARAMETER;
+	}
+	return err ? FRAME_ESB_ERROR : FRAME_OK;
+}
+
+static void handle_frame(uint8_t seq, uint8_t cmd, const uint8_t *payload, uint8_t length)
+{
+	frame_seq = seq;
+	switch (cmd) {
+	case CMD_FIRMWARE_VERSION: {
+		uint8_t version[3] = { RF_TEST_VERSION >> 16, (RF_TEST_VERSION >> 8) & 0xFF, RF_TEST_VERSION & 0xFF };
+
+		response_add(seq, cmd, FRAME_OK, version, sizeof(version));
+	} break;
+
+	case CMD_SEND_PACKET:
+		response_add(seq, cmd, frame_status(send_packet(payload, length)), NULL, 0);
+		break;
+
+	case CMD_STATUS_PACKET: {
+		uint8_t sent = status_take();
+
+		response_add(seq, cmd, FRAME_OK, &sent, 1);
+	} break;
+
+	case CMD_ACK_PAYLOAD: {
+		uint8_t buf[CONFIG_ESB_MAX_PAYLOAD_LENGTH];
+		uint8_t buf_length = ack_payload_take(buf);
+
+		response_add(seq, cmd, FRAME_OK, buf, buf_length);
+	} break;
+
+	case CMD_SET_ESB_CONFIG:
+		if (length < 2) {
+			response_add(seq, cmd, FRAME_INVALID_LENGTH, NULL, 0);
+			break;
+		}
+		response_add(seq, cmd, frame_status(set_esb_config(payload[0], payload[1])), NULL, 0);
+		break;
+
+	case CMD_SET_TARGET:
+		if (length < 4) {
+			response_add(seq, cmd, FRAME_INVALID_LENGTH, NULL, 0);
+			break;
+		}
+		response_add(seq, cmd, frame_status(set_target(payload)), NULL, 0);
+		break;
+
+	case CMD_BROADCAST:
+		response_add(seq, cmd, frame_status(broadcast(payload, length)), NULL, 0);
+		break;
+
+	case CMD_SET_PROTOCOL:
+		if (length < 1 || (payload[0] != PROTOCOL_V1 && payload[0] != PROTOCOL_V2)) {
+			response_add(seq, cmd, FRAME_INVALID_PARAMETER, NULL, 0);
+			break;
+		}
+		protocol_version = payload[0];
+		response_add(seq, cmd, FRAME_OK, NULL, 0);
+		break;
+
+	default:
+		response_add(seq, cmd, FRAME_UNKNOWN_COMMAND, NULL, 0);
+		break;
+	}
+}
+
+/* Protocol v2 packet: header byte followed by frames of length, sequence number, command and payload.
+ * All frames are handled in order and answered in one IN packet, each response tagged with the frame's
+ * sequence number.
+ */
+static void parse_frames(const uint8_t *data, int length)
+{
+	int offset = 1;
+
+	response_buf[0] = PROTOCOL_V2_HEADER;
+	response_len = 1;
+
+	while (offset + FRAME_HEADER_LEN <= length) {
+		uint8_t payload_length = data[offset];
+		uint8_t seq = data[offset + 1];
+		uint8_t cmd = data[offset + 2];
+
+		if (offset + FRAME_HEADER_LEN + payload_length > length) {
+			response_add(seq, cmd, FRAME_INVALID_LENGTH, NULL, 0);
+			break;
+		}
+		handle_frame(seq, cmd, &data[offset + FRAME_HEADER_LEN], payload_length);
+		offset += FRAME_HEADER_LEN + payload_length;
+	}
+
+	in_write(response_buf, response_len);
+}
+
 void parse_commands(uint8_t ep, uint8_t *usb_out_data, int length)
 {
-	if (usb_out_data == NULL || length > sizeof(rf_test_t)) {
+	if (usb_out_data == NULL || length < 1) {
+		LOG_ERR("NULL ptr or Length mismatch %x", length);
+		return;
+	}
+
+	if (protocol_version == PROTOCOL_V2 && usb_out_data[0] == PROTOCOL_V2_HEADER) {
+		parse_frames(usb_out_data, length);
+		return;
+	}
+
+	/* Protocol v1, the command is in the last byte */
+	if (usb_out_data[length - 1] == CMD_SEND_LONG_PACKET) {
+		send_packet(usb_out_data, length - 1);
+		return;
+	}
+
+	if (length > sizeof(rf_test_t)) {
 		LOG_ERR("NULL ptr or Length mismatch %x", length);
 		return;
 	}
@@ -213,24 +607,47 @@ void parse_commands(uint8_t ep, uint8_t *usb_out_data, int length)
 	} break;
 
 	case CMD_SEND_PACKET:
-		rf_payload.length = 6;
-		memcpy(rf_payload.data, rf_test_command, rf_payload.length);
-		LOG_DBG("rf_payload: %d", rf_payload.data);
-		if (esb_write_payload(&rf_payload)) {
-			LOG_ERR("Failed to send payload");
+		send_packet(usb_out_data, sizeof(rf_test_t) - 1);
+		break;
+
+	case CMD_STATUS_PACKET: {
+		static uint8_t temp_usb_byte;
+
+		temp_usb_byte = status_take();
+		int ret = usb_write(0x82, &temp_usb_byte, 1, NULL);
+		if (ret) {
+			LOG_ERR("usb rf ack write error %d", ret);
+		}
+	} break;
+
+	case CMD_ACK_PAYLOAD: {
+		/* Length byte followed by the payload of the last ESB ACK, length 0 if there was none */
+		static uint8_t ack_buf[1 + CONFIG_ESB_MAX_PAYLOAD_LENGTH];
+
+		ack_buf[0] = ack_payload_take(&ack_buf[1]);
+		int ret = usb_write(0x82, ack_buf, 1 + ack_buf[0], NULL);
+		if (ret) {
+			LOG_ERR("usb ack payload write error %d", ret);
 		}
+	} break;
+
+	case CMD_SET_ESB_CONFIG:
+		/* Pair number and channel are sent in the first two bytes */
+		set_esb_config(rf_test_command->first_rf_channel, rf_test_command->last_rf_channel);
 		break;
 
-	case CMD_STATUS_PACKET:
-			static uint8_t temp_usb_byte;
-			temp_usb_byte = rf_sent_successfully;
+	case CMD_SET_TARGET:
+		set_target(usb_out_data);
+		break;
+
+	case CMD_BROADCAST:
+		broadcast(usb_out_data, sizeof(rf_test_t) - 1);
+		break;
 
-			int ret = usb_write(0x82, &temp_usb_byte, 1, NULL);
-			if (ret) {
-				LOG_ERR("usb rf ack write error %d", ret);
-			}
-		if (rf_sent_successfully) {
-			rf_sent_successfully = false;
+	case CMD_SET_PROTOCOL:
+		/* Protocol version in the first byte, v2 is used until the dongle is reset or set back to v1 */
+		if (usb_out_data[0] == PROTOCOL_V1 || usb_out_data[0] == PROTOCOL_V2) {
+			protocol_version = usb_out_data[0];
 		}
 		break;
 
@@ -246,15 +663,24 @@ void event_handler(struct esb_evt const *event)
 	case ESB_EVENT_TX_SUCCESS:
 		rf_sent_successfully = true;
 		LOG_DBG("TX SUCCESS EVENT");
+		/* The ACK payload is already in the RX FIFO, it goes out with the TX record */
+		if (esb_read_rx_payload(&ack_payload) == 0) {
+			ack_payload_received = true;
+		}
+		tx_complete(TX_ACKED, event->tx_attempts);
 		break;
 	case ESB_EVENT_TX_FAILED:
 		LOG_DBG("TX FAILED EVENT");
+		/* ESB keeps the failed packet and suspends TX, drop it and go on with the queued packets */
+		esb_pop_tx();
+		tx_complete(TX_NO_ACK, event->tx_attempts);
+		esb_start_tx();
 		break;
 	case ESB_EVENT_RX_RECEIVED:
 		LOG_INF("Packet received");
-		if (esb_read_rx_payload(&rf_payload) == 0) {
-		} else {
-			LOG_ERR("Error while reading rx packet");
+		/* Usually already read with the TX success event */
+		while (esb_read_rx_payload(&ack_payload) == 0) {
+			ack_payload_received = true;
 		}
 		break;
 	}
@@ -263,7 +689,8 @@ void event_handler(struct esb_evt const *event)
 int esb_initialize(void)
 {
 	int err;
-	uint8_t base_addr_0[4] = { 0x33, 0x44, 0xBB, 0x01 };
+	/* The last base address byte is the pair number, so each dongle only talks to its own DUTs */
+	uint8_t base_addr_0[4] = { 0x33, 0x44, 0xBB, esb_pair };
 	uint8_t base_addr_1[4] = { 0xDE, 0xF0, 0x12, 0x23 };
 	uint8_t addr_prefix[8] = { 0x22, 0xBC, 0x66, 0xC4, 0xC5, 0xC6, 0xC7, 0xC8 };
 
@@ -296,7 +723,7 @@ int esb_initialize(void)
 		return err;
 	}
 
-	err = esb_set_rf_channel(40);
+	err = esb_set_rf_channel(esb_channel);
 	if (err) {
 		return err;
 	}
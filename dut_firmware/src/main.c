@@ -25,8 +25,31 @@ enum {
 	RADIO_TEST_MODE_TX_UNMOD_SWEEP,
 	RADIO_TEST_MODE_RX_MODE_SWEEP,
 	RADIO_TEST_MODE_RANGE_TEST, /* Not implemented */
+	RADIO_TEST_MODE_RX_STATS,
+	RADIO_TEST_MODE_RX_STATS_READ,
+	RADIO_TEST_MODE_START,
+	RADIO_TEST_MODE_CANCEL,
+	RADIO_TEST_MODE_PING,
+	RADIO_TEST_MODE_HOP_LIST,
+	RADIO_TEST_MODE_TX_HOP,
+	RADIO_TEST_MODE_RX_HOP,
 };
 
+/* Set in rf_cmd to keep the test until a RADIO_TEST_MODE_START broadcast */
+#define RF_CMD_ARM 0x80
+/* Set in rf_cmd to pause the test for command windows, so the host can stop or replace it without a reset */
+#define RF_CMD_COMMAND_WINDOWS 0x40
+
+#define DEFAULT_ESB_PAIR 1
+#define DEFAULT_ESB_CHANNEL 40
+
+/* One record per channel in the RX statistics mode, served as ESB ACK payload */
+#define RX_STATS_MAX_RECORDS 101
+
+/* Channel hop list of the TX and RX hop sweeps, uploaded in chunks filling an ESB packet */
+#define HOP_LIST_MAX_CHANNELS 128
+#define HOP_LIST_CHUNK (CONFIG_ESB_MAX_PAYLOAD_LENGTH - 6)
+
 
 
 typedef struct __attribute__((packed)) {
@@ -38,8 +61,133 @@ typedef struct __attribute__((packed)) {
 	uint8_t rf_cmd;
 
 } rf_test_t;
+
+/* Chunk of the channel hop list, the channels follow the header */
+typedef struct __attribute__((packed)) {
+	uint8_t offset;
+	uint8_t count;
+	uint8_t total;
+	uint8_t reserved[2];
+	uint8_t rf_cmd;
+	uint8_t channels[];
+} hop_list_chunk_t;
+
+/* Hop sweep over the uploaded channel list, the dwell time replaces the first and last channel of rf_test_t */
+typedef struct __attribute__((packed)) {
+	uint16_t dwell_ms;
+	uint8_t radio_power;
+	uint8_t datarate;
+	uint8_t fem_config;
+	uint8_t rf_cmd;
+} hop_sweep_t;
+
+/* Answer to a ping, served as ESB ACK payload of the next packet */
+typedef struct __attribute__((packed)) {
+	uint8_t seq;
+	uint8_t rf_cmd;
+	uint16_t reserved;
+	uint32_t dispatch_us;
+} ping_record_t;
+
+typedef struct __attribute__((packed)) {
+	uint8_t index;
+	uint8_t count;
+	uint8_t channel;
+	uint8_t datarate;
+	uint16_t window_ms;
+	uint32_t packet_cnt;
+	uint32_t pattern_error_cnt;
+	uint32_t crc_error_cnt;
+} rx_stats_record_t;
+
 static struct esb_payload rx_payload;
-static volatile bool payload_received;
+/* Last command from the dongle, the semaphore wakes the main loop when it arrives */
+static rf_test_t rx_command;
+static uint8_t rx_command_pipe;
+static uint32_t rx_command_cycles;
+static K_SEM_DEFINE(command_sem, 0, 1);
+
+static uint8_t esb_pair = DEFAULT_ESB_PAIR;
+static uint8_t esb_channel = DEFAULT_ESB_CHANNEL;
+
+static rf_test_t armed_command;
+static bool armed;
+
+/* Config of the running test, resumed after each command window */
+static struct radio_test_config my_config;
+static bool test_running;
+static bool transmitting;
+
+static bool fem;
+static uint8_t pin_pdn = 0xFF;
+static uint8_t pin_txen = 0xFF;
+static uint8_t pin_rxen = 0xFF;
+static uint8_t pin_mode = 0xFF;
+static uint8_t pin_antsel = 0xFF;
+
+static uint8_t hop_channels[HOP_LIST_MAX_CHANNELS];
+/* Length of the hop list, 0 until every chunk of an upload is received */
+static uint8_t hop_channel_count;
+/* Channels of the hop list upload in progress received so far, resent chunks are counted once */
+static bool hop_channel_received[HOP_LIST_MAX_CHANNELS];
+static uint8_t hop_received_count;
+static uint8_t hop_upload_total;
+
+static rx_stats_record_t rx_stats_records[RX_STATS_MAX_RECORDS];
+static volatile uint8_t rx_stats_count;
+static volatile uint8_t rx_stats_next;
+
+/* Queues the next RX statistics record as payload of the next ESB ACK */
+static void rx_stats_queue_next(void)
+{
+	static struct esb_payload ack_payload;
+
+	if (rx_stats_next >= rx_stats_count) {
+		return;
+	}
+
+	ack_payload.pipe = 0;
+	ack_payload.length = sizeof(rx_stats_record_t);
+	memcpy(ack_payload.data, &rx_stats_records[rx_stats_next], sizeof(rx_stats_record_t));
+	if (esb_write_payload(&ack_payload) == 0) {
+		rx_stats_next++;
+	} else {
+		LOG_ERR("Failed to queue RX stats record %d", rx_stats_next);
+	}
+}
+
+/* Stores a chunk of the hop list. The first chunk or a new total starts a new upload, the list is
+ * only used once the last chunk is received and every channel before it has been seen.
+ */
+static void hop_list_store(const struct esb_payload *payload)
+{
+	const hop_list_chunk_t *chunk = (const hop_list_chunk_t *)payload->data;
+
+	if (payload->length < sizeof(hop_list_chunk_t) + chunk->count || chunk->total == 0 ||
+	    chunk->total > HOP_LIST_MAX_CHANNELS || chunk->offset + chunk->count > chunk->total) {
+		LOG_ERR("Invalid hop list chunk, offset %d count %d total %d", chunk->offset, chunk->count,
+			chunk->total);
+		return;
+	}
+	if (chunk->offset == 0 || chunk->total != hop_upload_total) {
+		memset(hop_channel_received, 0, sizeof(hop_channel_received));
+		hop_received_count = 0;
+		hop_upload_total = chunk->total;
+		hop_channel_count = 0;
+	}
+
+	memcpy(&hop_channels[chunk->offset], chunk->channels, chunk->count);
+	for (uint8_t i = chunk->offset; i < chunk->offset + chunk->count; i++) {
+		if (!hop_channel_received[i]) {
+			hop_channel_received[i] = true;
+			hop_received_count++;
+		}
+	}
+
+	if (chunk->offset + chunk->count == chunk->total && hop_received_count == chunk->total) {
+		hop_channel_count = chunk->total;
+	}
+}
 
 void event_handler(struct esb_evt const *event)
 {
@@ -52,7 +200,18 @@ void event_handler(struct esb_evt const *event)
 		break;
 	case ESB_EVENT_RX_RECEIVED:
 		if (esb_read_rx_payload(&rx_payload) == 0) {
-			payload_received = true;
+			/* Read requests are answered from here, the record was sent with this ACK */
+			if (((rf_test_t *)rx_payload.data)->rf_cmd == RADIO_TEST_MODE_RX_STATS_READ) {
+				rx_stats_queue_next();
+			} else {
+				if (((rf_test_t *)rx_payload.data)->rf_cmd == RADIO_TEST_MODE_HOP_LIST) {
+					hop_list_store(&rx_payload);
+				}
+				memcpy(&rx_command, rx_payload.data, sizeof(rx_command));
+				rx_command_pipe = rx_payload.pipe;
+				rx_command_cycles = k_cycle_get_32();
+				k_sem_give(&command_sem);
+			}
 		} else {
 			LOG_ERR("Error while reading rx packet");
 		}
@@ -103,14 +262,25 @@ int clocks_start(void)
 
 
 	
+static uint32_t device_id_get(void)
+{
+#if defined(FICR_INFO_DEVICEID_DEVICEID_Msk)
+	return NRF_FICR->INFO.DEVICEID[0];
+#else
+	return NRF_FICR->DEVICEID[0];
+#endif
+}
+
 int esb_initialize(void)
 {
 	int err;
-	/* These are arbitrary default addresses. In end user products
-	 * different addresses should be used for each set of devices.
+	uint32_t device_id = device_id_get();
+	/* Pipe 0 is shared by all DUTs of the pair and used for broadcasts,
+	 * pipe 1 is the DUT's own address taken from the device ID.
 	 */
-	uint8_t base_addr_0[4] = { 0x33, 0x44, 0xBB, 0x01 };
-	uint8_t base_addr_1[4] = { 0xDE, 0xF0, 0x12, 0x23 };
+	uint8_t base_addr_0[4] = { 0x33, 0x44, 0xBB, esb_pair };
+	uint8_t base_addr_1[4] = { device_id & 0xFF, (device_id >> 8) & 0xFF, (device_id >> 16) & 0xFF,
+				   (device_id >> 24) & 0xFF };
 	uint8_t addr_prefix[8] = { 0x22, 0xBC, 0x66, 0xC4, 0xC5, 0xC6, 0xC7, 0xC8 };
 
 	struct esb_config config = ESB_DEFAULT_CONFIG;
@@ -144,28 +314,194 @@ int esb_initialize(void)
 		return err;
 	}
 
+	err = esb_set_rf_channel(esb_channel);
+	if (err) {
+		return err;
+	}
+
+	err = esb_enable_pipes(BIT(0) | BIT(1));
+	if (err) {
+		return err;
+	}
+
 	return 0;
 }
 
+static int esb_listen(void)
+{
+	int err;
+
+	err = esb_initialize();
+	if (err) {
+		return err;
+	}
 
+	return esb_start_rx();
+}
 
+static void fem_set_tx(bool tx)
+{
+	if (!fem) {
+		return;
+	}
+	if (pin_txen != 0xFF) {
+		nrf_gpio_pin_write(pin_txen, tx);
+	}
+	if (pin_rxen != 0xFF) {
+		nrf_gpio_pin_write(pin_rxen, !tx);
+	}
+}
 
-int main(void)
+static int radio_test_setup(struct radio_test_config *config)
 {
+	static bool initialized;
 	int err;
-	bool fem = false;
-	bool transmitting = false;
 
+	if (initialized) {
+		/* ESB took over the radio interrupt since the last test */
+		radio_test_irq_connect(config);
+		return 0;
+	}
+
+	err = radio_test_init(config);
+	if (!err) {
+		initialized = true;
+	}
+
+	return err;
+}
+
+/* Counts received packets for a window on each channel from first to last channel,
+ * then restarts ESB and queues the records for the host to read back.
+ * The window is given in radio_power in units of 10 ms, 0 uses the Kconfig default.
+ */
+static int rx_stats_measure(struct radio_test_config *config, const rf_test_t *command)
+{
+	struct radio_rx_stats rx_stats;
+	uint16_t window_ms = command->radio_power ? command->radio_power * 10 :
+						    CONFIG_RADIO_TEST_RX_STATS_WINDOW_MS;
+	uint8_t last_channel = MAX(command->first_rf_channel, command->last_rf_channel);
+	int err;
+
+	rx_stats_count = 0;
+	rx_stats_next = 0;
+
+	err = radio_test_setup(config);
+	if (err) {
+		return err;
+	}
+
+	config->type = RX;
+	config->mode = command->datarate;
+	config->params.rx.pattern = TRANSMIT_PATTERN_11001100;
+
+	for (uint16_t channel = command->first_rf_channel;
+	     channel <= last_channel && rx_stats_count < RX_STATS_MAX_RECORDS; channel++) {
+		config->params.rx.channel = channel;
+		radio_test_start(config);
+		k_msleep(window_ms);
+		radio_rx_stats_get(&rx_stats);
+		radio_test_cancel();
+
+		rx_stats_records[rx_stats_count] = (rx_stats_record_t){
+			.index = rx_stats_count,
+			.channel = channel,
+			.datarate = command->datarate,
+			.window_ms = window_ms,
+			.packet_cnt = rx_stats.packet_cnt,
+			.pattern_error_cnt = rx_stats.pattern_error_cnt,
+			.crc_error_cnt = rx_stats.crc_error_cnt,
+		};
+		rx_stats_count++;
+	}
+
+	for (uint8_t i = 0; i < rx_stats_count; i++) {
+		rx_stats_records[i].count = rx_stats_count;
+	}
+	LOG_INF("RX stats measured on %d channels", rx_stats_count);
+
+	/* The radio test took over the radio, ESB is initialized again to serve the results */
+	err = esb_listen();
+	if (err) {
+		return err;
+	}
+
+	rx_stats_queue_next();
+	return 0;
+}
+
+/* Pauses the running test for a short ESB window in which the host can cancel or reconfigure it.
+ * Returns true if a command was received, ESB is then left on and the test stays stopped.
+ * The window ends as soon as a command arrives, otherwise the test resumes where it was paused.
+ */
+static bool command_window(void)
+{
+	int err;
+	bool received = false;
+
+	k_msleep(CONFIG_RADIO_TEST_COMMAND_INTERVAL_MS);
+	radio_test_cancel();
+	fem_set_tx(false);
+
+	err = esb_listen();
+	if (err) {
+		LOG_ERR("ESB start for the command window failed, err %d", err);
+	} else {
+		received = k_sem_take(&command_sem, K_MSEC(CONFIG_RADIO_TEST_COMMAND_WINDOW_MS)) == 0;
+	}
+
+	if (!received) {
+		esb_disable();
+		/* A command received just before ESB was stopped is still handled with ESB on */
+		received = k_sem_take(&command_sem, K_NO_WAIT) == 0;
+		if (received && !err) {
+			esb_listen();
+		}
+	}
+	if (received) {
+		test_running = false;
+		return true;
+	}
+
+	fem_set_tx(transmitting);
+	radio_test_setup(&my_config);
+	radio_test_resume(&my_config);
+	return false;
+}
+
+/* Answers a ping with the time from the ESB event to the main loop, the host reads it with the next ping */
+static void ping_reply(const rf_test_t *command, uint32_t dispatch_us)
+{
+	static struct esb_payload ack_payload;
+	ping_record_t record = {
+		.seq = command->first_rf_channel,
+		.rf_cmd = RADIO_TEST_MODE_PING,
+		.dispatch_us = dispatch_us,
+	};
+
+	/* Only the answer to the latest ping is kept */
+	esb_flush_tx();
+	ack_payload.pipe = rx_command_pipe;
+	ack_payload.length = sizeof(record);
+	memcpy(ack_payload.data, &record, sizeof(record));
+	if (esb_write_payload(&ack_payload)) {
+		LOG_ERR("Failed to queue ping reply %d", record.seq);
+	}
+}
+
+int main(void)
+{
+	int err;
+	rf_test_t command;
+	uint32_t dispatch_us;
+	unsigned int key;
+	bool command_windows;
 
-	uint8_t pin_pdn = 0xFF;
-	uint8_t pin_txen = 0xFF;
-	uint8_t pin_rxen = 0xFF;
-	uint8_t pin_mode = 0xFF;
-	uint8_t pin_antsel = 0xFF;
 #if defined(CONFIG_SOC_NRF54L15) || defined(CONFIG_SOC_NRF54L10) || defined(CONFIG_SOC_NRF54L05)
 	uint32_t load_cap = (volatile uint32_t) NRF_UICR->OTP[0];
 	uint32_t fem_config_0 = (volatile uint32_t) NRF_UICR->OTP[1];
 	uint32_t fem_config_1 = (volatile uint32_t) NRF_UICR->OTP[2];
+	uint32_t esb_config = (volatile uint32_t) NRF_UICR->OTP[3];
 
 	switch(load_cap){
 		case 0xFFFFFFFF:
@@ -178,8 +514,22 @@ int main(void)
 #else
 	uint32_t fem_config_0 = (volatile uint32_t) NRF_UICR->CUSTOMER[1];
 	uint32_t fem_config_1 = (volatile uint32_t) NRF_UICR->CUSTOMER[2];
+	uint32_t esb_config = (volatile uint32_t) NRF_UICR->CUSTOMER[3];
 #endif
 
+	/* ESB pair number in byte 0 and channel in byte 1, set by the host to run several pairs in one room */
+	if (esb_config != 0xFFFFFFFF) {
+		uint8_t pair = esb_config & 0xFF;
+		uint8_t channel = (esb_config >> 8) & 0xFF;
+
+		if (pair != 0 && pair != 0xFF) {
+			esb_pair = pair;
+		}
+		if (channel <= 100) {
+			esb_channel = channel;
+		}
+	}
+
 	if(fem_config_0 != 0xFFFFFFFF || fem_config_1 != 0xFFFFFFFF){
 		fem	= true;
 		pin_pdn = fem_config_0 & 0xFF;
@@ -227,9 +577,8 @@ int main(void)
 	}
 
 	LOG_INF("Initialization complete");
-	uint32_t rf_channel = 40;
-	esb_set_rf_channel(rf_channel);
-	LOG_INF("Setting up for packet receiption on channel %d", rf_channel);
+	LOG_INF("Setting up for packet receiption on channel %d, pair %d, device ID %08x", esb_channel, esb_pair,
+		device_id_get());
 
 	err = esb_start_rx();
 	if (err) {
@@ -237,102 +586,181 @@ int main(void)
 		return err;
 	}
 	while (1) {
-		if (payload_received == true) {
-			payload_received = false;
-			rf_test_t *rf_test_commands = (rf_test_t *)rx_payload.data;
-
-			LOG_DBG("first_rf_channel: %d", rf_test_commands->first_rf_channel);
-			LOG_DBG("last_rf_channel: %d", rf_test_commands->last_rf_channel);
-			LOG_DBG("radio_power: %d", rf_test_commands->radio_power);
-			LOG_DBG("datarate %d", rf_test_commands->datarate);
-			LOG_DBG("fem_config: %d", rf_test_commands->fem_config);
-			LOG_DBG("rf_cmd: %d", rf_test_commands->rf_cmd);
-
-			esb_disable();
-
-			static struct radio_test_config my_config;
-			memset(&my_config, 0, sizeof(struct radio_test_config));
-
-			switch (rf_test_commands->rf_cmd) {
-			case RADIO_TEST_MODE_TX_MOD_CARRIER:
-				LOG_INF("RADIO_TEST_MODE_TX_MOD_CARRIER");
-				my_config.type = MODULATED_TX;
-				my_config.mode = rf_test_commands->datarate;
-				my_config.params.modulated_tx.pattern = TRANSMIT_PATTERN_11001100;
-				my_config.params.modulated_tx.txpower =
-					rf_test_commands->radio_power;
-				my_config.params.modulated_tx.channel =
-					rf_test_commands->first_rf_channel;
-				transmitting = true;
-				break;
-			case RADIO_TEST_MODE_TX_UNMOD_CARRIER:
-				LOG_INF("RADIO_TEST_MODE_TX_UNMOD_CARRIER");
-				my_config.type = UNMODULATED_TX;
-				my_config.mode = rf_test_commands->datarate;
-				my_config.params.unmodulated_tx.txpower =
-					rf_test_commands->radio_power;
-				my_config.params.unmodulated_tx.channel =
-					rf_test_commands->first_rf_channel;
-				transmitting = true;
-				break;
-			case RADIO_TEST_MODE_RX_MODE:
-				LOG_INF("RADIO_TEST_MODE_RX_MODE");
-				my_config.type = RX;
-				my_config.mode = rf_test_commands->datarate;
-				my_config.params.rx.channel = rf_test_commands->first_rf_channel;
-				break;
-			case RADIO_TEST_MODE_TX_UNMOD_SWEEP:
-				LOG_INF("RADIO_TEST_MODE_TX_UNMOD_SWEEP");
-				my_config.type = TX_SWEEP;
-				my_config.mode = rf_test_commands->datarate;
-				my_config.params.tx_sweep.txpower = rf_test_commands->radio_power;
-				my_config.params.tx_sweep.channel_start =
-					rf_test_commands->first_rf_channel;
-				my_config.params.tx_sweep.channel_end =
-					rf_test_commands->last_rf_channel;
-				my_config.params.tx_sweep.delay_ms = 10;
-				transmitting = true;
-				break;
-			case RADIO_TEST_MODE_RX_MODE_SWEEP:
-				LOG_INF("RADIO_TEST_MODE_RX_MODE_SWEEP");
-				my_config.type = RX_SWEEP;
-				my_config.mode = rf_test_commands->datarate;
-				my_config.params.rx_sweep.channel_start =
-					rf_test_commands->first_rf_channel;
-				my_config.params.rx_sweep.channel_end =
-					rf_test_commands->last_rf_channel;
-				my_config.params.rx_sweep.delay_ms = 10;
-				break;
-			case RADIO_TEST_MODE_RANGE_TEST:
-				LOG_INF("RADIO_TEST_MODE_RANGE_TEST"); /* Not implemented */
-				break;
-			default:
-				LOG_INF("Default case - unsupported command %d",
-				       rf_test_commands->rf_cmd);
-				break;
+		if (test_running) {
+			if (!command_window()) {
+				continue;
 			}
+		} else {
+			k_sem_take(&command_sem, K_FOREVER);
+		}
+		key = irq_lock();
+		command = rx_command;
+		dispatch_us = k_cyc_to_us_floor32(k_cycle_get_32() - rx_command_cycles);
+		irq_unlock(key);
 
-			if(fem){
-				LOG_INF("FEM config: %d", rf_test_commands->fem_config);
-				nrf_gpio_pin_write(pin_mode, rf_test_commands->fem_config & 0x01);
-				nrf_gpio_pin_write(pin_antsel, (rf_test_commands->fem_config & 0x02)>>1);
-				if(transmitting){
-					if(pin_txen != 0xFF){
-						nrf_gpio_pin_write(pin_txen, 1);
-					}
-					if(pin_rxen != 0xFF){
-						nrf_gpio_pin_write(pin_rxen, 0);
-					}
-				}
+		rf_test_t *rf_test_commands = &command;
+
+		if (rf_test_commands->rf_cmd == RADIO_TEST_MODE_PING) {
+			ping_reply(rf_test_commands, dispatch_us);
+			continue;
+		}
+		if (rf_test_commands->rf_cmd == RADIO_TEST_MODE_HOP_LIST) {
+			/* Stored by the event handler, ESB stays on for the rest of the list */
+			continue;
+		}
+
+		if (rf_test_commands->rf_cmd & RF_CMD_ARM) {
+			/* ESB stays on until the group is started with a broadcast */
+			armed_command = *rf_test_commands;
+			armed_command.rf_cmd &= ~RF_CMD_ARM;
+			armed = true;
+			LOG_INF("Armed with rf_cmd %d", armed_command.rf_cmd);
+			continue;
+		}
+		if (rf_test_commands->rf_cmd == RADIO_TEST_MODE_START) {
+			if (!armed) {
+				LOG_INF("Start without armed test ignored");
+				continue;
+			}
+			armed = false;
+			rf_test_commands = &armed_command;
+		}
+		command_windows = rf_test_commands->rf_cmd & RF_CMD_COMMAND_WINDOWS;
+		rf_test_commands->rf_cmd &= ~RF_CMD_COMMAND_WINDOWS;
+		if (rf_test_commands->rf_cmd == RADIO_TEST_MODE_CANCEL) {
+			/* The test was stopped for the command window, ESB stays on */
+			LOG_INF("RADIO_TEST_MODE_CANCEL");
+			armed = false;
+			continue;
+		}
+
+		if ((rf_test_commands->rf_cmd == RADIO_TEST_MODE_TX_HOP ||
+		     rf_test_commands->rf_cmd == RADIO_TEST_MODE_RX_HOP) && hop_channel_count == 0) {
+			/* ESB stays on for the hop list to be uploaded again */
+			LOG_ERR("Hop sweep without a complete hop list ignored");
+			continue;
+		}
+
+		LOG_DBG("first_rf_channel: %d", rf_test_commands->first_rf_channel);
+		LOG_DBG("last_rf_channel: %d", rf_test_commands->last_rf_channel);
+		LOG_DBG("radio_power: %d", rf_test_commands->radio_power);
+		LOG_DBG("datarate %d", rf_test_commands->datarate);
+		LOG_DBG("fem_config: %d", rf_test_commands->fem_config);
+		LOG_DBG("rf_cmd: %d", rf_test_commands->rf_cmd);
+
+		esb_disable();
+
+		memset(&my_config, 0, sizeof(struct radio_test_config));
+		transmitting = false;
+
+		switch (rf_test_commands->rf_cmd) {
+		case RADIO_TEST_MODE_TX_MOD_CARRIER:
+			LOG_INF("RADIO_TEST_MODE_TX_MOD_CARRIER");
+			my_config.type = MODULATED_TX;
+			my_config.mode = rf_test_commands->datarate;
+			my_config.params.modulated_tx.pattern = TRANSMIT_PATTERN_11001100;
+			my_config.params.modulated_tx.txpower =
+				rf_test_commands->radio_power;
+			my_config.params.modulated_tx.channel =
+				rf_test_commands->first_rf_channel;
+			transmitting = true;
+			break;
+		case RADIO_TEST_MODE_TX_UNMOD_CARRIER:
+			LOG_INF("RADIO_TEST_MODE_TX_UNMOD_CARRIER");
+			my_config.type = UNMODULATED_TX;
+			my_config.mode = rf_test_commands->datarate;
+			my_config.params.unmodulated_tx.txpower =
+				rf_test_commands->radio_power;
+			my_config.params.unmodulated_tx.channel =
+				rf_test_commands->first_rf_channel;
+			transmitting = true;
+			break;
+		case RADIO_TEST_MODE_RX_MODE:
+			LOG_INF("RADIO_TEST_MODE_RX_MODE");
+			my_config.type = RX;
+			my_config.mode = rf_test_commands->datarate;
+			my_config.params.rx.channel = rf_test_commands->first_rf_channel;
+			break;
+		case RADIO_TEST_MODE_TX_UNMOD_SWEEP:
+			LOG_INF("RADIO_TEST_MODE_TX_UNMOD_SWEEP");
+			my_config.type = TX_SWEEP;
+			my_config.mode = rf_test_commands->datarate;
+			my_config.params.tx_sweep.txpower = rf_test_commands->radio_power;
+			my_config.params.tx_sweep.channel_start =
+				rf_test_commands->first_rf_channel;
+			my_config.params.tx_sweep.channel_end =
+				rf_test_commands->last_rf_channel;
+			my_config.params.tx_sweep.delay_ms = 10;
+			transmitting = true;
+			break;
+		case RADIO_TEST_MODE_RX_MODE_SWEEP:
+			LOG_INF("RADIO_TEST_MODE_RX_MODE_SWEEP");
+			my_config.type = RX_SWEEP;
+			my_config.mode = rf_test_commands->datarate;
+			my_config.params.rx_sweep.channel_start =
+				rf_test_commands->first_rf_channel;
+			my_config.params.rx_sweep.channel_end =
+				rf_test_commands->last_rf_channel;
+			my_config.params.rx_sweep.delay_ms = 10;
+			break;
+		case RADIO_TEST_MODE_TX_HOP: {
+			const hop_sweep_t *hop_sweep = (const hop_sweep_t *)rf_test_commands;
+
+			LOG_INF("RADIO_TEST_MODE_TX_HOP");
+			my_config.type = TX_SWEEP;
+			my_config.mode = hop_sweep->datarate;
+			my_config.params.tx_sweep.txpower = hop_sweep->radio_power;
+			my_config.params.tx_sweep.channels = hop_channels;
+			my_config.params.tx_sweep.channel_count = hop_channel_count;
+			my_config.params.tx_sweep.delay_ms = MAX(hop_sweep->dwell_ms, 1);
+			transmitting = true;
+		} break;
+		case RADIO_TEST_MODE_RX_HOP: {
+			const hop_sweep_t *hop_sweep = (const hop_sweep_t *)rf_test_commands;
+
+			LOG_INF("RADIO_TEST_MODE_RX_HOP");
+			my_config.type = RX_SWEEP;
+			my_config.mode = hop_sweep->datarate;
+			my_config.params.rx_sweep.channels = hop_channels;
+			my_config.params.rx_sweep.channel_count = hop_channel_count;
+			my_config.params.rx_sweep.delay_ms = MAX(hop_sweep->dwell_ms, 1);
+		} break;
+		case RADIO_TEST_MODE_RANGE_TEST:
+			LOG_INF("RADIO_TEST_MODE_RANGE_TEST"); /* Not implemented */
+			break;
+		case RADIO_TEST_MODE_RX_STATS:
+			LOG_INF("RADIO_TEST_MODE_RX_STATS");
+			break;
+		default:
+			LOG_INF("Default case - unsupported command %d",
+			       rf_test_commands->rf_cmd);
+			break;
+		}
+
+		if(fem){
+			LOG_INF("FEM config: %d", rf_test_commands->fem_config);
+			nrf_gpio_pin_write(pin_mode, rf_test_commands->fem_config & 0x01);
+			nrf_gpio_pin_write(pin_antsel, (rf_test_commands->fem_config & 0x02)>>1);
+			fem_set_tx(transmitting);
+		}
+
+
+		if (rf_test_commands->rf_cmd == RADIO_TEST_MODE_RX_STATS) {
+			err = rx_stats_measure(&my_config, rf_test_commands);
+			if (err) {
+				LOG_ERR("RX stats measurement failed, err %d", err);
+				return err;
 			}
+			continue;
+		}
 
-		
-			radio_test_init(&my_config);
-			/* Start radio test - needs a physical reset to stop or retest */
-			radio_test_start(&my_config);
+		radio_test_setup(&my_config);
+		radio_test_start(&my_config);
+		if (!command_windows || CONFIG_RADIO_TEST_COMMAND_INTERVAL_MS == 0) {
+			/* Without command windows the test needs a reset to stop or retest */
 			return 0;
 		}
-		k_msleep(100);
+		test_running = true;
 	}
 	/* return to idle thread */
 	return 0;
@@ -100,9 +100,19 @@ static uint8_t rx_packet[RADIO_MAX_PAYLOAD_LEN];
 static uint32_t tx_packet_cnt;
 /* Number of received packets with valid CRC. */
 static uint32_t rx_packet_cnt;
+/* Number of packets in rx_packet_cnt with a payload not matching the pattern. */
+static uint32_t rx_pattern_error_cnt;
+/* Number of received packets with a CRC error, these are not in rx_packet_cnt. */
+static uint32_t rx_crc_error_cnt;
+/* Expected RX payload byte, 0 if the payload is not checked. */
+static uint8_t rx_pattern_byte;
 
 /* Radio current channel (frequency). */
 static uint8_t current_channel;
+/* Position in the channel hop list of a sweep */
+static uint8_t current_index;
+/* Set while a paused test is started again, sweeps and RX counters then continue where they were */
+static bool resuming;
 
 /* Timer used for channel sweeps and tx with duty cycle. */
 static const nrfx_timer_t timer = NRFX_TIMER_INSTANCE(RADIO_TEST_TIMER_INSTANCE);
@@ -935,9 +945,25 @@ static void radio_rx(uint8_t mode, uint8_t channel, enum transmit_pattern patter
 	radio_config(mode, pattern);
 	radio_channel_set(mode, channel);
 
-	rx_packet_cnt = 0;
+	if (!resuming) {
+		rx_packet_cnt = 0;
+		rx_pattern_error_cnt = 0;
+		rx_crc_error_cnt = 0;
+	}
+
+	switch (pattern) {
+	case TRANSMIT_PATTERN_11001100:
+		rx_pattern_byte = 0xCC;
+		break;
+	case TRANSMIT_PATTERN_11110000:
+		rx_pattern_byte = 0xF0;
+		break;
+	default:
+		rx_pattern_byte = 0;
+		break;
+	}
 
-	nrf_radio_int_enable(NRF_RADIO, NRF_RADIO_INT_CRCOK_MASK);
+	nrf_radio_int_enable(NRF_RADIO, NRF_RADIO_INT_CRCOK_MASK | NRF_RADIO_INT_CRCERROR_MASK);
 
 #if CONFIG_FEM
 	(void)fem_configure(true, mode, &fem);
@@ -954,9 +980,24 @@ static void radio_rx(uint8_t mode, uint8_t channel, enum transmit_pattern patter
 	}
 }
 
-static void radio_sweep_start(uint8_t channel, uint32_t delay_ms)
+static uint8_t sweep_next_channel(const uint8_t *channels, uint8_t channel_count,
+				  uint8_t channel_start, uint8_t channel_end)
 {
-	current_channel = channel;
+	if (channel_count) {
+		current_index = (current_index + 1) % channel_count;
+		return channels[current_index];
+	}
+
+	return (current_channel >= channel_end) ? channel_start : current_channel + 1;
+}
+
+static void radio_sweep_start(const uint8_t *channels, uint8_t channel_count,
+			      uint8_t channel_start, uint32_t delay_ms)
+{
+	if (!resuming) {
+		current_index = 0;
+		current_channel = channel_count ? channels[0] : channel_start;
+	}
 
 #if CONFIG_FEM
 	(void)fem_power_up();
@@ -1071,11 +1112,15 @@ void radio_test_start(const struct radio_test_config *config)
 			config->params.rx.packets_num);
 		break;
 	case TX_SWEEP:
-		radio_sweep_start(config->params.tx_sweep.channel_start,
+		radio_sweep_start(config->params.tx_sweep.channels,
+			config->params.tx_sweep.channel_count,
+			config->params.tx_sweep.channel_start,
 			config->params.tx_sweep.delay_ms);
 		break;
 	case RX_SWEEP:
-		radio_sweep_start(config->params.rx_sweep.channel_start,
+		radio_sweep_start(config->params.rx_sweep.channels,
+			config->params.rx_sweep.channel_count,
+			config->params.rx_sweep.channel_start,
 			config->params.rx_sweep.delay_ms);
 		break;
 	case MODULATED_TX_DUTY_CYCLE:
@@ -1088,6 +1133,13 @@ void radio_test_start(const struct radio_test_config *config)
 	}
 }
 
+void radio_test_resume(const struct radio_test_config *config)
+{
+	resuming = true;
+	radio_test_start(config);
+	resuming = false;
+}
+
 void radio_test_cancel(void)
 {
 	nrfx_timer_disable(&timer);
@@ -1127,6 +1179,8 @@ void radio_rx_stats_get(struct radio_rx_stats *rx_stats)
 	rx_stats->last_packet.buf = rx_packet;
 	rx_stats->last_packet.len = size;
 	rx_stats->packet_cnt = rx_packet_cnt;
+	rx_stats->pattern_error_cnt = rx_pattern_error_cnt;
+	rx_stats->crc_error_cnt = rx_crc_error_cnt;
 }
 
 #if NRF_POWER_HAS_DCDCEN_VDDH || NRF_POWER_HAS_DCDCEN
@@ -1170,6 +1224,8 @@ static void timer_handler(nrf_timer_event_t event_type, void *context)
 		(const struct radio_test_config *) context;
 
 	if (event_type == NRF_TIMER_EVENT_COMPARE0) { /* sweep test running */
+		const uint8_t *channels;
+		uint8_t channel_count;
 		uint8_t channel_start;
 		uint8_t channel_end;
 
@@ -1179,6 +1235,8 @@ static void timer_handler(nrf_timer_event_t event_type, void *context)
 				config->params.tx_sweep.txpower,
 				current_channel);
 
+			channels = config->params.tx_sweep.channels;
+			channel_count = config->params.tx_sweep.channel_count;
 			channel_start = config->params.tx_sweep.channel_start;
 			channel_end = config->params.tx_sweep.channel_end;
 		} else if (config->type == RX_SWEEP) {
@@ -1188,6 +1246,8 @@ static void timer_handler(nrf_timer_event_t event_type, void *context)
 				config->params.rx.pattern,
 				0);
 
+			channels = config->params.rx_sweep.channels;
+			channel_count = config->params.rx_sweep.channel_count;
 			channel_start = config->params.rx_sweep.channel_start;
 			channel_end = config->params.rx_sweep.channel_end;
 		} else {
@@ -1197,10 +1257,8 @@ static void timer_handler(nrf_timer_event_t event_type, void *context)
 
 		sweep_processing = false;
 
-		current_channel++;
-		if (current_channel > channel_end) {
-			current_channel = channel_start;
-		}
+		current_channel = sweep_next_channel(channels, channel_count,
+						     channel_start, channel_end);
 	} else if (event_type == NRF_TIMER_EVENT_COMPARE1) { /* HMPAN-216 errata */
 		errata216_release();
 	} else {
@@ -1208,6 +1266,22 @@ static void timer_handler(nrf_timer_event_t event_type, void *context)
 	}
 }
 
+static bool rx_packet_valid(void)
+{
+	if (!rx_pattern_byte) {
+		return true;
+	}
+
+	/* The BLE modes run without CRC, check the payload against the transmitted pattern instead */
+	for (size_t i = 1; i <= rx_packet[0] && i < sizeof(rx_packet); i++) {
+		if (rx_packet[i] != rx_pattern_byte) {
+			return false;
+		}
+	}
+
+	return true;
+}
+
 static void timer_init(const struct radio_test_config *config)
 {
 	nrfx_err_t          err;
@@ -1233,6 +1307,9 @@ void radio_handler(const void *context)
 	    nrf_radio_event_check(NRF_RADIO, NRF_RADIO_EVENT_CRCOK)) {
 		nrf_radio_event_clear(NRF_RADIO, NRF_RADIO_EVENT_CRCOK);
 		rx_packet_cnt++;
+		if (!rx_packet_valid()) {
+			rx_pattern_error_cnt++;
+		}
 		if (config->params.rx.packets_num) {
 			if (rx_packet_cnt == config->params.rx.packets_num) {
 				k_work_reschedule(&rx_timeout_work, K_NO_WAIT);
@@ -1242,6 +1319,12 @@ void radio_handler(const void *context)
 		}
 	}
 
+	if (nrf_radio_int_enable_check(NRF_RADIO, NRF_RADIO_INT_CRCERROR_MASK) &&
+	    nrf_radio_event_check(NRF_RADIO, NRF_RADIO_EVENT_CRCERROR)) {
+		nrf_radio_event_clear(NRF_RADIO, NRF_RADIO_EVENT_CRCERROR);
+		rx_crc_error_cnt++;
+	}
+
 	if (nrf_radio_int_enable_check(NRF_RADIO, NRF_RADIO_INT_END_MASK) &&
 	    nrf_radio_event_check(NRF_RADIO, NRF_RADIO_EVENT_END)) {
 		nrf_radio_event_clear(NRF_RADIO, NRF_RADIO_EVENT_END);
@@ -1258,6 +1341,12 @@ void radio_handler(const void *context)
 	}
 }
 
+void radio_test_irq_connect(struct radio_test_config *config)
+{
+	irq_connect_dynamic(RADIO_TEST_RADIO_IRQn, IRQ_PRIO_LOWEST, radio_handler, config, 0);
+	irq_enable(RADIO_TEST_RADIO_IRQn);
+}
+
 int radio_test_init(struct radio_test_config *config)
 {
 	nrfx_err_t nrfx_err;
@@ -1266,8 +1355,7 @@ int radio_test_init(struct radio_test_config *config)
 	IRQ_CONNECT(RADIO_TEST_TIMER_IRQn, IRQ_PRIO_LOWEST,
 		RADIO_TEST_TIMER_IRQ_HANDLER, NULL, 0);
 
-	irq_connect_dynamic(RADIO_TEST_RADIO_IRQn, IRQ_PRIO_LOWEST, radio_handler, config, 0);
-	irq_enable(RADIO_TEST_RADIO_IRQn);
+	radio_test_irq_connect(config);
 
 	nrfx_err = nrfx_gppi_channel_alloc(&ppi_radio_start);
 	if (nrfx_err != NRFX_SUCCESS) {
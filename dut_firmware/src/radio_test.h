@@ -147,6 +147,12 @@ struct radio_test_config {
 
 			/** Delay time in milliseconds. */
 			uint32_t delay_ms;
+
+			/** Channel hop list used instead of the start and end channel. */
+			const uint8_t *channels;
+
+			/** Number of channels in the hop list, zero to sweep from start to end channel. */
+			uint8_t channel_count;
 		} tx_sweep;
 
 		struct {
@@ -158,6 +164,12 @@ struct radio_test_config {
 
 			/** Delay time in milliseconds. */
 			uint32_t delay_ms;
+
+			/** Channel hop list used instead of the start and end channel. */
+			const uint8_t *channels;
+
+			/** Number of channels in the hop list, zero to sweep from start to end channel. */
+			uint8_t channel_count;
 		} rx_sweep;
 
 		struct {
@@ -194,6 +206,12 @@ struct radio_rx_stats {
 
 	/** Number of received packets with valid CRC. */
 	uint32_t packet_cnt;
+
+	/** Number of packets in packet_cnt with a payload not matching the pattern. */
+	uint32_t pattern_error_cnt;
+
+	/** Number of received packets with a CRC error, not counted in packet_cnt. */
+	uint32_t crc_error_cnt;
 };
 
 /**
@@ -213,11 +231,30 @@ int radio_test_init(struct radio_test_config *config);
  */
 void radio_test_start(const struct radio_test_config *config);
 
+/**
+ * @brief Function for starting a test stopped with radio_test_cancel again.
+ *
+ * Sweeps continue from the channel they were on and the RX counters are kept.
+ *
+ * @param[in] config  Radio test configuration of the stopped test.
+ */
+void radio_test_resume(const struct radio_test_config *config);
+
 /**
  * @brief Function for stopping ongoing test (Radio and Timer operations).
  */
 void radio_test_cancel(void);
 
+/**
+ * @brief Function for connecting the radio interrupt to the Radio Test module again.
+ *
+ * ESB connects its own radio interrupt handler, so this is needed before starting a test
+ * after ESB has been used.
+ *
+ * @param[in] config  Radio test configuration.
+ */
+void radio_test_irq_connect(struct radio_test_config *config);
+
 /**
  * @brief Function for get RX statistics.
  *
@@ -1,15 +1,21 @@
 from argparse import ArgumentParser
 from loguru import logger
-from src.gui.gui import GUI
-import sys, yaml
+from src.cli import cli
+from src.modules.tracing import tracer
+import atexit
+import sys
 
 VERSION = '1.0.0'
-REQ_DONGLE_VERSION = '1.0.0'
+# Oldest dongle firmware with all USB commands used by the host, protocol v2 and TX records are used when available
+REQ_DONGLE_VERSION = '1.4.0'
 
 parser = ArgumentParser(prog="RF test", description="RF test")
 
 parser.add_argument('-v', '--version', help='Print version number', action='store_true')
 parser.add_argument('-V', '--verbose', help='Enable verbose logging', action='store_true')
+parser.add_argument('--trace', help='Record timing spans and save them as Chrome trace JSON on exit', metavar='FILE')
+parser.add_argument('--trace-summary', help='Print timing span histograms on exit', action='store_true')
+cli.add_subcommands(parser)
 
 args = parser.parse_args()
 
@@ -19,16 +25,38 @@ else:
     log_level = 'INFO'
 logger.configure(handlers=[{'sink': sys.stdout, 'level': log_level}])
 
+
+def save_trace():
+    if args.trace:
+        tracer.save_chrome_trace(args.trace)
+        logger.info(f'Saved {len(tracer.get_spans())} timing spans to {args.trace}')
+    if args.trace_summary:
+        print(tracer.format_summary())
+
+
+if args.trace or args.trace_summary:
+    tracer.enable()
+    atexit.register(save_trace)
+
 if args.version:
+    from src.modules.rf_test_dongle_api import DongleSession, parse_version
+
     print(f'rf_test: {VERSION}')
     try:
-        with RFTestDongleAPI() as dongle_api:
-            dongle_fw_version = dongle_api.get_dongle_version()
+        with DongleSession() as dongle_session:
+            dongle_fw_version = dongle_session.get_dongle_version()
             print(f'dongle_fw: {dongle_fw_version}')
+            if parse_version(dongle_fw_version) < parse_version(REQ_DONGLE_VERSION):
+                print(f'dongle_fw {REQ_DONGLE_VERSION} or newer is required')
     except:
         pass
     exit()
 
+if args.command:
+    exit(cli.execute(args))
+
+from src.gui.gui import GUI
+
 logger.debug('Starting GUI')
 gui = GUI()
 gui.run()
@@ -0,0 +1,331 @@
+from argparse import ArgumentParser, Namespace
+from loguru import logger
+from src.modules.device_cache import DEFAULT_CACHE_PATH as DEVICE_CACHE_PATH
+from src.modules.nrfutil_wrapper import API as Nrfutil, ProgressEvent, unpack_words
+from src.modules.rf_test_dongle_api import EsbConfig, list_dongles
+import src.core.logic as core
+import src.core.test_plan as test_plan
+import src.core.rx_stats as rx_stats
+
+FEM_PINS = {
+    'pdn': 'pinPDN',
+    'txen': 'pinTXEN',
+    'rxen': 'pinRXEN',
+    'mode': 'pinMODE',
+    'antsel': 'pinANTSEL',
+}
+
+NRFUTIL_ERRORS = (core.NrfutilError, core.NrfutilLowVoltageError, core.NrfutilReadbackError)
+
+
+def add_subcommands(parser: ArgumentParser):
+    '''
+    Adds the headless subcommands to the argument parser.
+    '''
+    parser.add_argument('--cache-devices', help='Keep detected device versions between runs', action='store_true')
+    parser.add_argument('--dongle', help='Dongle USB serial number or bus path, the first found if omitted')
+    parser.add_argument('--pair', help='ESB pair number 1-254 of the dongle and its DUTs', type=int)
+    parser.add_argument('--esb-channel', help='ESB channel of the dongle and its DUTs', type=int)
+    subparsers = parser.add_subparsers(dest='command', title='headless commands')
+
+    subparsers.add_parser('debuggers', help='List connected debuggers')
+    subparsers.add_parser('dongles', help='List connected dongles')
+
+    detect_parser = subparsers.add_parser('detect', help='Detect the device version of the DUTs')
+    detect_parser.add_argument('-s', '--snr', help='Debugger serial number, all if omitted', type=int, nargs='*')
+
+    flash_parser = subparsers.add_parser('flash', help='Flash test firmware to the DUTs in parallel')
+    flash_parser.add_argument('-s', '--snr', help='Debugger serial number, all if omitted', type=int, nargs='*')
+    flash_parser.add_argument('--load-cap', help='HFXO load capacitance in pF, 0 for external caps', default='')
+    flash_parser.add_argument(
+        '--verify',
+        help='Verification after programming',
+        choices=[v.name.lower() for v in core.VerifyType],
+        default='read',
+    )
+    flash_parser.add_argument('-P', '--progress', help='Print erase, program and verify progress', action='store_true')
+    for pin in FEM_PINS:
+        flash_parser.add_argument(f'--fem-{pin}', help=f'FEM {pin.upper()} pin, e.g. P0.10')
+
+    run_parser = subparsers.add_parser('run', help='Start an RF test')
+    run_parser.add_argument('-m', '--mode', help='Test mode', choices=[m.name for m in core.TestModes], required=True)
+    run_parser.add_argument('-c', '--channel', help='Frequency, or start frequency for sweeps', type=int, default=40)
+    run_parser.add_argument('-l', '--last-channel', help='Stop frequency for sweeps', type=int, default=80)
+    run_parser.add_argument('-p', '--power', help='TX power in dBm', type=int, default=0)
+    run_parser.add_argument(
+        '-d', '--data-rate', help='Data rate', choices=[r.name for r in core.DataRates], default='BLE_1_Mbit'
+    )
+    run_parser.add_argument('--fem-config', help='FEM MODE and ANT_SEL states, MODE + ANT_SEL * 2', type=int, default=0)
+    run_parser.add_argument(
+        '-s', '--snr', help='Debugger serial numbers of DUTs to start together with a broadcast', type=int, nargs='+'
+    )
+    run_parser.add_argument('--channels', help='Sweep hop list instead of the frequency range, e.g. 2,26,40-44,80')
+    run_parser.add_argument('--dwell', help='Sweep dwell time per frequency in ms', type=int)
+    run_parser.add_argument(
+        '-w',
+        '--windows',
+        help='Pause the test for command windows, so stop or another run works without a reset',
+        action='store_true',
+    )
+
+    subparsers.add_parser('stop', help='Stop the RF test running on the DUT')
+
+    ping_parser = subparsers.add_parser('ping', help='Measure the command latency to the DUT, stops a running test')
+    ping_parser.add_argument('-n', '--count', help='Number of pings', type=int, default=10)
+
+    plan_parser = subparsers.add_parser('plan', help='Run a test plan from a YAML or CSV file')
+    plan_parser.add_argument('file', help='Test plan file')
+    plan_parser.add_argument(
+        '-s', '--snr', help='Debugger serial number, resets a DUT not acknowledging a step', type=int
+    )
+    plan_parser.add_argument('-o', '--output', help='CSV file for the timestamped step results')
+
+    rx_stats_parser = subparsers.add_parser('rxstats', help='Measure received packets and PER on the DUT')
+    rx_stats_parser.add_argument('-c', '--channel', help='First frequency', type=int, default=0)
+    rx_stats_parser.add_argument('-l', '--last-channel', help='Last frequency', type=int, default=80)
+    rx_stats_parser.add_argument(
+        '-d', '--data-rate', help='Data rate', choices=[r.name for r in core.DataRates], default='BLE_1_Mbit'
+    )
+    rx_stats_parser.add_argument('-w', '--window', help='Measurement time per frequency in ms', type=int, default=100)
+    rx_stats_parser.add_argument('-r', '--repeat', help='Number of measurements', type=int, default=1)
+    rx_stats_parser.add_argument(
+        '--expected-rate', help='Packet rate of the reference transmitter in packets/s, for PER', type=float
+    )
+    rx_stats_parser.add_argument('-o', '--output', help='CSV file for the per frequency results')
+
+    dump_parser = subparsers.add_parser('dump', help='Read a memory range of the DUT, e.g. UICR or FICR')
+    dump_parser.add_argument('-s', '--snr', help='Debugger serial number', type=int, required=True)
+    dump_parser.add_argument('-a', '--address', help='Start address', type=lambda value: int(value, 0), required=True)
+    dump_parser.add_argument('-n', '--size', help='Number of bytes, a multiple of 4', type=int, default=64)
+    dump_parser.add_argument(
+        '--core', help='Core to read from', choices=[c.name for c in core.Core], default=core.Core.APPLICATION.name
+    )
+
+    for command in ['recover', 'reset']:
+        command_parser = subparsers.add_parser(command, help=f'{command.capitalize()} the DUT')
+        command_parser.add_argument('-s', '--snr', help='Debugger serial number', type=int, required=True)
+
+
+def get_snrs(snrs: list | None) -> list:
+    return snrs if snrs else core.debugger_registry.refresh()
+
+
+def get_esb_config(args: Namespace) -> EsbConfig | None:
+    if args.pair is None and args.esb_channel is None:
+        return None
+    return EsbConfig(
+        pair=args.pair if args.pair is not None else EsbConfig.pair,
+        channel=args.esb_channel if args.esb_channel is not None else EsbConfig.channel,
+    )
+
+
+def debuggers(args: Namespace) -> int:
+    for snr in core.debugger_registry.refresh():
+        print(snr)
+    return 0
+
+
+def dongles(args: Namespace) -> int:
+    for dongle in list_dongles():
+        print(dongle)
+    return 0
+
+
+def detect(args: Namespace) -> int:
+    ret = 0
+    for snr in get_snrs(args.snr):
+        try:
+            print(f'{snr}: {core.detect_device(snr)}')
+        except NRFUTIL_ERRORS as err:
+            logger.error(f'{snr}: {err}')
+            ret = 1
+    return ret
+
+
+def print_progress(event: ProgressEvent):
+    step = f' ({event.step}/{event.steps})' if event.step and event.steps else ''
+    print(f'{event.snr}: {event.description}{step} {event.percentage:.0f}%')
+
+
+def flash(args: Namespace) -> int:
+    if args.progress:
+        Nrfutil.register_progress_callback(print_progress)
+    fem_config = None
+    if any(getattr(args, f'fem_{pin}') for pin in FEM_PINS):
+        fem_config = {key: getattr(args, f'fem_{pin}') or '' for pin, key in FEM_PINS.items()}
+    results = core.flash_fleet(
+        args.load_cap,
+        fem_config,
+        snrs=get_snrs(args.snr),
+        verify=core.VerifyType[args.verify.upper()],
+        esb_config=get_esb_config(args),
+    )
+    if not results:
+        logger.error('No debuggers connected')
+        return 1
+    for result in results:
+        status = 'OK' if result.success else f'FAILED {result.error or ""}'
+        print(f'{result.snr}: {result.device} {status} ({result.duration:.1f} s)')
+    return 0 if all(result.success for result in results) else 1
+
+
+def run(args: Namespace) -> int:
+    radio_config = core.parse_radio_config(
+        core.RadioConfig(
+            first_channel=args.channel,
+            last_channel=args.last_channel,
+            radio_power=args.power,
+            data_rate=args.data_rate,
+            rf_cmd=args.mode,
+            fem_config=args.fem_config,
+            usb_cmd=core.CMD_SEND_PACKET,
+        )
+    )
+    if args.channels or args.dwell:
+        if args.mode not in (core.TestModes.Unmodulated_TX_sweep.name, core.TestModes.RX_sweep.name):
+            raise core.RFTestException('--channels and --dwell need a sweep mode')
+        if args.snr:
+            raise core.RFTestException('Hop sweeps can not be started on a group of DUTs')
+        channels = (
+            core.parse_channels(args.channels)
+            if args.channels
+            else list(range(args.channel, max(args.channel, args.last_channel) + 1))
+        )
+        success = core.start_hop_sweep(
+            radio_config,
+            channels,
+            args.dwell or core.DEFAULT_DWELL_MS,
+            args.dongle,
+            get_esb_config(args),
+            command_windows=args.windows,
+        )
+        print('Sweep started' if success else 'Sweep start failed')
+        return 0 if success else 1
+    if args.snr:
+        acks = core.start_group_test(
+            radio_config, args.snr, args.dongle, get_esb_config(args), command_windows=args.windows
+        )
+        for snr, ack in acks.items():
+            print(f'{snr}: {"started" if ack else "no ACK, not started"}')
+        return 0 if all(acks.values()) else 1
+    success = core.start_test(radio_config, args.dongle, get_esb_config(args), command_windows=args.windows)
+    print('Test started' if success else 'Test start failed')
+    return 0 if success else 1
+
+
+def stop(args: Namespace) -> int:
+    success = core.stop_test(args.dongle, get_esb_config(args))
+    print('Test stopped' if success else 'Test stop failed')
+    return 0 if success else 1
+
+
+def ping(args: Namespace) -> int:
+    results = core.ping(args.count, args.dongle, get_esb_config(args))
+    for result in results:
+        print(
+            f'seq {result.seq}: round trip {result.round_trip * 1000:.2f} ms, ACK {result.ack_latency * 1000:.2f} ms, '
+            f'DUT dispatch {result.dispatch * 1000:.3f} ms'
+        )
+    if not results:
+        print('No answer from the DUT')
+        return 1
+    round_trips = [result.round_trip * 1000 for result in results]
+    print(
+        f'{len(results)}/{args.count} answered, round trip min/mean/max '
+        f'{min(round_trips):.2f}/{sum(round_trips) / len(round_trips):.2f}/{max(round_trips):.2f} ms'
+    )
+    return 0 if len(results) == args.count else 1
+
+
+def plan(args: Namespace) -> int:
+    steps = test_plan.load_test_plan(args.file)
+    logger.info(f'Running test plan with {len(steps)} steps')
+    results = test_plan.run_test_plan(steps, snr=args.snr, dongle=args.dongle, esb_config=get_esb_config(args))
+    if args.output:
+        test_plan.save_results(results, args.output)
+    failed = [index + 1 for index, result in enumerate(results) if not result.success]
+    if failed:
+        logger.error(f'Steps not acknowledged: {failed}')
+    return 1 if failed else 0
+
+
+def rxstats(args: Namespace) -> int:
+    for _ in range(args.repeat):
+        if not rx_stats.measure_rx_stats(
+            args.channel,
+            args.last_channel,
+            args.data_rate,
+            args.window,
+            args.expected_rate,
+            dongle=args.dongle,
+            esb_config=get_esb_config(args),
+        ):
+            return 1
+    stats = rx_stats.rx_stats_buffer.per_channel()
+    print(
+        f'{"freq":>5}{"samples":>9}{"packets":>10}{"pattern":>9}{"crc":>8}{"expected":>10}'
+        f'{"PER":>8}{"min":>8}{"max":>8}'
+    )
+    for row in stats:
+        print(
+            f'{row["channel"]:>5}{row["samples"]:>9}{row["packets"]:>10}{row["pattern_errors"]:>9}'
+            f'{row["crc_errors"]:>8}{row["expected"]:>10}{row["per"]:>8.4f}{row["per_min"]:>8.4f}{row["per_max"]:>8.4f}'
+        )
+    if args.output:
+        rx_stats.save_per_channel(stats, args.output)
+    return 0
+
+
+def dump(args: Namespace) -> int:
+    data = core.read_memory(args.snr, args.address, args.size, core.Core[args.core])
+    words = unpack_words(data)
+    for index in range(0, len(words), 4):
+        line = ' '.join(f'{word:08X}' for word in words[index : index + 4])
+        print(f'{args.address + 4 * index:08X}: {line}')
+    return 0
+
+
+def recover(args: Namespace) -> int:
+    core.recover(args.snr)
+    return 0
+
+
+def reset(args: Namespace) -> int:
+    core.reset(args.snr)
+    return 0
+
+
+COMMANDS = {
+    'debuggers': debuggers,
+    'dongles': dongles,
+    'detect': detect,
+    'flash': flash,
+    'run': run,
+    'stop': stop,
+    'ping': ping,
+    'plan': plan,
+    'rxstats': rxstats,
+    'dump': dump,
+    'recover': recover,
+    'reset': reset,
+}
+
+
+def execute(args: Namespace) -> int:
+    '''
+    Runs a headless subcommand and returns the exit code.
+    '''
+    if args.cache_devices:
+        core.device_cache.path = DEVICE_CACHE_PATH
+        core.device_cache.load()
+    try:
+        return COMMANDS[args.command](args)
+    except NRFUTIL_ERRORS + (core.RFTestException, core.RFTestDongleError) as err:
+        logger.error(err)
+        return 1
+    except FileNotFoundError as err:
+        logger.error(f'{err.filename or "nrfutil"} not found: {err.strerror}')
+        return 1
+    except KeyError as err:
+        logger.error(f'Unknown device {err}')
+        return 1
@@ -0,0 +1,582 @@
+from src.modules.nrfutil_wrapper import (
+    API as Nrfutil,
+    AsyncAPI as AsyncNrfutil,
+    TestFW,
+    Core,
+    ResetType,
+    EraseType,
+    VerifyType,
+    ProgramResult,
+    NrfutilLowVoltageError,
+    NrfutilReadbackError,
+    NrfutilError,
+)
+from src.modules.rf_test_dongle_api import get_session as get_dongle_session
+from src.modules.rf_test_dongle_api import (
+    RadioConfig,
+    RFTestDongleError,
+    EsbConfig,
+    CMD_SEND_PACKET,
+    RECONFIGURE_TIMEOUT,
+    RESEND_INTERVAL,
+    PingResult,
+    DEFAULT_DWELL_MS,
+    MAX_CHANNEL,
+    dut_address,
+    parse_version,
+    with_command_windows,
+)
+from src.modules.rf_test_exception import RFTestException
+from src.modules.firmware_cache import FirmwareCache
+from src.modules.debugger_registry import DebuggerRegistry
+from src.modules.device_cache import DeviceCache
+from src.modules.intel_hex import IntelHex, IntelHexError
+from src.modules.tracing import span, trace
+
+from yaml import safe_load
+from typing import List
+from loguru import logger
+from enum import Enum
+from functools import cache
+import asyncio, os, re, time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from dataclasses import dataclass, field, fields
+
+
+class TestModes(Enum):
+    Unmodulated_TX = 1
+    Modulated_TX = 0
+    Unmodulated_TX_sweep = 3
+    RX = 2
+    RX_sweep = 4
+
+
+class DataRates(Enum):
+    BLE_1_Mbit = 3
+    BLE_2_Mbit = 4
+    NRF_1_Mbit = 0
+    NRF_2_Mbit = 1
+
+
+@dataclass
+class FlashResult:
+    snr: int
+    device: str | None = None
+    success: bool = False
+    error: str | None = None
+    duration: float = 0.0
+    programmed: List[ProgramResult] = field(default_factory=list)
+
+
+firmware_cache = FirmwareCache()
+Nrfutil.register_invalidate_callback(firmware_cache.invalidate)
+
+device_cache = DeviceCache()
+Nrfutil.register_invalidate_callback(device_cache.invalidate, uicr=True)
+
+
+def invalidate_detached(debuggers: List[int], attached: List[int], detached: List[int]):
+    for snr in detached:
+        device_cache.invalidate(snr)
+
+
+debugger_registry = DebuggerRegistry()
+debugger_registry.add_listener(invalidate_detached)
+
+
+@cache
+def load_devices() -> dict:
+    with open('devices.yaml', 'r') as f:
+        return safe_load(f)
+
+
+def get_hex_files(device: str) -> List[TestFW]:
+    device_config = load_devices()[device]
+    out = []
+    for core, hex_path in device_config['firmware'].items():
+        out.append(
+            TestFW(
+                file_path=os.path.join(os.getcwd(), hex_path),
+                core=Core.NETWORK if core == 'net' else Core.APPLICATION,
+            )
+        )
+    return out
+
+
+def get_devices() -> List[str]:
+    return load_devices().keys()
+
+
+def detect_device(snr: int, refresh: bool = False) -> str:
+    return device_cache.get_device_version(snr, refresh).split('_')[0]
+
+
+async def detect_device_async(snr: int, refresh: bool = False) -> str:
+    return (await device_cache.get_device_version_async(snr, refresh)).split('_')[0]
+
+
+async def detect_devices_async(snrs: List[int], refresh: bool = False) -> dict[int, str | Exception]:
+    '''
+    Detects the devices behind all debuggers concurrently, a failing debugger returns its exception.
+    '''
+    results = await asyncio.gather(*(detect_device_async(snr, refresh) for snr in snrs), return_exceptions=True)
+    return dict(zip(snrs, results))
+
+
+def fem_config_to_ints(fem_config: dict) -> None | dict:
+    for key, item in fem_config.items():
+        if item == '':
+            fem_config[key] = 0xFF
+        else:
+            if port_pin := re.search(r'(?<=P)\d+\.\d+', item):
+                port_pin = port_pin.group().split('.')
+                port = int(port_pin[0])
+                pin = int(port_pin[1])
+                fem_config[key] = pin + port * 32
+            elif item.isdigit():
+                fem_config[key] = int(item)
+            else:
+                logger.error(f'{key} is not a pin number')
+                return None
+    return fem_config
+
+
+def get_uicr_config(
+    device: str, load_cap: str, fem_config: dict | None = None, esb_config: EsbConfig | None = None
+) -> dict[Core, dict[int, int]]:
+    '''
+    Gets the UICR/OTP words for the FEM pin, HFXO load capacitor and ESB pair config, grouped per core.
+    '''
+    uicr_config = {}
+    if fem_config:
+        fem_config_reg0 = (
+            fem_config.get('pinPDN')
+            | fem_config.get('pinTXEN') << 8
+            | fem_config.get('pinRXEN') << 16
+            | fem_config.get('pinMODE') << 24
+        )
+
+        fem_config_reg1 = fem_config.get('pinANTSEL') | 0xFFFFFF << 8
+
+        fem_config_reg0_addr = load_devices().get(device).get('fem').get('fem_config_reg0')
+        fem_config_reg1_addr = load_devices().get(device).get('fem').get('fem_config_reg1')
+        coprocessor = getattr(Core, load_devices().get(device).get('fem').get('coprocessor', 'APPLICATION'))
+        uicr_config.setdefault(coprocessor, {})[fem_config_reg0_addr] = fem_config_reg0
+        uicr_config.setdefault(coprocessor, {})[fem_config_reg1_addr] = fem_config_reg1
+
+    if load_cap != '':
+        if load_cap_config := load_devices().get(device).get('load_cap'):
+            logger.debug(f"Configuring internal load caps to: {load_cap}")
+            logger.debug(f"UICR load cap config addr: {hex(load_cap_config.get('config_register'))}")
+            logger.debug(f"Load cap multiply factor: {load_cap_config.get('multiply_factor')}")
+            try:
+                coprocessor = getattr(Core, load_cap_config.get('coprocessor'))
+                uicr_config.setdefault(coprocessor, {})[load_cap_config.get('config_register')] = int(
+                    float(load_cap) * load_cap_config.get('multiply_factor', 1)
+                )
+            except ValueError:
+                logger.error('Load cap value is not float')
+        else:
+            logger.error('No load capacitor config in device config')
+
+    if esb_config:
+        if device_esb_config := load_devices().get(device).get('esb'):
+            logger.debug(f'Configuring ESB pair: {esb_config.pair} channel: {esb_config.channel}')
+            coprocessor = getattr(Core, device_esb_config.get('coprocessor', 'APPLICATION'))
+            uicr_config.setdefault(coprocessor, {})[device_esb_config.get('esb_config_reg')] = esb_config.to_uicr()
+        else:
+            logger.error('No ESB config in device config')
+    return uicr_config
+
+
+def merge_uicr_config(testfw: List[TestFW], uicr_config: dict[Core, dict[int, int]], out_dir: str) -> List[TestFW]:
+    '''
+    Adds the UICR/OTP words to the test firmware image of the matching core, so the config is written
+    in the same program operation as the firmware.
+    '''
+    merged = []
+    for file in testfw:
+        if words := uicr_config.get(file.core):
+            image = IntelHex.from_file(file.file_path)
+            for addr, value in words.items():
+                logger.debug(f'Merging {hex(value)} at addr: {hex(addr)} into {file.core.name} image')
+                image.write_word(addr, value)
+            file_path = os.path.join(out_dir, f'{file.core.name.lower()}_{os.path.basename(file.file_path)}')
+            image.save(file_path)
+            file = TestFW(file_path=file_path, core=file.core)
+        merged.append(file)
+    return merged
+
+
+@dataclass
+class UicrChanges:
+    # Words that can be written directly, only clearing bits
+    writes: dict[int, int] = field(default_factory=dict)
+    # Words that need a bit set again, which requires the UICR to be erased
+    erase: dict[int, int] = field(default_factory=dict)
+
+
+def read_uicr_words(debugger: Nrfutil, addrs: List[int], core: Core) -> dict[int, int]:
+    '''
+    Reads the window spanning all config words in one nrfutil call.
+    '''
+    first, last = min(addrs), max(addrs)
+    words = debugger.read_words(first, (last - first) // 4 + 1, core)
+    return {addr: words[(addr - first) // 4] for addr in addrs}
+
+
+def get_uicr_changes(current: dict[int, int], desired: dict[int, int]) -> UicrChanges:
+    changes = UicrChanges()
+    for addr, value in desired.items():
+        if current.get(addr) == value:
+            continue
+        if value & ~current.get(addr, 0xFFFFFFFF) & 0xFFFFFFFF:
+            changes.erase[addr] = value
+        else:
+            changes.writes[addr] = value
+    return changes
+
+
+@trace('flash')
+def flash_device(
+    snr: int,
+    device: str,
+    load_cap: str,
+    fem_config: dict | None = None,
+    verify: VerifyType = VerifyType.READ,
+    esb_config: EsbConfig | None = None,
+) -> List[ProgramResult] | None:
+    '''
+    Programs the test firmware unless the firmware cache finds it on the device, then brings the UICR config up
+    to date. The config is merged into firmware that is programmed anyway, otherwise only the words that differ
+    are written. The device is always reset, also when nothing had to be programmed. Words needing a bit set
+    again are only fixed by programming the firmware with the merged config.
+    '''
+    debugger = Nrfutil(snr)
+    uicr_config = get_uicr_config(device, load_cap, fem_config, esb_config)
+    testfw = get_hex_files(device)
+    with TemporaryDirectory(prefix='rf_test_') as out_dir, span('session', 'flash', snr=snr), debugger.session():
+        skipped = [file for file in testfw if firmware_cache.is_programmed(debugger, file)]
+        writes: dict[Core, dict[int, int]] = {}
+        for core, words in uicr_config.items():
+            if any(file.core == core for file in testfw if file not in skipped):
+                continue
+            with span('read_uicr', 'flash', snr=snr):
+                changes = get_uicr_changes(read_uicr_words(debugger, list(words), core), words)
+            if changes.erase:
+                logger.debug(f'{snr}: UICR words {[hex(addr) for addr in changes.erase]} can not be rewritten')
+                if skipped_file := next((file for file in skipped if file.core == core), None):
+                    skipped.remove(skipped_file)
+                    continue
+                debugger.erase(EraseType.UICR, core)
+                changes.writes = words
+            if changes.writes:
+                writes[core] = changes.writes
+
+        program = [file for file in testfw if file not in skipped]
+        try:
+            with span('merge_uicr_config', 'flash', snr=snr):
+                merged = merge_uicr_config(program, uicr_config, out_dir)
+        except (OSError, IntelHexError) as err:
+            logger.error(err)
+            return None
+        results = [ProgramResult(file=file, verify=verify, skipped=True) for file in skipped]
+        results += debugger.program(merged, verify=verify)
+        for core, words in writes.items():
+            logger.debug(f'{snr}: Writing {len(words)} changed UICR words in {core.name} core')
+            debugger.write_words(words, core)
+        # Programming resets the device, a skipped flash still restarts the test firmware from a known state
+        if writes or not program:
+            debugger.reset()
+    # The session ran the queued program operations on exit, only now is the firmware known to be on the device
+    for file in program:
+        firmware_cache.store(snr, file)
+    return results
+
+
+def flash_fleet_device(
+    snr: int,
+    load_cap: str,
+    fem_config: dict | None = None,
+    verify: VerifyType = VerifyType.READ,
+    esb_config: EsbConfig | None = None,
+) -> FlashResult:
+    result = FlashResult(snr=snr)
+    start = time.monotonic()
+    try:
+        result.device = detect_device(snr)
+        programmed = flash_device(snr, result.device, load_cap, fem_config, verify, esb_config)
+        result.success = programmed is not None
+        result.programmed = programmed or []
+    except (NrfutilError, NrfutilLowVoltageError, NrfutilReadbackError, RFTestException, KeyError) as err:
+        logger.error(f'{snr}: Flashing failed: {err}')
+        result.error = repr(err)
+    result.duration = time.monotonic() - start
+    return result
+
+
+def flash_fleet(
+    load_cap: str,
+    fem_config: dict | None = None,
+    snrs: List[int] | None = None,
+    max_workers: int | None = None,
+    verify: VerifyType = VerifyType.READ,
+    esb_config: EsbConfig | None = None,
+) -> List[FlashResult]:
+    '''
+    Flashes all connected debuggers, or the given SNRs, in parallel and returns one result per DUT.
+    '''
+    if snrs is None:
+        snrs = debugger_registry.get()
+    if fem_config:
+        fem_config = fem_config_to_ints(fem_config)
+        if fem_config is None:
+            return [FlashResult(snr=snr, error='Invalid FEM config') for snr in snrs]
+    if not snrs:
+        return []
+    logger.debug(f'Flashing {len(snrs)} devices in parallel')
+    with ThreadPoolExecutor(max_workers=max_workers or len(snrs)) as executor:
+        return list(executor.map(lambda snr: flash_fleet_device(snr, load_cap, fem_config, verify, esb_config), snrs))
+
+
+def parse_radio_config(radio_config: RadioConfig) -> RadioConfig:
+    '''
+    Converts a radio config given as text, e.g. from the GUI fields, to the values sent to the dongle.
+    '''
+    for config_field in fields(radio_config):
+        match config_field.name:
+            case 'data_rate':
+                setattr(
+                    radio_config,
+                    config_field.name,
+                    DataRates[getattr(radio_config, config_field.name).replace(' ', '_')].value,
+                )
+            case 'rf_cmd':
+                setattr(
+                    radio_config,
+                    config_field.name,
+                    TestModes[getattr(radio_config, config_field.name).replace(' ', '_')].value,
+                )
+            case _:
+                try:
+                    setattr(radio_config, config_field.name, int(getattr(radio_config, config_field.name)))
+                except ValueError:
+                    logger.error(f'Radio config {config_field.name} is not int')
+                    raise RFTestException(f'Radio config {config_field.name} is not int')
+    setattr(radio_config, 'usb_cmd', CMD_SEND_PACKET)
+    return radio_config
+
+
+@trace('dongle')
+def start_test(
+    radio_config: RadioConfig,
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+    command_windows: bool = False,
+) -> bool:
+    '''
+    Starts the RF test, a test already running on the DUT is replaced in its next command window. With
+    command_windows the new test gets command windows too, so it can be stopped or replaced without a reset.
+    '''
+    logger.debug(f'Starting RF test with test_config:{radio_config}')
+    if command_windows:
+        radio_config = with_command_windows(radio_config)
+    try:
+        return get_dongle_session(dongle, esb_config).send_cmd(
+            radio_config, timeout=RECONFIGURE_TIMEOUT, resend_interval=RESEND_INTERVAL
+        )
+    except RFTestDongleError as err:
+        logger.error(err)
+        return False
+
+
+def parse_channels(text: str) -> List[int]:
+    '''
+    Parses a channel hop list like "2, 26, 40-44, 80", ranges include both ends and the order is kept.
+    '''
+    channels = []
+    for item in filter(None, (item.strip() for item in text.split(','))):
+        try:
+            if '-' in item:
+                first, last = (int(value) for value in item.split('-', 1))
+            else:
+                first = last = int(item)
+        except ValueError:
+            raise RFTestException(f'Invalid channel list item: {item}')
+        if not (0 <= first <= MAX_CHANNEL and 0 <= last <= MAX_CHANNEL):
+            raise RFTestException(f'Channels must be 0 to {MAX_CHANNEL}, got {item}')
+        channels += range(first, last + 1) if first <= last else range(first, last - 1, -1)
+    return channels
+
+
+@trace('dongle')
+def start_hop_sweep(
+    radio_config: RadioConfig,
+    channels: List[int],
+    dwell_ms: int = DEFAULT_DWELL_MS,
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+    command_windows: bool = False,
+) -> bool:
+    '''
+    Starts a TX or RX sweep over the channel hop list, dwelling dwell_ms on each channel.
+    '''
+    logger.debug(f'Starting hop sweep over {channels} with test_config:{radio_config}')
+    if command_windows:
+        radio_config = with_command_windows(radio_config)
+    try:
+        return get_dongle_session(dongle, esb_config).hop_sweep(radio_config, channels, dwell_ms=dwell_ms)
+    except RFTestDongleError as err:
+        logger.error(err)
+        return False
+
+
+@trace('dongle')
+async def start_hop_sweep_async(
+    radio_config: RadioConfig,
+    channels: List[int],
+    dwell_ms: int = DEFAULT_DWELL_MS,
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+    command_windows: bool = False,
+) -> bool:
+    logger.debug(f'Starting hop sweep over {channels} with test_config:{radio_config}')
+    if command_windows:
+        radio_config = with_command_windows(radio_config)
+    try:
+        return await get_dongle_session(dongle, esb_config).hop_sweep_async(radio_config, channels, dwell_ms=dwell_ms)
+    except RFTestDongleError as err:
+        logger.error(err)
+        return False
+
+
+@trace('dongle')
+def stop_test(dongle: str | None = None, esb_config: EsbConfig | None = None) -> bool:
+    '''
+    Stops the RF test running on the DUT without a reset.
+    '''
+    try:
+        return get_dongle_session(dongle, esb_config).cancel_test()
+    except RFTestDongleError as err:
+        logger.error(err)
+        return False
+
+
+@trace('dongle')
+def ping(count: int = 1, dongle: str | None = None, esb_config: EsbConfig | None = None) -> List[PingResult]:
+    '''
+    Pings the DUT count times, the pings without an answer are left out.
+    '''
+    session = get_dongle_session(dongle, esb_config)
+    results = []
+    for _ in range(count):
+        try:
+            if result := session.ping():
+                results.append(result)
+        except RFTestDongleError as err:
+            logger.error(err)
+            break
+    return results
+
+
+def get_dut_address(snr: int) -> bytes:
+    '''
+    Returns the ESB address of the DUT, derived from its device ID.
+    '''
+    device = detect_device(snr)
+    device_esb_config = load_devices().get(device, {}).get('esb')
+    if not device_esb_config or 'device_id_reg' not in device_esb_config:
+        raise RFTestException(f'{device} has no device ID register configured')
+    coprocessor = getattr(Core, device_esb_config.get('coprocessor', 'APPLICATION'))
+    return dut_address(device_cache.get_device_id(snr, device_esb_config.get('device_id_reg'), coprocessor))
+
+
+@trace('dongle')
+def start_group_test(
+    radio_config: RadioConfig,
+    snrs: List[int],
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+    command_windows: bool = False,
+) -> dict[int, bool]:
+    '''
+    Arms the DUTs behind the debugger SNRs one by one and starts them together with a broadcast.
+    Returns whether each DUT acknowledged the test config.
+    '''
+    logger.debug(f'Starting RF test on {len(snrs)} DUTs with test_config:{radio_config}')
+    if command_windows:
+        radio_config = with_command_windows(radio_config)
+    addresses = {snr: get_dut_address(snr) for snr in snrs}
+    try:
+        acks = get_dongle_session(dongle, esb_config).start_group(
+            radio_config, list(addresses.values()), timeout=RECONFIGURE_TIMEOUT, resend_interval=RESEND_INTERVAL
+        )
+    except RFTestDongleError as err:
+        logger.error(err)
+        return {snr: False for snr in snrs}
+    return {snr: acks.get(address, False) for snr, address in addresses.items()}
+
+
+@trace('dongle')
+async def start_test_async(
+    radio_config: RadioConfig,
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+    command_windows: bool = False,
+) -> bool:
+    logger.debug(f'Starting RF test with test_config:{radio_config}')
+    if command_windows:
+        radio_config = with_command_windows(radio_config)
+    try:
+        return await get_dongle_session(dongle, esb_config).send_cmd_async(
+            radio_config, timeout=RECONFIGURE_TIMEOUT, resend_interval=RESEND_INTERVAL
+        )
+    except RFTestDongleError as err:
+        logger.error(err)
+        return False
+
+
+@trace('dongle')
+async def stop_test_async(dongle: str | None = None, esb_config: EsbConfig | None = None) -> bool:
+    try:
+        return await get_dongle_session(dongle, esb_config).cancel_test_async()
+    except RFTestDongleError as err:
+        logger.error(err)
+        return False
+
+
+def get_dongle_version(dongle: str | None = None) -> str:
+    return get_dongle_session(dongle).get_dongle_version()
+
+
+async def get_dongle_version_async(dongle: str | None = None) -> str:
+    return await get_dongle_session(dongle).get_dongle_version_async()
+
+
+def get_test_modes() -> List[str]:
+    return [mode.name.replace('_', ' ') for mode in TestModes]
+
+
+def get_data_rates() -> List[str]:
+    return [rate.name.replace('_', ' ') for rate in DataRates]
+
+
+def recover(snr: int):
+    Nrfutil(snr=snr).recover()
+
+
+async def recover_async(snr: int):
+    await AsyncNrfutil(snr=snr).recover()
+
+
+def read_memory(snr: int, addr: int, size: int, core: Core = Core.APPLICATION) -> memoryview:
+    return Nrfutil(snr).read_range(addr, size, core)
+
+
+def reset(snr: int, type: ResetType = ResetType.PIN):
+    Nrfutil(snr).reset(type)
+
+
+async def reset_async(snr: int, type: ResetType = ResetType.PIN):
+    await AsyncNrfutil(snr).reset(type)
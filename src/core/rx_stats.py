@@ -0,0 +1,205 @@
+import csv
+import threading
+import time
+from typing import List
+import numpy as np
+from loguru import logger
+from src.modules.rf_test_dongle_api import (
+    RadioConfig,
+    RxStatsRecord,
+    EsbConfig,
+    CMD_SEND_PACKET,
+    RF_CMD_RX_STATS,
+    RX_STATS_READ_TIMEOUT,
+    get_session,
+)
+from src.modules.rf_test_exception import RFTestException
+import src.core.logic as core
+
+DEFAULT_CAPACITY = 65536
+MAX_WINDOW_MS = 2550
+# Margin for the ESB restart after the measurement, reading the records is retried anyway
+MEASURE_MARGIN = 0.05
+
+SAMPLE_DTYPE = np.dtype(
+    [
+        ('timestamp', 'f8'),
+        ('channel', 'u1'),
+        ('data_rate', 'u1'),
+        ('window_ms', 'u2'),
+        ('packets', 'u4'),
+        ('pattern_errors', 'u4'),
+        ('crc_errors', 'u4'),
+        ('expected', 'u4'),
+    ]
+)
+
+CHANNEL_DTYPE = np.dtype(
+    [
+        ('channel', 'u1'),
+        ('samples', 'u4'),
+        ('packets', 'u8'),
+        ('pattern_errors', 'u8'),
+        ('crc_errors', 'u8'),
+        ('expected', 'u8'),
+        ('per', 'f8'),
+        ('per_min', 'f8'),
+        ('per_max', 'f8'),
+        ('packet_rate', 'f8'),
+    ]
+)
+
+
+def packet_losses(samples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the lost and total packets per sample. With a known number of transmitted packets everything but
+    the packets received intact counts as lost, otherwise the lost packets are the ones received with a CRC or
+    pattern error out of all received packets. CRC errors are not part of the packets counter.
+    '''
+    expected = samples['expected'].astype('f8')
+    packets = samples['packets'].astype('f8')
+    pattern_errors = samples['pattern_errors'].astype('f8')
+    crc_errors = samples['crc_errors'].astype('f8')
+    known = expected > 0
+    lost = np.where(known, np.maximum(expected - (packets - pattern_errors), 0), pattern_errors + crc_errors)
+    total = np.where(known, expected, packets + crc_errors)
+    return lost, total
+
+
+class RxStatsBuffer:
+    '''
+    Ring buffer of RX statistics samples from the DUT, keeping the newest samples when full.
+    '''
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.samples = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self.size = 0
+        self.head = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, records: List[RxStatsRecord], expected_rate: float | None = None, timestamp: float | None = None):
+        '''
+        Adds the records of one measurement. expected_rate is the packet rate in packets/s of the reference
+        transmitter, if known.
+        '''
+        if not records:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        new = np.array(
+            [
+                (
+                    timestamp,
+                    record.channel,
+                    record.data_rate,
+                    record.window_ms,
+                    record.packets,
+                    record.pattern_errors,
+                    record.crc_errors,
+                    round(expected_rate * record.window_ms / 1000) if expected_rate else 0,
+                )
+                for record in records
+            ],
+            dtype=SAMPLE_DTYPE,
+        )[-len(self.samples) :]
+        with self.lock:
+            indices = (self.head + np.arange(len(new))) % len(self.samples)
+            self.samples[indices] = new
+            self.head = (self.head + len(new)) % len(self.samples)
+            self.size = min(self.size + len(new), len(self.samples))
+
+    def values(self) -> np.ndarray:
+        '''
+        Returns a copy of the samples, oldest first.
+        '''
+        with self.lock:
+            if self.size < len(self.samples):
+                return self.samples[: self.size].copy()
+            return np.roll(self.samples, -self.head)
+
+    def clear(self):
+        with self.lock:
+            self.size = 0
+            self.head = 0
+
+    def per_channel(self) -> np.ndarray:
+        '''
+        Aggregates the samples per channel: totals, PER over all samples, PER spread and received packet rate.
+        '''
+        samples = self.values()
+        channels, inverse = np.unique(samples['channel'], return_inverse=True)
+        result = np.zeros(len(channels), dtype=CHANNEL_DTYPE)
+        if not len(channels):
+            return result
+        result['channel'] = channels
+        result['samples'] = np.bincount(inverse, minlength=len(channels))
+        for name in ['packets', 'pattern_errors', 'crc_errors', 'expected']:
+            result[name] = np.bincount(inverse, weights=samples[name], minlength=len(channels))
+        lost, total = packet_losses(samples)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            channel_lost = np.bincount(inverse, weights=lost, minlength=len(channels))
+            result['per'] = channel_lost / np.bincount(inverse, weights=total, minlength=len(channels))
+            per = lost / total
+        # fmin and fmax skip the NaN of samples without packets
+        result['per_min'] = np.inf
+        result['per_max'] = -np.inf
+        np.fmin.at(result['per_min'], inverse, per)
+        np.fmax.at(result['per_max'], inverse, per)
+        result['per_min'][np.isinf(result['per_min'])] = np.nan
+        result['per_max'][np.isinf(result['per_max'])] = np.nan
+        duration = np.bincount(inverse, weights=samples['window_ms'], minlength=len(channels)) / 1000
+        result['packet_rate'] = result['packets'] / duration
+        return result
+
+
+rx_stats_buffer = RxStatsBuffer()
+
+
+def measure_rx_stats(
+    first_channel: int,
+    last_channel: int,
+    data_rate: str,
+    window_ms: int = 100,
+    expected_rate: float | None = None,
+    buffer: RxStatsBuffer = rx_stats_buffer,
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+) -> List[RxStatsRecord]:
+    '''
+    Lets the DUT count received packets for window_ms on each channel from first to last channel and reads
+    the counters back through the ESB ACK payloads. The records are added to the buffer.
+    '''
+    if not 10 <= window_ms <= MAX_WINDOW_MS:
+        raise RFTestException(f'RX stats window must be 10 to {MAX_WINDOW_MS} ms')
+    last_channel = max(first_channel, last_channel)
+    radio_config = core.parse_radio_config(
+        RadioConfig(
+            first_channel=first_channel,
+            last_channel=last_channel,
+            radio_power=window_ms // 10,
+            data_rate=data_rate,
+            rf_cmd=core.TestModes.RX.name,
+            fem_config=0,
+            usb_cmd=CMD_SEND_PACKET,
+        )
+    )
+    radio_config.rf_cmd = RF_CMD_RX_STATS
+    session = get_session(dongle, esb_config)
+    if not session.send_cmd(radio_config):
+        logger.error('RX stats measurement not acknowledged by the DUT')
+        return []
+    start = time.monotonic()
+    time.sleep((last_channel - first_channel + 1) * window_ms / 1000 + MEASURE_MARGIN)
+    records = session.run(lambda dongle: dongle.read_rx_stats(RX_STATS_READ_TIMEOUT))
+    logger.debug(f'Read {len(records)} RX stats records in {time.monotonic() - start:.2f} s')
+    buffer.append(records, expected_rate)
+    return records
+
+
+def save_per_channel(stats: np.ndarray, file_path: str):
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(stats.dtype.names)
+        writer.writerows(stats.tolist())
@@ -0,0 +1,170 @@
+import csv
+import itertools
+import time
+from dataclasses import dataclass, asdict, fields
+from typing import Callable, List
+from loguru import logger
+from yaml import safe_load, YAMLError
+from src.modules.nrfutil_wrapper import API as Nrfutil, ResetType
+from src.modules.rf_test_dongle_api import (
+    RadioConfig,
+    RFTestDongleError,
+    EsbConfig,
+    CMD_SEND_PACKET,
+    RECONFIGURE_TIMEOUT,
+    RESEND_INTERVAL,
+    get_session,
+    with_command_windows,
+)
+from src.modules.rf_test_exception import RFTestException
+import src.core.logic as core
+
+DEFAULT_DWELL = 1.0
+BOOT_ACK_TIMEOUT = 2.0
+
+
+@dataclass
+class TestStep:
+    mode: str
+    channel: int = 40
+    last_channel: int = 80
+    power: int = 0
+    data_rate: str = 'BLE_1_Mbit'
+    fem_config: int = 0
+    dwell: float = DEFAULT_DWELL
+
+    def radio_config(self) -> RadioConfig:
+        return core.parse_radio_config(
+            RadioConfig(
+                first_channel=self.channel,
+                last_channel=self.last_channel,
+                radio_power=self.power,
+                data_rate=self.data_rate,
+                rf_cmd=self.mode,
+                fem_config=self.fem_config,
+                usb_cmd=CMD_SEND_PACKET,
+            )
+        )
+
+
+@dataclass
+class StepResult:
+    step: TestStep
+    timestamp: float
+    success: bool
+    ack_latency: float | None = None
+
+
+def make_step(values: dict, defaults: dict) -> TestStep:
+    if not isinstance(values, dict):
+        raise RFTestException(f'Test plan step must be a mapping, got {values!r}')
+    if None in values:
+        raise RFTestException(f'Test plan row has more values than columns: {values[None]}')
+    values = {**defaults, **{key: value for key, value in values.items() if value not in (None, '')}}
+    unknown = values.keys() - {f.name for f in fields(TestStep)}
+    if unknown:
+        raise RFTestException(f'Unknown test plan keys: {", ".join(sorted(map(str, unknown)))}')
+    if 'mode' not in values:
+        raise RFTestException(f'Test plan step without a mode: {values}')
+    step = TestStep(**values)
+    for name, cast in [('channel', int), ('last_channel', int), ('power', int), ('fem_config', int), ('dwell', float)]:
+        try:
+            setattr(step, name, cast(getattr(step, name)))
+        except (TypeError, ValueError):
+            raise RFTestException(f'Invalid test plan {name}: {getattr(step, name)!r}')
+    step.mode = str(step.mode).replace(' ', '_')
+    step.data_rate = str(step.data_rate).replace(' ', '_')
+    if step.mode not in core.TestModes.__members__:
+        raise RFTestException(f'Unknown test mode: {step.mode}')
+    if step.data_rate not in core.DataRates.__members__:
+        raise RFTestException(f'Unknown data rate: {step.data_rate}')
+    return step
+
+
+def load_test_plan(file_path: str) -> List[TestStep]:
+    '''
+    Loads a test plan from a CSV file with one step per row, or from a YAML file with a list of steps
+    and/or a matrix where every combination of the listed values becomes a step.
+    '''
+    try:
+        if file_path.lower().endswith('.csv'):
+            with open(file_path, 'r', newline='') as f:
+                return [make_step(row, {}) for row in csv.DictReader(f)]
+
+        with open(file_path, 'r') as f:
+            plan = safe_load(f) or {}
+    except (OSError, UnicodeDecodeError, csv.Error, YAMLError) as err:
+        raise RFTestException(f'Could not read test plan {file_path}: {err}')
+    if not isinstance(plan, dict):
+        raise RFTestException(f'Test plan {file_path} must be a mapping with steps and/or a matrix')
+    defaults = {'dwell': plan.get('dwell', DEFAULT_DWELL)}
+    if not isinstance(plan.get('steps', []), list):
+        raise RFTestException('Test plan steps must be a list')
+    steps = [make_step(step, defaults) for step in plan.get('steps', [])]
+    if matrix := plan.get('matrix'):
+        if not isinstance(matrix, dict):
+            raise RFTestException('Test plan matrix must be a mapping of keys to values')
+        matrix = {key: value if isinstance(value, list) else [value] for key, value in matrix.items()}
+        for combination in itertools.product(*matrix.values()):
+            steps.append(make_step(dict(zip(matrix.keys(), combination)), defaults))
+    return steps
+
+
+def send_step(step: TestStep, timeout: float) -> Callable:
+    # The next step replaces this one in a command window
+    radio_config = with_command_windows(step.radio_config())
+
+    def send(dongle) -> tuple[bool, float | None]:
+        dongle.set_config(radio_config)
+        return dongle.send_cmd(timeout=timeout, resend_interval=RESEND_INTERVAL), dongle.ack_latency
+
+    return send
+
+
+def run_test_plan(
+    steps: List[TestStep],
+    snr: int | None = None,
+    on_step: Callable[[StepResult], None] | None = None,
+    dongle: str | None = None,
+    esb_config: EsbConfig | None = None,
+) -> List[StepResult]:
+    '''
+    Runs the test plan steps back to back over the shared dongle session, keeping each step for its dwell time.
+    Each step replaces the running test in the DUT's next command window. If the debugger SNR is given a DUT
+    not acknowledging a step is reset and the step sent again, for test firmware without command windows.
+    '''
+    session = get_session(dongle, esb_config)
+    debugger = Nrfutil(snr) if snr else None
+    results = []
+    for index, step in enumerate(steps):
+        start = time.monotonic()
+        timestamp = time.time()
+        logger.info(f'Step {index + 1}/{len(steps)}: {step}')
+        try:
+            success, ack_latency = session.run(send_step(step, RECONFIGURE_TIMEOUT))
+            if not success and debugger and index > 0:
+                logger.info(f'Resetting the DUT for step {index + 1}')
+                debugger.reset(ResetType.DEBUG)
+                success, ack_latency = session.run(send_step(step, BOOT_ACK_TIMEOUT))
+        except RFTestDongleError as err:
+            logger.error(err)
+            success = False
+            ack_latency = None
+        result = StepResult(step=step, timestamp=timestamp, success=success, ack_latency=ack_latency)
+        results.append(result)
+        if on_step:
+            on_step(result)
+        if not success:
+            logger.error(f'Step {index + 1} was not acknowledged by the DUT')
+        time.sleep(max(0.0, start + step.dwell - time.monotonic()))
+    return results
+
+
+def save_results(results: List[StepResult], file_path: str):
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', *[f.name for f in fields(TestStep)], 'success', 'ack_latency'])
+        for result in results:
+            writer.writerow(
+                [f'{result.timestamp:.6f}', *asdict(result.step).values(), result.success, result.ack_latency]
+            )
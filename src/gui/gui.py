@@ -1,12 +1,14 @@
 from PySide6.QtWidgets import QMainWindow, QApplication, QMessageBox
 from src.gui.qt.ui_MainWindow import Ui_MainWindow
 import src.gui.logic as gui_logic
+import src.core.logic as core
 from typing import List
 import __main__
 
 DEFAULT_TX_POWER = 0
 DEFAULT_FIRST_CHANNEL = 40
 DEFAULT_LAST_CHANNEL = 80
+DEFAULT_DWELL_TIME = 10
 
 
 class MainWindow(Ui_MainWindow, QMainWindow):
@@ -24,8 +26,9 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         '''
         # GUI button signals
         self.flashButton.clicked.connect(self.flashDevice)
+        self.flashAllButton.clicked.connect(self.flashAllDevices)
         self.recoverButton.clicked.connect(self.recoverDevice)
-        self.detectDeviceButton.clicked.connect(self.getDevice)
+        self.detectDeviceButton.clicked.connect(self.detectDevice)
         self.updateDebuggersButton.clicked.connect(self.getDebuggers)
         self.FEM.toggled.connect(self.femSettingsVisibility)
         self.startButton.clicked.connect(self.startTest)
@@ -33,6 +36,7 @@ class MainWindow(Ui_MainWindow, QMainWindow):
 
         # GUI update signals
         self.signals.flash_device_result.connect(self.updateFlashButton)
+        self.signals.fleet_flash_result.connect(self.updateFlashAllButton)
         self.signals.update_device.connect(self.updateDevice)
         self.signals.dongle_fw_version.connect(self.updateDongleFWVersion)
         self.signals.connected_debuggers.connect(self.updateDebuggers)
@@ -51,17 +55,18 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         Updates GUI fields with static and initial information.
         '''
         self.getDebuggers()
-        self.dongleFWVersionTask = gui_logic.DongleFWVersionTask()
-        self.dongleFWVersionTask.start()
-        self.deviceVersion.addItems(gui_logic.get_devices())
+        gui_logic.debugger_registry.start()
+        gui_logic.event_loop.submit(gui_logic.get_dongle_fw_version())
+        self.deviceVersion.addItems(core.get_devices())
         self.rfTestVersion.setText(__main__.VERSION)
         self.femSettingsVisibility()
         self.loadCapVisibility(self.deviceVersion.currentText())
-        self.testType.addItems(gui_logic.get_test_modes())
-        self.dataRate.addItems(gui_logic.get_data_rates())
+        self.testType.addItems(core.get_test_modes())
+        self.dataRate.addItems(core.get_data_rates())
         self.outputPower.setText(str(DEFAULT_TX_POWER))
         self.firstChannel.setText(str(DEFAULT_FIRST_CHANNEL))
         self.lastChannel.setText(str(DEFAULT_LAST_CHANNEL))
+        self.dwellTime.setValue(DEFAULT_DWELL_TIME)
         self.testModeConfig(self.testType.currentText())
 
     def getDevice(self):
@@ -70,7 +75,29 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         '''
         snr = self.debuggerSNR.currentText()
         if snr != '':
-            gui_logic.detect_device(snr)
+            gui_logic.event_loop.submit(gui_logic.detect_device_async(snr))
+
+    def getFemConfig(self) -> dict | None:
+        '''
+        Gets the FEM pin config from the GUI fields, None if FEM is disabled.
+        '''
+        if not self.FEM.isChecked():
+            return None
+        return {
+            'pinTXEN': self.txEnPin.text(),
+            'pinRXEN': self.rxEnPin.text(),
+            'pinPDN': self.pdnPin.text(),
+            'pinMODE': self.modePin.text(),
+            'pinANTSEL': self.antSelPin.text(),
+        }
+
+    def detectDevice(self):
+        '''
+        Probes the device connected to selected debugger, bypassing the device cache.
+        '''
+        snr = self.debuggerSNR.currentText()
+        if snr != '':
+            gui_logic.event_loop.submit(gui_logic.detect_device_async(snr, refresh=True))
 
     def flashDevice(self):
         '''
@@ -78,22 +105,22 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         '''
         self.flashButton.setStyleSheet("background-color: light gray")
         self.flashButton.setText("Flashing...")
-        fem_config = None
-        if self.FEM.isChecked():
-            fem_config = {
-                'pinTXEN': self.txEnPin.text(),
-                'pinRXEN': self.rxEnPin.text(),
-                'pinPDN': self.pdnPin.text(),
-                'pinMODE': self.modePin.text(),
-                'pinANTSEL': self.antSelPin.text(),
-            }
         self.flasher_task = gui_logic.FlashFWTask(
             self.debuggerSNR.currentText(),
             self.loadCapacitor.text(),
-            fem_config,
+            self.getFemConfig(),
         )
         self.flasher_task.start()
 
+    def flashAllDevices(self):
+        '''
+        Programs the devices on all connected debuggers in parallel.
+        '''
+        self.flashAllButton.setStyleSheet("background-color: light gray")
+        self.flashAllButton.setText("Flashing...")
+        self.fleetFlasherTask = gui_logic.FlashFleetTask(self.loadCapacitor.text(), self.getFemConfig())
+        self.fleetFlasherTask.start()
+
     def recoverDevice(self):
         '''
         Recovers the device connected to the selected debugger.
@@ -101,8 +128,7 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         snr = self.debuggerSNR.currentText()
         if snr != '':
             self.recoverButton.setText('Recovering...')
-            self.recoverTask = gui_logic.RecoverTask(snr)
-            self.recoverTask.start()
+            gui_logic.event_loop.submit(gui_logic.recover_device(snr))
 
     def getDebuggers(self):
         '''
@@ -121,6 +147,18 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         else:
             self.flashButton.setStyleSheet("background-color: red")
 
+    def updateFlashAllButton(self, results: list):
+        self.flashAllButton.setText("Flash all")
+        failed = [str(result.snr) for result in results if not result.success]
+        if results and not failed:
+            self.flashAllButton.setStyleSheet("background-color: green")
+        else:
+            self.flashAllButton.setStyleSheet("background-color: red")
+            if failed:
+                self.errorDialog(f"Flashing failed for: {', '.join(failed)}")
+            else:
+                self.errorDialog("No debuggers connected")
+
     def updateStartButton(self, success: bool):
         if success:
             self.startButton.setStyleSheet("background-color: green")
@@ -155,8 +193,14 @@ class MainWindow(Ui_MainWindow, QMainWindow):
             fem_config=self.modeSetting.value() + self.antSelSetting.value() * 2,
             usb_cmd=0x0B,
         )
-        self.testTask = gui_logic.StartTestTask(radio_config)
-        self.testTask.start()
+        if 'sweep' in radio_config.rf_cmd and (
+            self.hopChannels.text().strip() or self.dwellTime.value() != DEFAULT_DWELL_TIME
+        ):
+            gui_logic.event_loop.submit(
+                gui_logic.start_hop_sweep(radio_config, self.hopChannels.text(), self.dwellTime.value())
+            )
+        else:
+            gui_logic.event_loop.submit(gui_logic.start_rf_test(radio_config))
 
     def run(self):
         self.show()
@@ -178,7 +222,7 @@ class MainWindow(Ui_MainWindow, QMainWindow):
         Sets the visibility of the HFXO load capacitor settings.
         '''
 
-        if gui_logic.devices.get(device).get('load_cap'):
+        if core.load_devices().get(device).get('load_cap'):
             self.loadCapacitorLabel.setVisible(True)
             self.loadCapacitor.setVisible(True)
         else:
@@ -186,14 +230,17 @@ class MainWindow(Ui_MainWindow, QMainWindow):
             self.loadCapacitor.setVisible(False)
 
     def testModeConfig(self, mode: str):
-        if 'sweep' in mode:
-            self.lastChannel.setVisible(True)
-            self.lastChannelLabel.setVisible(True)
+        sweep = 'sweep' in mode
+        self.lastChannel.setVisible(sweep)
+        self.lastChannelLabel.setVisible(sweep)
+        self.hopChannels.setVisible(sweep)
+        self.hopChannelsLabel.setVisible(sweep)
+        self.dwellTime.setVisible(sweep)
+        self.dwellTimeLabel.setVisible(sweep)
+        if sweep:
             self.firstChannel.setText('2')
             self.firstChannelLabel.setText('Start Frequency')
         else:
-            self.lastChannel.setVisible(False)
-            self.lastChannelLabel.setVisible(False)
             self.firstChannelLabel.setText('Frequency')
 
         if 'Unmodulated' in mode and 'TX' in mode:
@@ -214,6 +261,8 @@ class MainWindow(Ui_MainWindow, QMainWindow):
     def resetButtonState(self):
         self.flashButton.setStyleSheet("background-color: light gray")
         self.flashButton.setText("Flash")
+        self.flashAllButton.setStyleSheet("background-color: light gray")
+        self.flashAllButton.setText("Flash all")
 
 
 class GUI:
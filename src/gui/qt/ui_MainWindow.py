@@ -258,6 +258,11 @@ class Ui_MainWindow(object):
 
         self.buttonRow2.addWidget(self.updateDebuggersButton)
 
+        self.flashAllButton = QPushButton(self.buttonWidget)
+        self.flashAllButton.setObjectName(u"flashAllButton")
+
+        self.buttonRow2.addWidget(self.flashAllButton)
+
 
         self.buttonRows.addLayout(self.buttonRow2)
 
@@ -345,6 +350,29 @@ class Ui_MainWindow(object):
 
         self.formLayout_2.setWidget(4, QFormLayout.FieldRole, self.lastChannel)
 
+        self.hopChannelsLabel = QLabel(self.rfTestWiget)
+        self.hopChannelsLabel.setObjectName(u"hopChannelsLabel")
+
+        self.formLayout_2.setWidget(5, QFormLayout.LabelRole, self.hopChannelsLabel)
+
+        self.hopChannels = QLineEdit(self.rfTestWiget)
+        self.hopChannels.setObjectName(u"hopChannels")
+
+        self.formLayout_2.setWidget(5, QFormLayout.FieldRole, self.hopChannels)
+
+        self.dwellTimeLabel = QLabel(self.rfTestWiget)
+        self.dwellTimeLabel.setObjectName(u"dwellTimeLabel")
+
+        self.formLayout_2.setWidget(6, QFormLayout.LabelRole, self.dwellTimeLabel)
+
+        self.dwellTime = QSpinBox(self.rfTestWiget)
+        self.dwellTime.setObjectName(u"dwellTime")
+        self.dwellTime.setMinimum(1)
+        self.dwellTime.setMaximum(65535)
+        self.dwellTime.setValue(10)
+
+        self.formLayout_2.setWidget(6, QFormLayout.FieldRole, self.dwellTime)
+
 
         self.verticalLayout_2.addLayout(self.formLayout_2)
 
@@ -468,6 +496,10 @@ class Ui_MainWindow(object):
         self.updateDebuggersButton.setToolTip(QCoreApplication.translate("MainWindow", u"<html><head/><body><p>Gets all debuggers available.</p></body></html>", None))
 #endif // QT_CONFIG(tooltip)
         self.updateDebuggersButton.setText(QCoreApplication.translate("MainWindow", u"Get debuggers", None))
+#if QT_CONFIG(tooltip)
+        self.flashAllButton.setToolTip(QCoreApplication.translate("MainWindow", u"<html><head/><body><p>Flash test firmware to all DUTs on all connected debuggers in parallel.</p></body></html>", None))
+#endif // QT_CONFIG(tooltip)
+        self.flashAllButton.setText(QCoreApplication.translate("MainWindow", u"Flash all", None))
         self.label.setText(QCoreApplication.translate("MainWindow", u"Test config", None))
         self.testLabel.setText(QCoreApplication.translate("MainWindow", u"Test", None))
 #if QT_CONFIG(tooltip)
@@ -485,6 +517,14 @@ class Ui_MainWindow(object):
         self.lastChannelLabel.setText(QCoreApplication.translate("MainWindow", u"Last Frequency", None))
 #if QT_CONFIG(tooltip)
         self.lastChannel.setToolTip(QCoreApplication.translate("MainWindow", u"<html><head/><body><p>Ending sweep frequency in MHz offset from 2400MHz.</p></body></html>", None))
+#endif // QT_CONFIG(tooltip)
+        self.hopChannelsLabel.setText(QCoreApplication.translate("MainWindow", u"Hop Frequencies", None))
+#if QT_CONFIG(tooltip)
+        self.hopChannels.setToolTip(QCoreApplication.translate("MainWindow", u"<html><head/><body><p>Sweep frequencies in MHz offset from 2400MHz in hop order, e.g. 2, 26, 40-44, 80. The start and stop frequency are used if empty.</p></body></html>", None))
+#endif // QT_CONFIG(tooltip)
+        self.dwellTimeLabel.setText(QCoreApplication.translate("MainWindow", u"Dwell Time (ms)", None))
+#if QT_CONFIG(tooltip)
+        self.dwellTime.setToolTip(QCoreApplication.translate("MainWindow", u"<html><head/><body><p>Time in ms spent on each sweep frequency.</p></body></html>", None))
 #endif // QT_CONFIG(tooltip)
         self.pinSettingsLabel.setText(QCoreApplication.translate("MainWindow", u"FEM config", None))
         self.modeSettingLabel.setText(QCoreApplication.translate("MainWindow", u"Mode", None))
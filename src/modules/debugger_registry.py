@@ -0,0 +1,107 @@
+import threading
+import time
+from typing import Callable, List
+from loguru import logger
+import usb
+from src.modules.nrfutil_wrapper import API as Nrfutil
+
+SEGGER_VENDOR_ID = 0x1366
+
+
+class DebuggerRegistry:
+    '''
+    Keeps the set of connected J-Link debuggers in memory. A background thread polls the USB bus for
+    J-Link attach/detach, which does not open the devices or start nrfutil, and only looks up the serial
+    numbers again when the bus changes or the cached list is older than the TTL.
+    '''
+
+    def __init__(self, ttl: float = 30.0, poll_interval: float = 1.0):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.debuggers: List[int] = []
+        self.updated: float | None = None
+        self.fingerprint: frozenset | None = None
+        self.listeners: List[Callable[[List[int], List[int], List[int]], None]] = []
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def add_listener(self, callback: Callable[[List[int], List[int], List[int]], None]):
+        '''
+        Registers a callback called with (debuggers, attached, detached) when the debugger set changes.
+        '''
+        self.listeners.append(callback)
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.__poll, name='DebuggerRegistry', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def watching(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def get(self) -> List[int]:
+        with self.lock:
+            if self.updated is not None and time.monotonic() - self.updated < self.ttl:
+                return list(self.debuggers)
+        return self.refresh()
+
+    def refresh(self) -> List[int]:
+        with self.lock:
+            fingerprint, serials = self.__enumerate_usb()
+            if serials is None:
+                serials = Nrfutil().get_debuggers()
+                if serials is None:
+                    return list(self.debuggers)
+            self.fingerprint = fingerprint
+            self.__update(sorted(serials))
+            return list(self.debuggers)
+
+    def __update(self, debuggers: List[int]):
+        attached = [snr for snr in debuggers if snr not in self.debuggers]
+        detached = [snr for snr in self.debuggers if snr not in debuggers]
+        self.debuggers = debuggers
+        self.updated = time.monotonic()
+        if attached or detached:
+            logger.debug(f'Debuggers changed, attached: {attached} detached: {detached}')
+            for callback in self.listeners:
+                callback(list(debuggers), attached, detached)
+
+    def __enumerate_usb(self, read_serials: bool = True) -> tuple[frozenset | None, List[int] | None]:
+        '''
+        Returns a fingerprint of the J-Link USB devices and their serial numbers. The serial numbers are
+        None if they can not be read over USB, e.g. without permission to open the device.
+        '''
+        try:
+            devices = list(usb.core.find(find_all=True, idVendor=SEGGER_VENDOR_ID))
+        except (usb.core.NoBackendError, usb.core.USBError) as err:
+            logger.debug(f'USB enumeration not available: {err}')
+            return None, None
+        fingerprint = frozenset((dev.bus, dev.address) for dev in devices)
+        if not read_serials:
+            return fingerprint, None
+        try:
+            serials = [int(dev.serial_number) for dev in devices]
+        except (usb.core.USBError, ValueError, TypeError, NotImplementedError):
+            serials = None
+        return fingerprint, serials
+
+    def __poll(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                fingerprint, _ = self.__enumerate_usb(read_serials=False)
+                if fingerprint is None:
+                    logger.debug('USB enumeration not available, stopping debugger polling')
+                    return
+                if fingerprint != self.fingerprint:
+                    self.refresh()
+            except Exception as err:
+                logger.error(f'Debugger polling failed: {err}')
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from dataclasses import asdict
+from loguru import logger
+from src.modules.nrfutil_wrapper import API as Nrfutil, AsyncAPI as AsyncNrfutil, DeviceInfo, Core
+
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), '.rf_test_cache', 'devices.json')
+
+
+class DeviceCache:
+    '''
+    Remembers the device version and info read through each debugger SNR, so the device is only probed
+    again after the debugger is detached or the device is recovered or erased.
+    Set path to keep the cache between sessions.
+    '''
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.devices: dict[str, dict] = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.devices = json.load(f).get('devices', {})
+        except (OSError, ValueError) as err:
+            logger.error(f'Could not load device cache: {err}')
+            self.devices = {}
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump({'devices': self.devices}, f, indent=2)
+        except OSError as err:
+            logger.error(f'Could not save device cache: {err}')
+
+    def __get(self, snr: int, key: str):
+        with self.lock:
+            return self.devices.get(str(snr), {}).get(key)
+
+    def __set(self, snr: int, key: str, value):
+        with self.lock:
+            self.devices.setdefault(str(snr), {})[key] = value
+            self.save()
+
+    def get_device_version(self, snr: int, refresh: bool = False) -> str:
+        if not refresh and (version := self.__get(snr, 'version')):
+            logger.debug(f'{snr}: Cached device version: {version}')
+            return version
+        version = Nrfutil(snr).get_device_version()
+        self.__set(snr, 'version', version)
+        return version
+
+    async def get_device_version_async(self, snr: int, refresh: bool = False) -> str:
+        if not refresh and (version := self.__get(snr, 'version')):
+            logger.debug(f'{snr}: Cached device version: {version}')
+            return version
+        version = await AsyncNrfutil(snr).get_device_version()
+        self.__set(snr, 'version', version)
+        return version
+
+    def get_device_info(self, snr: int, refresh: bool = False) -> DeviceInfo:
+        if not refresh and (info := self.__get(snr, 'info')):
+            logger.debug(f'{snr}: Cached device info: {info}')
+            return DeviceInfo(**info)
+        info = Nrfutil(snr).get_device_info()
+        self.__set(snr, 'info', asdict(info))
+        return info
+
+    def get_device_id(self, snr: int, addr: int, core: Core = Core.APPLICATION, refresh: bool = False) -> int:
+        '''
+        Reads the first FICR device ID word at addr, used for the DUT's own ESB address.
+        '''
+        if not refresh and (device_id := self.__get(snr, 'device_id')) is not None:
+            logger.debug(f'{snr}: Cached device ID: {device_id:08X}')
+            return device_id
+        device_id = Nrfutil(snr).read(addr, core)
+        self.__set(snr, 'device_id', device_id)
+        return device_id
+
+    def invalidate(self, snr: int):
+        with self.lock:
+            if self.devices.pop(str(snr), None) is not None:
+                logger.debug(f'{snr}: Invalidating device cache')
+                self.save()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine
+from loguru import logger
+
+
+class EventLoopThread:
+    '''
+    Runs an asyncio event loop on a daemon thread, so synchronous callers such as the Qt GUI can schedule
+    coroutines without blocking. A single loop drives all concurrent nrfutil and dongle operations.
+    '''
+
+    def __init__(self, name: str = 'EventLoop'):
+        self.name = name
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread and self.thread.is_alive():
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=self.__run, name=self.name, daemon=True)
+            self.thread.start()
+
+    def __run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        '''
+        Schedules the coroutine on the loop, the returned future can be waited on from any thread.
+        '''
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self.__log_exception)
+        return future
+
+    def run(self, coro: Coroutine, timeout: float | None = None) -> Any:
+        return self.submit(coro).result(timeout)
+
+    def __log_exception(self, future: Future):
+        if not future.cancelled() and (err := future.exception()):
+            logger.error(f'Unhandled error in {self.name} task: {err!r}')
+
+    def stop(self):
+        with self.lock:
+            if not self.thread:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.thread = None
+
+
+event_loop = EventLoopThread()
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+from loguru import logger
+from src.modules.intel_hex import IntelHex, IntelHexError
+
+DEFAULT_CACHE_PATH = os.path.join(os.getcwd(), '.rf_test_cache', 'firmware.json')
+# Segments further apart than this are separate regions, e.g. flash and UICR
+IMAGE_GAP = 0x10000
+
+
+class FirmwareCache:
+    '''
+    Keeps the hash of every hex file and the image last programmed per debugger SNR and core, so
+    programming can be skipped when the DUT already runs the requested image.
+    '''
+
+    def __init__(self, path: str | None = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.hashes: dict[str, tuple[float, int, str]] = {}
+        self.images: dict[str, dict[str, dict]] = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.images = json.load(f).get('images', {})
+        except (OSError, ValueError) as err:
+            logger.error(f'Could not load firmware cache: {err}')
+            self.images = {}
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w') as f:
+                json.dump({'images': self.images}, f, indent=2)
+        except OSError as err:
+            logger.error(f'Could not save firmware cache: {err}')
+
+    def file_hash(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        with self.lock:
+            if cached := self.hashes.get(file_path):
+                if cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+                    return cached[2]
+        with open(file_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        with self.lock:
+            self.hashes[file_path] = (stat.st_mtime, stat.st_size, digest)
+        return digest
+
+    def image_span(self, file_path: str) -> dict:
+        '''
+        Describes the first region of the image, up to a gap of IMAGE_GAP bytes so UICR records are left out,
+        as a word aligned span to read back, the segments the image defines in it and the sha256 of their data.
+        '''
+        try:
+            segments = IntelHex.from_file(file_path).segments()
+        except (OSError, IntelHexError) as err:
+            logger.error(err)
+            return {}
+        if not segments:
+            return {}
+        start = segments[0][0] & ~0x3
+        end = segments[0][0]
+        region = []
+        for addr, data in segments:
+            if addr - end >= IMAGE_GAP:
+                break
+            region.append((addr - start, data))
+            end = addr + len(data)
+        return {
+            'span': [start, (end - start + 3) & ~0x3],
+            'segments': [[offset, len(data)] for offset, data in region],
+            'digest': hashlib.sha256(b''.join(data for _, data in region)).hexdigest(),
+        }
+
+    @staticmethod
+    def span_digest(data: memoryview, segments: list[list[int]]) -> str:
+        digest = hashlib.sha256()
+        for offset, size in segments:
+            digest.update(data[offset : offset + size])
+        return digest.hexdigest()
+
+    def cached_entry(self, snr: int, hex_file) -> dict | None:
+        '''
+        Returns the entry if the hex file was the last image programmed to the device, else None.
+        '''
+        with self.lock:
+            entry = self.images.get(str(snr), {}).get(hex_file.core.name)
+        if not entry or entry.get('sha256') != self.file_hash(hex_file.file_path) or 'span' not in entry:
+            return None
+        return entry
+
+    def matches(self, snr: int, entry: dict, data: memoryview) -> bool:
+        if self.span_digest(data, entry['segments']) != entry['digest']:
+            start, size = entry['span']
+            logger.debug(f'{snr}: Digest mismatch in {hex(start)}-{hex(start + size)}, image is not on device')
+            return False
+        return True
+
+    def is_programmed(self, debugger, hex_file) -> bool:
+        '''
+        Checks if the hex file was the last image programmed to the debugger's device, and confirms it
+        by reading the image span back in one read and comparing the digest of the bytes the image defines.
+        '''
+        if not (entry := self.cached_entry(debugger.snr, hex_file)):
+            return False
+        return self.matches(debugger.snr, entry, debugger.read_range(*entry['span'], hex_file.core))
+
+    async def is_programmed_async(self, debugger, hex_file) -> bool:
+        if not (entry := self.cached_entry(debugger.snr, hex_file)):
+            return False
+        return self.matches(debugger.snr, entry, await debugger.read_range(*entry['span'], hex_file.core))
+
+    def store(self, snr: int, hex_file):
+        entry = {'sha256': self.file_hash(hex_file.file_path)} | self.image_span(hex_file.file_path)
+        with self.lock:
+            self.images.setdefault(str(snr), {})[hex_file.core.name] = entry
+            self.save()
+
+    def invalidate(self, snr: int):
+        with self.lock:
+            if self.images.pop(str(snr), None) is not None:
+                logger.debug(f'{snr}: Invalidating firmware cache')
+                self.save()
@@ -0,0 +1,122 @@
+from typing import List, Tuple
+from loguru import logger
+
+
+class IntelHexError(Exception):
+    def __init__(self, *args):
+        if args:
+            self.message = f'{" - ".join(map(str,args))}'
+        else:
+            self.message = None
+
+    def __str__(self):
+        if self.message:
+            return 'IntelHexError, {}'.format(self.message)
+        else:
+            return 'IntelHexError occurred'
+
+
+class IntelHex:
+    def __init__(self):
+        self.data: dict[int, int] = {}
+        self.start_address: int | None = None
+
+    @classmethod
+    def from_file(cls, file_path: str) -> 'IntelHex':
+        image = cls()
+        image.load(file_path)
+        return image
+
+    def load(self, file_path: str):
+        logger.debug(f'Parsing hex file: {file_path}')
+        base = 0
+        with open(file_path, 'r') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                if line[0] != ':':
+                    raise IntelHexError(f'{file_path}:{line_number}', 'Missing start code')
+                try:
+                    record = bytes.fromhex(line[1:])
+                except ValueError:
+                    raise IntelHexError(f'{file_path}:{line_number}', 'Invalid hex characters')
+                if len(record) < 5 or len(record) != record[0] + 5:
+                    raise IntelHexError(f'{file_path}:{line_number}', 'Invalid record length')
+                if sum(record) & 0xFF:
+                    raise IntelHexError(f'{file_path}:{line_number}', 'Checksum mismatch')
+
+                length = record[0]
+                offset = int.from_bytes(record[1:3], 'big')
+                record_type = record[3]
+                payload = record[4 : 4 + length]
+                match record_type:
+                    case 0x00:
+                        for i, byte in enumerate(payload):
+                            if self.data.setdefault(base + offset + i, byte) != byte:
+                                raise IntelHexError(
+                                    f'{file_path}:{line_number}', f'Overlapping data at {hex(base + offset + i)}'
+                                )
+                    case 0x01:
+                        break
+                    case 0x02:
+                        base = int.from_bytes(payload, 'big') << 4
+                    case 0x04:
+                        base = int.from_bytes(payload, 'big') << 16
+                    case 0x03 | 0x05:
+                        self.start_address = int.from_bytes(payload, 'big')
+                    case _:
+                        raise IntelHexError(f'{file_path}:{line_number}', f'Unknown record type {record_type}')
+
+    def segments(self) -> List[Tuple[int, bytes]]:
+        '''
+        Returns the image as a list of contiguous (start address, data) segments.
+        '''
+        segments = []
+        start = None
+        data = bytearray()
+        for addr in sorted(self.data):
+            if start is not None and addr != start + len(data):
+                segments.append((start, bytes(data)))
+                start = None
+            if start is None:
+                start = addr
+                data = bytearray()
+            data.append(self.data[addr])
+        if start is not None:
+            segments.append((start, bytes(data)))
+        return segments
+
+    def read_word(self, addr: int) -> int:
+        return int.from_bytes(bytes(self.data.get(addr + i, 0xFF) for i in range(4)), 'little')
+
+    def write_word(self, addr: int, value: int):
+        for i, byte in enumerate(value.to_bytes(4, 'little')):
+            self.data[addr + i] = byte
+
+    def save(self, file_path: str, record_size: int = 16):
+        logger.debug(f'Writing hex file: {file_path}')
+        lines = []
+        upper = None
+        for start, data in self.segments():
+            offset = 0
+            while offset < len(data):
+                addr = start + offset
+                if addr >> 16 != upper:
+                    upper = addr >> 16
+                    lines.append(_record(0, 0x04, upper.to_bytes(2, 'big')))
+                # Records may not cross a 64 kB boundary
+                length = min(record_size, len(data) - offset, 0x10000 - (addr & 0xFFFF))
+                lines.append(_record(addr & 0xFFFF, 0x00, data[offset : offset + length]))
+                offset += length
+        if self.start_address is not None:
+            lines.append(_record(0, 0x05, self.start_address.to_bytes(4, 'big')))
+        lines.append(_record(0, 0x01, b''))
+        with open(file_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+def _record(offset: int, record_type: int, payload: bytes) -> str:
+    record = bytes([len(payload)]) + offset.to_bytes(2, 'big') + bytes([record_type]) + payload
+    checksum = (-sum(record)) & 0xFF
+    return ':' + (record + bytes([checksum])).hex().upper()
@@ -1,10 +1,17 @@
 # from src.modules.rf_test_exception import RFTestException
+import asyncio
 import subprocess
 import json
-from typing import List
+import os
+import struct
+import tempfile
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, List
 from dataclasses import dataclass
 from loguru import logger
 from src.modules.rf_test_exception import RFTestException
+from src.modules.tracing import span
 from enum import Enum
 
 
@@ -21,6 +28,13 @@ class EraseType(Enum):
     UICR = 'uicr'
 
 
+class VerifyType(Enum):
+    READ = 'VERIFY_READ'
+    HASH = 'VERIFY_HASH'
+    FW_VERIFY = 'fw-verify'
+    NONE = 'VERIFY_NONE'
+
+
 class Core(Enum):
     APPLICATION = 'Application'
     NETWORK = 'Network'
@@ -42,6 +56,13 @@ class TestFW:
     core: Core
 
 
+@dataclass
+class ProgramResult:
+    file: TestFW
+    verify: VerifyType
+    skipped: bool = False
+
+
 @dataclass
 class DeviceInfo:
     family: str
@@ -71,30 +92,276 @@ class NrfutilError(Exception):
             return 'NrfutilError occurred'
 
 
-def handle_nrfutil_return(completed) -> dict | None:
-    if completed.stderr:
-        error = completed.stderr.decode('utf-8')
-        logger.error(error)
-        if "LOW_VOLTAGE" in error:
-            raise NrfutilLowVoltageError
-        else:
+# Errors that can not be recovered by waiting for nrfutil, the process is stopped as soon as they appear
+FATAL_ERRORS = {
+    'LOW_VOLTAGE': NrfutilLowVoltageError,
+    'NotAvailableBecauseProtection': NrfutilReadbackError,
+}
+
+
+# Line limit of the asyncio pipes, memory reads are returned on one line
+STREAM_LIMIT = 2**24
+
+
+@dataclass
+class ProgressEvent:
+    snr: int | None
+    operation: str
+    description: str
+    percentage: float
+    step: int | None = None
+    steps: int | None = None
+
+
+class NrfutilOutput:
+    '''
+    Parses nrfutil's JSON lines output while it arrives. Progress messages are passed to on_progress and fatal
+    errors are raised on the line they appear in, so the caller can stop the process early.
+    '''
+
+    def __init__(self, snr: int | None = None, on_progress: Callable[[ProgressEvent], None] | None = None):
+        self.snr = snr
+        self.on_progress = on_progress
+        self.stdout = bytearray()
+        self.stderr = bytearray()
+        self.documents: List[dict] = []
+        self.devices: List[dict] | None = None
+        self.errors: List[str] = []
+
+    def feed_stdout(self, line: bytes):
+        self.stdout += line
+        if not (line := line.strip()):
+            return
+        try:
+            document = json.loads(line)
+        except ValueError:
+            logger.debug(f'{self.snr}: nrfutil: {line.decode("utf-8", errors="replace")}')
+            return
+        if not isinstance(document, dict):
+            return
+        self.documents.append(document)
+        data = document.get('data') if isinstance(document.get('data'), dict) else {}
+        if 'devices' in document:
+            self.devices = document.get('devices')
+        elif 'devices' in data:
+            self.devices = data.get('devices')
+        match document.get('type'):
+            case 'task_progress':
+                progress = data.get('progress', {})
+                event = ProgressEvent(
+                    snr=self.snr,
+                    operation=progress.get('name') or data.get('taskId', ''),
+                    description=progress.get('description') or progress.get('message', ''),
+                    percentage=progress.get('progressPercentage', 0),
+                    step=progress.get('step'),
+                    steps=progress.get('amountOfSteps'),
+                )
+                logger.debug(f'{self.snr}: {event.description} {event.percentage}%')
+                if self.on_progress:
+                    self.on_progress(event)
+            case 'task_end' if data.get('result') == 'fail':
+                error = data.get('error') or {}
+                message = error.get('description') or data.get('message') or 'nrfutil task failed'
+                self.errors.append(message)
+                self.check_fatal(message)
+
+    def feed_stderr(self, line: bytes):
+        self.stderr += line
+        self.check_fatal(line.decode('utf-8', errors='replace'))
+
+    def check_fatal(self, text: str):
+        for marker, error in FATAL_ERRORS.items():
+            if marker in text:
+                logger.error(f'{self.snr}: {text.strip()}')
+                raise error(text.strip())
+
+    def result(self) -> List[dict] | None:
+        '''
+        Returns the device list once the process has exited, raises NrfutilError if it failed.
+        '''
+        if self.stderr:
+            error = self.stderr.decode('utf-8', errors='replace')
+            logger.error(error)
             raise NrfutilError(error)
-    if completed.stdout != b'':
-        return json.loads(completed.stdout).get('devices')
+        if self.errors:
+            raise NrfutilError('; '.join(self.errors))
+        if not self.documents and self.stdout.strip():
+            # Not line delimited, parse the output as one document
+            self.documents.append(json.loads(self.stdout))
+            self.devices = self.documents[0].get('devices')
+        return self.devices
+
+
+def run_nrfutil(command: List[str], output: NrfutilOutput) -> NrfutilOutput:
+    '''
+    Runs nrfutil and feeds its output to the parser line by line, the process is killed on a fatal error.
+    '''
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_errors = []
+
+    def read_stderr():
+        try:
+            for line in process.stderr:
+                output.feed_stderr(line)
+        except Exception as err:
+            stderr_errors.append(err)
+            process.kill()
+
+    stderr_reader = threading.Thread(target=read_stderr, name=f'nrfutil-stderr-{output.snr}', daemon=True)
+    stderr_reader.start()
+    try:
+        for line in process.stdout:
+            output.feed_stdout(line)
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        stderr_reader.join()
+        process.stdout.close()
+        process.stderr.close()
+    if stderr_errors:
+        raise stderr_errors[0]
+    return output
+
+
+async def run_nrfutil_async(command: List[str], output: NrfutilOutput) -> NrfutilOutput:
+    '''
+    Asyncio counterpart of run_nrfutil, stdout and stderr are parsed on the event loop while they arrive.
+    The process is killed on a fatal error or when the awaiting task is cancelled.
+    '''
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, limit=STREAM_LIMIT
+    )
+
+    async def read(stream: asyncio.StreamReader, feed: Callable[[bytes], None]):
+        async for line in stream:
+            feed(line)
+
+    readers = [
+        asyncio.ensure_future(read(process.stdout, output.feed_stdout)),
+        asyncio.ensure_future(read(process.stderr, output.feed_stderr)),
+    ]
+    try:
+        await asyncio.gather(*readers)
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        raise
+    finally:
+        await process.wait()
+    return output
+
+
+def nrfutil_command(options: List[str], snr: int, core: Core = None) -> List[str]:
+    command = ['nrfutil', 'device']
+    command += options
+    command += ['--serial-number', str(snr)]
+    command += ['--core', core.value] if core else ''
+    command += ['--json']
+    command += ['--traits', 'jlink']
+    command += ['--skip-overhead']
+    return command
+
+
+def select_device(output: NrfutilOutput, snr: int) -> dict | None:
+    if data := output.result():
+        for device in data:
+            if int(device.get('serialNumber')) == snr:
+                return device
+        return output.documents[1] if len(output.documents) > 1 else None
     else:
         return None
 
 
+def parse_read(ret: dict) -> int:
+    val = ret.get('memoryData', [])[0].get('values')
+    return int.from_bytes(bytes(val), 'little')
+
+
+def parse_read_range(ret: dict) -> memoryview:
+    blocks = sorted(ret.get('memoryData', []), key=lambda block: block.get('address', 0))
+    return memoryview(b''.join(bytes(block.get('values')) for block in blocks))
+
+
+def read_range_options(addr: int, size: int) -> List[str]:
+    if addr % 4 or size % 4 or size <= 0:
+        raise RFTestException(f'Memory ranges must be word aligned, got {hex(addr)} size {size}')
+    return ['x-read', '--address', hex(addr), '--bytes', str(size), '--direct']
+
+
+def unpack_words(data: memoryview) -> List[int]:
+    return list(struct.unpack(f'<{len(data) // 4}I', data))
+
+
+def pack_words(addr: int, data: bytes) -> dict[int, int]:
+    if addr % 4 or len(data) % 4:
+        raise RFTestException(f'Memory ranges must be word aligned, got {hex(addr)} size {len(data)}')
+    return {addr + 4 * index: value for index, value in enumerate(struct.unpack(f'<{len(data) // 4}I', data))}
+
+
+def append_batch_command(options: List[str], core: Core | None, batch_path: str) -> List[str]:
+    command = ['nrfutil', 'device']
+    command += options
+    command += ['--core', core.value] if core else ''
+    command += ['--x-append-batch', batch_path]
+    return command
+
+
+def program_options(verify: VerifyType) -> str:
+    program_verify = VerifyType.NONE if verify == VerifyType.FW_VERIFY else verify
+    return f'chip_erase_mode=ERASE_RANGES_TOUCHED_BY_FIRMWARE,verify={program_verify.value},reset=RESET_DEBUG'
+
+
 class API:
+    invalidate_callbacks: List[Callable[[int], None]] = []
+    uicr_invalidate_callbacks: List[Callable[[int], None]] = []
+    progress_callbacks: List[Callable[[ProgressEvent], None]] = []
+
+    @classmethod
+    def register_progress_callback(cls, callback: Callable[[ProgressEvent], None]):
+        '''
+        Registers a callback that is called with the progress messages of running nrfutil operations,
+        e.g. the erase, program and verify percentages.
+        '''
+        cls.progress_callbacks.append(callback)
+
+    @classmethod
+    def progress(cls, event: ProgressEvent):
+        for callback in cls.progress_callbacks:
+            callback(event)
+
+    @classmethod
+    def register_invalidate_callback(cls, callback: Callable[[int], None], uicr: bool = False):
+        '''
+        Registers a callback that is called with the SNR when the device content is no longer known,
+        after recover, erase or a failed program. With uicr it is also called after a UICR only erase.
+        '''
+        cls.invalidate_callbacks.append(callback)
+        if uicr:
+            cls.uicr_invalidate_callbacks.append(callback)
+
+    def invalidate(self, type: EraseType = EraseType.ALL):
+        callbacks = self.invalidate_callbacks if type == EraseType.ALL else self.uicr_invalidate_callbacks
+        for callback in callbacks:
+            callback(self.snr)
+
     def __init__(self, snr: int | None = None):
         self.snr = snr
+        self.batch_path = None
+        self.batched_operations = 0
+        self.batch_done: List[Callable[[], None]] = []
 
     def get_debuggers(self):
-        completed = subprocess.run(
-            ['nrfutil', 'device', 'list', '--json', '--traits', 'jlink', '--skip-overhead'], capture_output=True
-        )
+        with span('list', 'nrfutil'):
+            output = run_nrfutil(
+                ['nrfutil', 'device', 'list', '--json', '--traits', 'jlink', '--skip-overhead'], NrfutilOutput()
+            )
         try:
-            devices = handle_nrfutil_return(completed)
+            devices = output.result()
             return [int(snr.get('serialNumber')) for snr in devices]
         except RFTestException:
             return None
@@ -111,43 +378,108 @@ class API:
                 logger.error('Too many debuggers connected to auto detect SNR')
                 raise RFTestException('Too many debuggers connected to auto detect SNR')
 
-    def __nrfutil(self, options: List[str], core: Core = None) -> dict:
+    def __nrfutil(self, options: List[str], core: Core = None, batchable: bool = True) -> dict:
         if not self.snr:
             self.get_snr()
-        command = ['nrfutil', 'device']
-        command += options
-        command += ['--serial-number', str(self.snr)]
-        command += ['--core', core.value] if core else ''
-        command += ['--json']
-        command += ['--traits', 'jlink']
-        command += ['--skip-overhead']
-        completed = subprocess.run(command, capture_output=True)
-        if data := handle_nrfutil_return(completed):
-            for device in data:
-                if int(device.get('serialNumber')) == self.snr:
-                    return device
-            return json.loads(completed.stdout.split(b'\n')[1])
+        if self.batch_path:
+            if batchable:
+                return self.__append_batch(options, core)
+            self.__execute_batch()
+        command = nrfutil_command(options, self.snr, core)
+        with span(options[0], 'nrfutil', snr=self.snr, core=core.name if core else None):
+            output = run_nrfutil(command, NrfutilOutput(self.snr, self.progress))
+        return select_device(output, self.snr)
+
+    def __append_batch(self, options: List[str], core: Core = None) -> None:
+        command = append_batch_command(options, core, self.batch_path)
+        with span(f'append-batch {options[0]}', 'nrfutil', snr=self.snr):
+            run_nrfutil(command, NrfutilOutput(self.snr)).result()
+        self.batched_operations += 1
+        return None
+
+    def __execute_batch(self):
+        if self.batched_operations == 0:
+            return
+        logger.debug(f'{self.snr}: Executing {self.batched_operations} batched operations')
+        batch_path = self.batch_path
+        self.batch_path = None
+        self.batched_operations = 0
+        try:
+            self.__nrfutil(['x-execute-batch', '--batch-path', batch_path])
+        finally:
+            self.batch_path = batch_path
+            if os.path.exists(batch_path):
+                os.remove(batch_path)
+        done, self.batch_done = self.batch_done, []
+        for callback in done:
+            callback()
+
+    def __when_executed(self, callback: Callable[[], None]):
+        '''
+        Calls callback once the queued operations ran, or right away outside of a session.
+        '''
+        if self.batched_operations:
+            self.batch_done.append(callback)
         else:
-            return None
+            callback()
+
+    @contextmanager
+    def session(self):
+        '''
+        Queues operations issued inside the context and runs them in one nrfutil invocation on exit,
+        so the debugger is attached once. Operations returning data flush the queue and run directly.
+        '''
+        if self.batch_path:
+            yield self
+            return
+        fd, self.batch_path = tempfile.mkstemp(prefix=f'nrfutil_batch_{self.snr}_', suffix='.json')
+        os.close(fd)
+        os.remove(self.batch_path)
+        try:
+            yield self
+            self.__execute_batch()
+        except Exception:
+            self.invalidate()
+            raise
+        finally:
+            if os.path.exists(self.batch_path):
+                os.remove(self.batch_path)
+            self.batch_path = None
+            self.batched_operations = 0
+            self.batch_done = []
 
     def recover(self, core: Core = Core.APPLICATION):
         logger.debug(f'{self.snr}: Recovering device')
+        self.invalidate()
         self.__nrfutil(['recover'], core=core)
 
-    def program(self, hex_files: List[TestFW]):
+    def program(self, hex_files: List[TestFW], cache=None, verify: VerifyType = VerifyType.READ) -> List[ProgramResult]:
+        '''
+        Programs the hex files. READ reads back every byte, HASH compares a hash calculated on the device,
+        FW_VERIFY programs without verification followed by a separate fw-verify and NONE skips verification.
+        '''
+        results = []
         for file in hex_files:
-            logger.debug(f'{self.snr}: Programming file: {file.file_path} Core: {file.core}')
-            command = [
-                'program',
-                '--options',
-                'chip_erase_mode=ERASE_RANGES_TOUCHED_BY_FIRMWARE,verify=VERIFY_READ,reset=RESET_DEBUG',
-                '--firmware',
-                file.file_path,
-            ]
-            self.__nrfutil(command, core=file.core)
+            if cache and cache.is_programmed(self, file):
+                logger.debug(f'{self.snr}: Skipping file: {file.file_path} Core: {file.core}, already on device')
+                results.append(ProgramResult(file=file, verify=verify, skipped=True))
+                continue
+            logger.debug(f'{self.snr}: Programming file: {file.file_path} Core: {file.core} Verify: {verify.name}')
+            command = ['program', '--options', program_options(verify), '--firmware', file.file_path]
+            try:
+                self.__nrfutil(command, core=file.core)
+                if verify == VerifyType.FW_VERIFY:
+                    self.verify(file)
+            except Exception:
+                self.invalidate()
+                raise
+            if cache:
+                self.__when_executed(lambda file=file: cache.store(self.snr, file))
+            results.append(ProgramResult(file=file, verify=verify))
+        return results
 
     def get_protection(self, core: Core = Core.APPLICATION) -> Protection:
-        ret = self.__nrfutil(['protection-get'])
+        ret = self.__nrfutil(['protection-get'], batchable=False)
         return Protection(ret.get('protectionStatus'))
 
     def verify(self, hexfile: TestFW):
@@ -155,10 +487,11 @@ class API:
 
     def erase(self, type: EraseType = EraseType.ALL, core: Core = Core.APPLICATION):
         logger.debug(f'{self.snr}: Erasing {type.name} in {core.name} core')
+        self.invalidate(type)
         self.__nrfutil(['erase', f'--{type.value}'], core=core)
 
     def get_device_version(self) -> str:
-        ret = self.__nrfutil(['device-info']).get('deviceInfo', {}).get('jlink', {})
+        ret = self.__nrfutil(['device-info'], batchable=False).get('deviceInfo', {}).get('jlink', {})
         if ret.get('protectionStatus') != 'NRFDL_PROTECTION_STATUS_NONE':
             raise NrfutilReadbackError
         self.device = ret.get('deviceVersion', {})
@@ -166,7 +499,7 @@ class API:
         return self.device
 
     def get_device_info(self) -> DeviceInfo:
-        ret = self.__nrfutil(['device-info'])
+        ret = self.__nrfutil(['device-info'], batchable=False)
         device_version = ret.get('deviceInfo', {}).get('jlink').get('deviceVersion')
         device_family = ret.get('deviceInfo', {}).get('jlink').get('deviceFamily')
         protection_status = ret.get('deviceInfo', {}).get('jlink').get('protectionStatus')
@@ -184,8 +517,227 @@ class API:
         ret = self.__nrfutil(['x-write', '--address', hex(addr), '--value', hex(data)], core)
 
     def read(self, addr: int, core: Core = Core.APPLICATION) -> int:
-        ret = self.__nrfutil(['x-read', '--address', hex(addr), '--direct'], core)
-        val = ret.get('memoryData', [])[0].get('values')
-        val = int.from_bytes(bytes(val), 'little')
+        ret = self.__nrfutil(['x-read', '--address', hex(addr), '--direct'], core, batchable=False)
+        val = parse_read(ret)
+        logger.debug(f'{self.snr}: Reading addr: {hex(addr)}, val: {hex(val)}')
+        return val
+
+    def read_range(self, addr: int, size: int, core: Core = Core.APPLICATION) -> memoryview:
+        '''
+        Reads size bytes from addr in one nrfutil call, both word aligned.
+        '''
+        data = parse_read_range(self.__nrfutil(read_range_options(addr, size), core, batchable=False))
+        logger.debug(f'{self.snr}: Reading {size} bytes from addr: {hex(addr)}')
+        return data
+
+    def read_words(self, addr: int, count: int, core: Core = Core.APPLICATION) -> List[int]:
+        return unpack_words(self.read_range(addr, 4 * count, core))
+
+    def write_words(self, words: dict[int, int], core: Core = Core.APPLICATION):
+        '''
+        Writes the address to value words in one batched nrfutil invocation.
+        '''
+        logger.debug(f'{self.snr}: Writing {len(words)} words from addr: {hex(min(words, default=0))}')
+        with self.session():
+            for addr, value in words.items():
+                self.__nrfutil(['x-write', '--address', hex(addr), '--value', hex(value)], core)
+
+    def write_range(self, addr: int, data: bytes, core: Core = Core.APPLICATION):
+        self.write_words(pack_words(addr, data), core)
+
+
+class AsyncAPI:
+    '''
+    Asyncio counterpart of API, every nrfutil process is started with asyncio.create_subprocess_exec and its
+    output is parsed on the event loop while it arrives, so one loop drives many debuggers without threads.
+    session() batching and the firmware cache work like in API. Operations on one instance must not overlap,
+    run the debuggers concurrently instead.
+    '''
+
+    def __init__(self, snr: int | None = None):
+        self.snr = snr
+        self.batch_path = None
+        self.batched_operations = 0
+        self.batch_done: List[Callable[[], None]] = []
+
+    def invalidate(self, type: EraseType = EraseType.ALL):
+        callbacks = API.invalidate_callbacks if type == EraseType.ALL else API.uicr_invalidate_callbacks
+        for callback in callbacks:
+            callback(self.snr)
+
+    async def get_debuggers(self):
+        with span('list', 'nrfutil'):
+            output = await run_nrfutil_async(
+                ['nrfutil', 'device', 'list', '--json', '--traits', 'jlink', '--skip-overhead'], NrfutilOutput()
+            )
+        try:
+            devices = output.result()
+            return [int(snr.get('serialNumber')) for snr in devices]
+        except RFTestException:
+            return None
+
+    async def get_snr(self):
+        devices = await self.get_debuggers()
+        match len(devices):
+            case 0:
+                logger.error('No debuggers connected')
+                raise RFTestException('No debuggers connected')
+            case 1:
+                self.snr = devices[0]
+            case _:
+                logger.error('Too many debuggers connected to auto detect SNR')
+                raise RFTestException('Too many debuggers connected to auto detect SNR')
+
+    async def __nrfutil(self, options: List[str], core: Core = None, batchable: bool = True) -> dict:
+        if not self.snr:
+            await self.get_snr()
+        if self.batch_path:
+            if batchable:
+                return await self.__append_batch(options, core)
+            await self.__execute_batch()
+        command = nrfutil_command(options, self.snr, core)
+        with span(options[0], 'nrfutil', snr=self.snr, core=core.name if core else None):
+            output = await run_nrfutil_async(command, NrfutilOutput(self.snr, API.progress))
+        return select_device(output, self.snr)
+
+    async def __append_batch(self, options: List[str], core: Core = None) -> None:
+        command = append_batch_command(options, core, self.batch_path)
+        with span(f'append-batch {options[0]}', 'nrfutil', snr=self.snr):
+            (await run_nrfutil_async(command, NrfutilOutput(self.snr))).result()
+        self.batched_operations += 1
+        return None
+
+    async def __execute_batch(self):
+        if self.batched_operations == 0:
+            return
+        logger.debug(f'{self.snr}: Executing {self.batched_operations} batched operations')
+        batch_path = self.batch_path
+        self.batch_path = None
+        self.batched_operations = 0
+        try:
+            await self.__nrfutil(['x-execute-batch', '--batch-path', batch_path])
+        finally:
+            self.batch_path = batch_path
+            if os.path.exists(batch_path):
+                os.remove(batch_path)
+        done, self.batch_done = self.batch_done, []
+        for callback in done:
+            callback()
+
+    def __when_executed(self, callback: Callable[[], None]):
+        if self.batched_operations:
+            self.batch_done.append(callback)
+        else:
+            callback()
+
+    @asynccontextmanager
+    async def session(self):
+        '''
+        Queues the operations awaited inside the context like API.session and runs them when it exits.
+        '''
+        if self.batch_path:
+            yield self
+            return
+        fd, self.batch_path = tempfile.mkstemp(prefix=f'nrfutil_batch_{self.snr}_', suffix='.json')
+        os.close(fd)
+        os.remove(self.batch_path)
+        try:
+            yield self
+            await self.__execute_batch()
+        except Exception:
+            self.invalidate()
+            raise
+        finally:
+            if os.path.exists(self.batch_path):
+                os.remove(self.batch_path)
+            self.batch_path = None
+            self.batched_operations = 0
+            self.batch_done = []
+
+    async def recover(self, core: Core = Core.APPLICATION):
+        logger.debug(f'{self.snr}: Recovering device')
+        self.invalidate()
+        await self.__nrfutil(['recover'], core=core)
+
+    async def program(
+        self, hex_files: List[TestFW], cache=None, verify: VerifyType = VerifyType.READ
+    ) -> List[ProgramResult]:
+        results = []
+        for file in hex_files:
+            if cache and await cache.is_programmed_async(self, file):
+                logger.debug(f'{self.snr}: Skipping file: {file.file_path} Core: {file.core}, already on device')
+                results.append(ProgramResult(file=file, verify=verify, skipped=True))
+                continue
+            logger.debug(f'{self.snr}: Programming file: {file.file_path} Core: {file.core} Verify: {verify.name}')
+            command = ['program', '--options', program_options(verify), '--firmware', file.file_path]
+            try:
+                await self.__nrfutil(command, core=file.core)
+                if verify == VerifyType.FW_VERIFY:
+                    await self.verify(file)
+            except Exception:
+                self.invalidate()
+                raise
+            if cache:
+                self.__when_executed(lambda file=file: cache.store(self.snr, file))
+            results.append(ProgramResult(file=file, verify=verify))
+        return results
+
+    async def get_protection(self, core: Core = Core.APPLICATION) -> Protection:
+        ret = await self.__nrfutil(['protection-get'], batchable=False)
+        return Protection(ret.get('protectionStatus'))
+
+    async def verify(self, hexfile: TestFW):
+        await self.__nrfutil(['fw-verify', '--firmware', hexfile.file_path], core=hexfile.core)
+
+    async def erase(self, type: EraseType = EraseType.ALL, core: Core = Core.APPLICATION):
+        logger.debug(f'{self.snr}: Erasing {type.name} in {core.name} core')
+        self.invalidate(type)
+        await self.__nrfutil(['erase', f'--{type.value}'], core=core)
+
+    async def get_device_version(self) -> str:
+        ret = (await self.__nrfutil(['device-info'], batchable=False)).get('deviceInfo', {}).get('jlink', {})
+        if ret.get('protectionStatus') != 'NRFDL_PROTECTION_STATUS_NONE':
+            raise NrfutilReadbackError
+        device = ret.get('deviceVersion', {})
+        logger.debug(f'{self.snr}: Getting device version: {device}')
+        return device
+
+    async def get_device_info(self) -> DeviceInfo:
+        jlink = (await self.__nrfutil(['device-info'], batchable=False)).get('deviceInfo', {}).get('jlink')
+        device_info = DeviceInfo(
+            family=jlink.get('deviceFamily'),
+            version=jlink.get('deviceVersion'),
+            protection=jlink.get('protectionStatus'),
+        )
+        logger.debug(f'{self.snr}: Getting device info: {device_info}')
+        return device_info
+
+    async def reset(self, type: ResetType = ResetType.DEBUG, core: Core = Core.APPLICATION):
+        logger.debug(f'{self.snr}: Performing {type.name} reset')
+        await self.__nrfutil(['reset', '--reset-kind', type.value])
+
+    async def write(self, addr: int, data: int, core: Core = Core.APPLICATION):
+        logger.debug(f'{self.snr}: Writing {hex(data)} to addr: {hex(addr)}')
+        await self.__nrfutil(['x-write', '--address', hex(addr), '--value', hex(data)], core)
+
+    async def read(self, addr: int, core: Core = Core.APPLICATION) -> int:
+        val = parse_read(await self.__nrfutil(['x-read', '--address', hex(addr), '--direct'], core, batchable=False))
         logger.debug(f'{self.snr}: Reading addr: {hex(addr)}, val: {hex(val)}')
         return val
+
+    async def read_range(self, addr: int, size: int, core: Core = Core.APPLICATION) -> memoryview:
+        data = parse_read_range(await self.__nrfutil(read_range_options(addr, size), core, batchable=False))
+        logger.debug(f'{self.snr}: Reading {size} bytes from addr: {hex(addr)}')
+        return data
+
+    async def read_words(self, addr: int, count: int, core: Core = Core.APPLICATION) -> List[int]:
+        return unpack_words(await self.read_range(addr, 4 * count, core))
+
+    async def write_words(self, words: dict[int, int], core: Core = Core.APPLICATION):
+        logger.debug(f'{self.snr}: Writing {len(words)} words from addr: {hex(min(words, default=0))}')
+        async with self.session():
+            for addr, value in words.items():
+                await self.__nrfutil(['x-write', '--address', hex(addr), '--value', hex(value)], core)
+
+    async def write_range(self, addr: int, data: bytes, core: Core = Core.APPLICATION):
+        await self.write_words(pack_words(addr, data), core)
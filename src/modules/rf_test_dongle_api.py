@@ -1,8 +1,16 @@
+import asyncio
 import usb
+import struct
 from loguru import logger
 from src.modules.rf_test_exception import RFTestException
+from src.modules.tracing import span
 import time
-from dataclasses import dataclass
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List
+from dataclasses import dataclass, replace
+from enum import Enum
 
 
 @dataclass
@@ -22,6 +30,81 @@ class RadioConfig:
 VENDOR_ID = 0x1915
 PRODUCT_ID = 0x0103
 
+CMD_FIRMWARE_VERSION = 1
+CMD_SEND_PACKET = 11
+CMD_STATUS_PACKET = 12
+CMD_ACK_PAYLOAD = 13
+CMD_SET_ESB_CONFIG = 14
+CMD_SET_TARGET = 15
+CMD_BROADCAST = 16
+CMD_SEND_LONG_PACKET = 17
+CMD_SET_PROTOCOL = 18
+
+RF_CMD_RX_STATS = 6
+RF_CMD_RX_STATS_READ = 7
+RF_CMD_START = 8
+RF_CMD_CANCEL = 9
+RF_CMD_PING = 10
+RF_CMD_HOP_LIST = 11
+RF_CMD_TX_HOP = 12
+RF_CMD_RX_HOP = 13
+# Hop sweeps replacing the contiguous sweeps, by the rf_cmd of TX unmodulated sweep and RX sweep
+HOP_SWEEPS = {3: RF_CMD_TX_HOP, 4: RF_CMD_RX_HOP}
+# Set in rf_cmd to make the DUT keep the test until started by a broadcast
+RF_CMD_ARM = 0x80
+# Set in rf_cmd to make the DUT pause the test for command windows, so it can be stopped or replaced without a reset
+RF_CMD_COMMAND_WINDOWS = 0x40
+
+ACK_TIMEOUT = 0.5
+ACK_POLL_INTERVAL = 0.002
+RX_STATS_READ_TIMEOUT = 2.0
+RX_STATS_RETRY_INTERVAL = 0.02
+# A test started with command windows listens for commands in a short window every COMMAND_INTERVAL s,
+# see the DUT Kconfig
+COMMAND_INTERVAL = 0.5
+RECONFIGURE_TIMEOUT = COMMAND_INTERVAL + 0.2
+# Longer than the dongle's ESB retransmits of one packet, short enough to hit each command window
+RESEND_INTERVAL = 0.005
+
+RX_STATS_RECORD = struct.Struct('<BBBBHIII')
+PING_RECORD = struct.Struct('<BBHI')
+HOP_LIST_HEADER = struct.Struct('<BBBxxB')
+HOP_SWEEP_COMMAND = struct.Struct('<HBBBBB')
+
+ESB_MAX_PAYLOAD = 32
+HOP_LIST_CHUNK = ESB_MAX_PAYLOAD - HOP_LIST_HEADER.size
+MAX_HOP_CHANNELS = 128
+MAX_CHANNEL = 100
+DEFAULT_DWELL_MS = 10
+
+DEFAULT_ESB_PAIR = 1
+DEFAULT_ESB_CHANNEL = 40
+
+MAX_PACKET_SIZE = 64
+PROTOCOL_V1 = 1
+PROTOCOL_V2 = 2
+PROTOCOL_V2_HEADER = 0xA2
+# First dongle firmware version with protocol v2
+PROTOCOL_V2_VERSION = (1, 5, 0)
+# First dongle firmware version pushing TX records with protocol v2
+TX_RECORDS_VERSION = (1, 6, 0)
+FRAME_HEADER = struct.Struct('<BBB')
+RESPONSE_HEADER = struct.Struct('<BBBB')
+TX_RECORD_HEADER = 0xA3
+TX_RECORD = struct.Struct('<BBBBIB')
+# The IN endpoint reader checks for close at this interval
+IN_READ_TIMEOUT_MS = 20
+RESPONSE_TIMEOUT = 1.0
+
+
+class FrameStatus(Enum):
+    OK = 0
+    UNKNOWN_COMMAND = 1
+    INVALID_LENGTH = 2
+    INVALID_PARAMETER = 3
+    ESB_ERROR = 4
+    NO_SPACE = 5
+
 
 class RFTestDongleError(Exception):
     def __init__(self, *args):
@@ -37,8 +120,245 @@ class RFTestDongleError(Exception):
             return 'RFTestDongleError occurred'
 
 
-class API:
+@dataclass
+class EsbConfig:
+    '''
+    ESB link between a dongle and its DUTs. The pair number is the last byte of the pipe 0 base address,
+    pair 1 on channel 40 is the address used by firmware without a config.
+    '''
+
+    pair: int = DEFAULT_ESB_PAIR
+    channel: int = DEFAULT_ESB_CHANNEL
+
+    def __post_init__(self):
+        if not 1 <= self.pair <= 254:
+            raise RFTestDongleError(f'ESB pair must be 1 to 254, got {self.pair}')
+        if not 0 <= self.channel <= 100:
+            raise RFTestDongleError(f'ESB channel must be 0 to 100, got {self.channel}')
+
+    def to_uicr(self) -> int:
+        return self.pair | self.channel << 8 | 0xFFFF << 16
+
+
+@dataclass
+class DongleInfo:
+    serial: str | None
+    path: str
+
+    def __str__(self):
+        return f'{self.serial or "-"} ({self.path})'
+
+
+def usb_path(dev) -> str:
+    '''
+    Bus and port path of a USB device, e.g. 1-2.4, stable for a given physical port.
+    '''
+    ports = '.'.join(str(port) for port in (dev.port_numbers or ()))
+    return f'{dev.bus}-{ports}' if ports else f'{dev.bus}-{dev.address}'
+
+
+def usb_serial(dev) -> str | None:
+    try:
+        return usb.util.get_string(dev, dev.iSerialNumber) if dev.iSerialNumber else None
+    except (usb.core.USBError, ValueError, NotImplementedError) as err:
+        logger.debug(f'Could not read dongle serial number at {usb_path(dev)}: {err}')
+        return None
+
+
+def dut_address(device_id: int) -> bytes:
+    '''
+    ESB pipe 1 base address of the DUT, the first FICR device ID word in little endian byte order.
+    '''
+    return (device_id & 0xFFFFFFFF).to_bytes(4, 'little')
+
+
+def parse_version(version: str) -> tuple[int, ...]:
+    return tuple(int(part) for part in version.split('.'))
+
+
+def with_command_windows(radio_config: RadioConfig) -> RadioConfig:
+    '''
+    Returns the radio config of a test the DUT pauses for command windows. Without them the test runs without gaps,
+    but the DUT has to be reset before it accepts another command.
+    '''
+    return replace(radio_config, rf_cmd=radio_config.rf_cmd | RF_CMD_COMMAND_WINDOWS)
+
+
+def validate_hop_list(channels: List[int]):
+    if not 1 <= len(channels) <= MAX_HOP_CHANNELS:
+        raise RFTestDongleError(f'Hop list must have 1 to {MAX_HOP_CHANNELS} channels, got {len(channels)}')
+    if invalid := [channel for channel in channels if not 0 <= channel <= MAX_CHANNEL]:
+        raise RFTestDongleError(f'Hop list channels must be 0 to {MAX_CHANNEL}, got {invalid}')
+
+
+def list_dongles(backend=None) -> List[DongleInfo]:
+    '''
+    Lists the connected RF test dongles, a dongle is selected by either its serial number or its path.
+    '''
+    return [
+        DongleInfo(serial=usb_serial(dev), path=usb_path(dev))
+        for dev in usb.core.find(find_all=True, idVendor=VENDOR_ID, idProduct=PRODUCT_ID, backend=backend)
+    ]
+
+
+def find_dongle(dongle: str | None = None, backend=None):
+    '''
+    Finds the USB device of the dongle with the serial number or path, or the first dongle if None.
+    '''
+    if dongle:
+        dev = usb.core.find(
+            idVendor=VENDOR_ID,
+            idProduct=PRODUCT_ID,
+            backend=backend,
+            custom_match=lambda dev: dongle == usb_path(dev) or dongle == usb_serial(dev),
+        )
+        if not dev:
+            raise RFTestDongleError(f"USB dongle {dongle} not found")
+    else:
+        dev = usb.core.find(idVendor=VENDOR_ID, idProduct=PRODUCT_ID, backend=backend)
+        if not dev:
+            raise RFTestDongleError("USB dongle not found")
+    return dev
+
+
+@dataclass
+class RxStatsRecord:
+    index: int
+    count: int
+    channel: int
+    data_rate: int
+    window_ms: int
+    # Packets with a valid CRC, pattern_errors of them with a wrong payload
+    packets: int
+    pattern_errors: int
+    # Packets with a CRC error, not counted in packets
+    crc_errors: int
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RxStatsRecord':
+        return cls(*RX_STATS_RECORD.unpack(bytes(data[: RX_STATS_RECORD.size])))
+
+
+@dataclass
+class PingResult:
+    '''
+    Latencies of one ping in s: round_trip until the DUT's answer was read back, ack_latency until the ESB ACK
+    of the ping was seen and dispatch from the DUT receiving the ping until its main loop handled it.
+    '''
+
+    seq: int
+    round_trip: float
+    ack_latency: float
+    dispatch: float
+
+
+@dataclass
+class TxRecord:
+    '''
+    Result of one ESB transaction pushed by the dongle, latency in s from queuing the packet until the ACK or
+    the last retransmit. Attempts is 1 if the first transmission was ACKed.
+    '''
+
+    seq: int
+    acked: bool
+    attempts: int
+    latency: float
+    ack_payload: bytes
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TxRecord':
+        _, seq, status, attempts, latency_us, ack_length = TX_RECORD.unpack_from(data)
+        return cls(
+            seq, status == 0, attempts, latency_us / 1e6, bytes(data[TX_RECORD.size : TX_RECORD.size + ack_length])
+        )
+
+
+@dataclass
+class Frame:
+    cmd: int
+    payload: bytes = b''
+    seq: int = 0
+
+
+@dataclass
+class Response:
+    seq: int
+    cmd: int
+    status: FrameStatus
+    payload: bytes
+
+
+# Largest response payload per command, frames are packed so that their responses fit in one packet
+RESPONSE_SIZES = {CMD_FIRMWARE_VERSION: 3, CMD_STATUS_PACKET: 1, CMD_ACK_PAYLOAD: ESB_MAX_PAYLOAD}
+
+
+class FrameCodec:
+    '''
+    Protocol v2 framing. A USB packet is the header byte followed by frames of payload length, sequence number,
+    command and payload. The dongle handles the frames in order and answers the packet with one packet of
+    responses, which have a status byte after the command and carry the sequence number of their frame.
+    '''
+
     def __init__(self):
+        self.seq = 0
+
+    def encode(self, frames: List[Frame]) -> List[tuple[bytes, List[Frame]]]:
+        '''
+        Numbers the frames and packs them into as few packets as possible, returns each packet with its frames.
+        '''
+        packets = []
+        packet, packed, response_size = bytearray([PROTOCOL_V2_HEADER]), [], 1
+        for frame in frames:
+            if 1 + FRAME_HEADER.size + len(frame.payload) > MAX_PACKET_SIZE:
+                raise RFTestDongleError(f'Frame payload of {len(frame.payload)} bytes does not fit in a packet')
+            self.seq = (self.seq + 1) & 0xFF
+            frame.seq = self.seq
+            data = FRAME_HEADER.pack(len(frame.payload), frame.seq, frame.cmd) + frame.payload
+            response = RESPONSE_HEADER.size + RESPONSE_SIZES.get(frame.cmd, 0)
+            if packed and (len(packet) + len(data) > MAX_PACKET_SIZE or response_size + response > MAX_PACKET_SIZE):
+                packets.append((bytes(packet), packed))
+                packet, packed, response_size = bytearray([PROTOCOL_V2_HEADER]), [], 1
+            packet += data
+            packed.append(frame)
+            response_size += response
+        if packed:
+            packets.append((bytes(packet), packed))
+        return packets
+
+    @staticmethod
+    def is_stale(responses: List[Response], frames: List[Frame]) -> bool:
+        '''
+        Checks if the responses answer frames sent before the given ones, e.g. a response arriving after its
+        transaction timed out. Sequence numbers wrap, so older means up to half the sequence space behind.
+        '''
+        return bool(responses) and all(0 < (frames[0].seq - response.seq) & 0xFF < 0x80 for response in responses)
+
+    @staticmethod
+    def decode(packet: bytes) -> List[Response]:
+        if not packet or packet[0] != PROTOCOL_V2_HEADER:
+            raise RFTestDongleError(f'Invalid protocol v2 response: {packet.hex()}')
+        responses = []
+        offset = 1
+        while offset + RESPONSE_HEADER.size <= len(packet):
+            length, seq, cmd, status = RESPONSE_HEADER.unpack_from(packet, offset)
+            offset += RESPONSE_HEADER.size
+            try:
+                status = FrameStatus(status)
+            except ValueError:
+                raise RFTestDongleError(f'Unknown status {status} for frame {seq}')
+            if offset + length > len(packet):
+                raise RFTestDongleError(f'Truncated response for frame {seq}: {packet.hex()}')
+            responses.append(Response(seq, cmd, status, bytes(packet[offset : offset + length])))
+            offset += length
+        return responses
+
+
+# Firmware version of the dongles by USB bus and address, so the protocol is negotiated without a round trip
+firmware_versions: dict[tuple[int, int], tuple[int, ...]] = {}
+
+
+class API:
+    def __init__(self, backend=None, dongle: str | None = None, protocol: int | None = None):
         self.radio_config = RadioConfig(
             first_channel=0x00,
             last_channel=0x00,
@@ -46,12 +366,26 @@ class API:
             data_rate=0x00,
             fem_config=0x00,
             rf_cmd=0x01,
-            usb_cmd=0x0B,
+            usb_cmd=CMD_SEND_PACKET,
         )
+        self.ack_latency = None
+        self.ping_seq = 0
+        self.protocol = PROTOCOL_V1
+        self.codec = FrameCodec()
+        # Protocol v2 frames sent with the next transaction
+        self.pending: List[Frame] = []
+        # ACK payload read together with the status, returned by the next get_ack_payload
+        self.acked_payload: bytes | None = None
+        # With TX records a reader thread owns the IN endpoint and sorts the packets into these queues
+        self.responses: queue.Queue[bytes | None] = queue.Queue()
+        self.tx_records: queue.Queue[TxRecord] = queue.Queue()
+        self.last_tx: TxRecord | None = None
+        self.reader: threading.Thread | None = None
+        self.reader_error: usb.core.USBError | None = None
+        self.closing = threading.Event()
+        self.dev = None
 
-        self.dev = usb.core.find(idVendor=VENDOR_ID, idProduct=PRODUCT_ID)
-        if not self.dev:
-            raise RFTestDongleError("USB dongle not found")
+        self.dev = find_dongle(dongle, backend)
         self.dev.set_configuration()
         cfg = self.dev.get_active_configuration()
         intf = cfg[(0, 0)]
@@ -67,6 +401,7 @@ class API:
             if a.bEndpointAddress == 0x82:
                 self.dongle_endpoint_in = a
         assert self.dongle_endpoint_out is not None
+        self.set_protocol(protocol)
 
     def __enter__(self):
         return self
@@ -100,8 +435,8 @@ class API:
         logger.debug(f'Setting data rate: {rate}')
         self.radio_config['data_rate'] = rate
 
-    def send_cmd(self) -> bool:
-        command = [
+    def get_command(self) -> list:
+        return [
             getattr(self.radio_config, 'first_channel'),
             getattr(self.radio_config, 'last_channel'),
             getattr(self.radio_config, 'radio_power'),
@@ -110,23 +445,613 @@ class API:
             getattr(self.radio_config, 'rf_cmd'),
             getattr(self.radio_config, 'usb_cmd'),
         ]
+
+    def send_cmd(
+        self,
+        timeout: float = ACK_TIMEOUT,
+        poll_interval: float = ACK_POLL_INTERVAL,
+        resend_interval: float | None = None,
+    ) -> bool:
+        '''
+        Sends the radio config to the DUT and polls the dongle for the ESB ACK until it is received or the timeout
+        expires. The time until the ACK was seen is stored in ack_latency.
+        With a resend interval the command is sent again until ACKed, which reaches a DUT running a test in its
+        next command window.
+        '''
+        command = self.get_command()
         logger.debug(f'Sending command: {command}')
-        self.dongle_endpoint_out.write(command)
-        time.sleep(0.5)
-        self.dongle_endpoint_out.write([0, 0, 0, 0, 0, 0, 12])
-        return bool(self.dongle_endpoint_in.read(1)[0])
+        return self.send_frame(command, timeout, poll_interval, resend_interval)
+
+    def send_frame(
+        self,
+        frame: list,
+        timeout: float = ACK_TIMEOUT,
+        poll_interval: float = ACK_POLL_INTERVAL,
+        resend_interval: float | None = None,
+    ) -> bool:
+        '''
+        Sends a USB frame with an ESB packet to the DUT and waits for the ESB ACK, see send_cmd.
+        '''
+        self.ack_latency = None
+        with span('send_cmd', 'dongle', command=frame) as span_args:
+            if self.reader is not None:
+                return self.__await_tx_record(frame, timeout, resend_interval, span_args)
+            self.write_packet(frame)
+            start = sent = time.monotonic()
+            deadline = start + timeout
+            while True:
+                if self.get_status():
+                    self.ack_latency = time.monotonic() - start
+                    span_args['ack_latency'] = self.ack_latency
+                    logger.debug(f'ACK received after {self.ack_latency * 1000:.1f} ms')
+                    return True
+                if time.monotonic() + poll_interval > deadline:
+                    logger.error(f'No ACK received within {timeout * 1000:.0f} ms')
+                    return False
+                if resend_interval is not None and time.monotonic() - sent >= resend_interval:
+                    self.write_packet(frame)
+                    sent = time.monotonic()
+                else:
+                    time.sleep(poll_interval)
+
+    def __await_tx_record(self, frame: list, timeout: float, resend_interval: float | None, span_args: dict) -> bool:
+        '''
+        send_frame with the TX records pushed by the dongle. A packet the dongle gave up on is resent right away
+        instead of after the resend interval, which still applies if no record arrives. Records of earlier
+        commands, e.g. of resends that arrived after the command gave up, are dropped first.
+        '''
+        while not self.tx_records.empty():
+            self.tx_records.get_nowait()
+        start = sent = time.monotonic()
+        deadline = start + timeout
+        seq = self.write_packet(frame)
+        seqs = {seq}
+        while True:
+            now = time.monotonic()
+            wait = deadline - now
+            if resend_interval is not None:
+                wait = min(wait, sent + resend_interval - now)
+            try:
+                record = self.tx_records.get(timeout=max(0.0, wait))
+            except queue.Empty:
+                record = None
+            if record is not None and record.seq in seqs:
+                self.last_tx = record
+                span_args['attempts'] = record.attempts
+                if record.acked:
+                    self.ack_latency = time.monotonic() - start
+                    self.acked_payload = record.ack_payload
+                    span_args['ack_latency'] = self.ack_latency
+                    logger.debug(
+                        f'ACK received after {self.ack_latency * 1000:.1f} ms, {record.attempts} attempts, '
+                        f'{record.latency * 1000:.2f} ms in the dongle'
+                    )
+                    return True
+                logger.debug(f'No ACK for frame {record.seq} after {record.attempts} attempts')
+                if resend_interval is None:
+                    logger.error(f'No ACK received after {record.attempts} attempts')
+                    return False
+            if time.monotonic() >= deadline:
+                logger.error(f'No ACK received within {timeout * 1000:.0f} ms')
+                return False
+            if resend_interval is not None and (
+                (record is not None and record.seq == seq) or time.monotonic() - sent >= resend_interval
+            ):
+                seq = self.write_packet(frame)
+                seqs.add(seq)
+                sent = time.monotonic()
+
+    def upload_hop_list(self, channels: List[int], timeout: float = RECONFIGURE_TIMEOUT) -> bool:
+        '''
+        Uploads the channel hop list of the hop sweeps in chunks filling an ESB packet.
+        A test running on the DUT is stopped.
+        '''
+        validate_hop_list(channels)
+        for offset in range(0, len(channels), HOP_LIST_CHUNK):
+            chunk = channels[offset : offset + HOP_LIST_CHUNK]
+            payload = HOP_LIST_HEADER.pack(offset, len(chunk), len(channels), RF_CMD_HOP_LIST) + bytes(chunk)
+            logger.debug(f'Uploading hop list channels {offset} to {offset + len(chunk) - 1}')
+            if not self.send_frame([*payload, CMD_SEND_LONG_PACKET], timeout, resend_interval=RESEND_INTERVAL):
+                return False
+        return True
+
+    def hop_sweep(
+        self, channels: List[int], dwell_ms: int = DEFAULT_DWELL_MS, timeout: float = RECONFIGURE_TIMEOUT
+    ) -> bool:
+        '''
+        Sweeps the channels in the given order, dwelling dwell_ms on each. The channels do not need to be
+        contiguous. The radio config's rf_cmd selects TX unmodulated or RX sweep, its channels are not used.
+        '''
+        mode = self.radio_config.rf_cmd & ~RF_CMD_COMMAND_WINDOWS
+        if mode not in HOP_SWEEPS:
+            raise RFTestDongleError(f'rf_cmd {self.radio_config.rf_cmd} is not a sweep')
+        if not 1 <= dwell_ms <= 0xFFFF:
+            raise RFTestDongleError(f'Dwell time must be 1 to 65535 ms, got {dwell_ms}')
+        if not self.upload_hop_list(channels, timeout):
+            return False
+        frame = HOP_SWEEP_COMMAND.pack(
+            dwell_ms,
+            self.radio_config.radio_power,
+            self.radio_config.data_rate,
+            self.radio_config.fem_config,
+            HOP_SWEEPS[mode] | (self.radio_config.rf_cmd & RF_CMD_COMMAND_WINDOWS),
+            CMD_SEND_PACKET,
+        )
+        logger.debug(f'Starting hop sweep over {len(channels)} channels, {dwell_ms} ms each')
+        return self.send_frame(list(frame), timeout, resend_interval=RESEND_INTERVAL)
+
+    def cancel_test(self, timeout: float = RECONFIGURE_TIMEOUT) -> bool:
+        '''
+        Stops the test running on the DUT, the DUT then waits for the next radio config.
+        '''
+        config = self.radio_config
+        self.radio_config = replace(config, rf_cmd=RF_CMD_CANCEL, usb_cmd=CMD_SEND_PACKET)
+        try:
+            return self.send_cmd(timeout, resend_interval=RESEND_INTERVAL)
+        finally:
+            self.radio_config = config
+
+    def set_target(self, address: bytes | None):
+        '''
+        Sends the following commands to the DUT with the pipe 1 address, or to all DUTs of the pair if None.
+        '''
+        logger.debug(f'Setting target DUT: {address.hex() if address else "all"}')
+        if self.protocol == PROTOCOL_V2:
+            # Sent together with the next command
+            self.pending.append(Frame(CMD_SET_TARGET, address or bytes(4)))
+        else:
+            self.write([*(address or bytes(4)), 0, 0, CMD_SET_TARGET])
+
+    def broadcast_cmd(self):
+        '''
+        Sends the radio config to all DUTs of the pair without ACK.
+        '''
+        command = self.get_command()[:-1] + [CMD_BROADCAST]
+        logger.debug(f'Broadcasting command: {command}')
+        if self.protocol == PROTOCOL_V2:
+            self.command(CMD_BROADCAST, bytes(command[:-1]))
+        else:
+            self.write(command)
+
+    def start_group(
+        self, addresses: List[bytes], timeout: float = ACK_TIMEOUT, resend_interval: float | None = None
+    ) -> dict[bytes, bool]:
+        '''
+        Arms each DUT with the radio config, then starts all armed DUTs at once with a broadcast.
+        Returns whether each DUT acknowledged its config, DUTs without ACK do not start.
+        '''
+        config = self.radio_config
+        results = {}
+        try:
+            for address in addresses:
+                self.set_target(address)
+                self.radio_config = replace(config, rf_cmd=config.rf_cmd | RF_CMD_ARM)
+                results[address] = self.send_cmd(timeout, resend_interval=resend_interval)
+                logger.debug(f'DUT {address.hex()}: {"armed" if results[address] else "no ACK"}')
+        finally:
+            self.set_target(None)
+            self.radio_config = config
+        with span('broadcast', 'dongle', duts=len(addresses)):
+            self.radio_config = replace(config, rf_cmd=RF_CMD_START)
+            self.broadcast_cmd()
+            self.radio_config = config
+        return results
+
+    def write(self, data: list):
+        with span('write', 'usb', size=len(data)):
+            self.dongle_endpoint_out.write(data)
+
+    def read(self, size: int):
+        with span('read', 'usb', size=size):
+            return self.dongle_endpoint_in.read(size)
+
+    def write_packet(self, frame: list) -> int | None:
+        '''
+        Sends the ESB packet of a protocol v1 frame, which is the ESB payload followed by the command byte.
+        Returns the sequence number of the protocol v2 frame.
+        '''
+        if self.protocol == PROTOCOL_V2:
+            self.acked_payload = None
+            return self.command(CMD_SEND_PACKET, bytes(frame[:-1])).seq
+        self.write(frame)
+        return None
+
+    def transact(self, frames: List[Frame]) -> List[Response]:
+        '''
+        Sends the pending and the given frames with protocol v2, packed into as few USB packets as possible, and
+        returns the responses to the given frames. A frame the dongle could not handle raises RFTestDongleError.
+        Responses to earlier frames, which arrived after their transaction timed out, are dropped.
+        '''
+        count = len(frames)
+        frames, self.pending = self.pending + frames, []
+        responses = []
+        self.__drop_responses()
+        for packet, packed in self.codec.encode(frames):
+            self.write(list(packet))
+            received = self.codec.decode(self.__receive())
+            while self.codec.is_stale(received, packed):
+                logger.debug(f'Dropping late responses to frames {[response.seq for response in received]}')
+                received = self.codec.decode(self.__receive())
+            if [response.seq for response in received] != [frame.seq for frame in packed]:
+                raise RFTestDongleError(
+                    f'Responses {[response.seq for response in received]} do not match '
+                    f'frames {[frame.seq for frame in packed]}'
+                )
+            for response in received:
+                if response.status != FrameStatus.OK:
+                    raise RFTestDongleError(f'Command {response.cmd} frame {response.seq}: {response.status.name}')
+            responses += received
+        return responses[len(responses) - count :]
+
+    def __receive(self) -> bytes:
+        if self.reader is None:
+            return bytes(self.read(MAX_PACKET_SIZE))
+        try:
+            packet = self.responses.get(timeout=RESPONSE_TIMEOUT)
+        except queue.Empty:
+            raise RFTestDongleError(f'No response from the dongle within {RESPONSE_TIMEOUT * 1000:.0f} ms')
+        if packet is None:
+            raise self.reader_error
+        return packet
+
+    def __drop_responses(self):
+        while self.reader is not None:
+            try:
+                packet = self.responses.get_nowait()
+            except queue.Empty:
+                return
+            if packet is None:
+                raise self.reader_error
+            logger.debug(f'Dropping late dongle response {packet.hex()}')
+
+    def __read_in(self):
+        '''
+        Reads the IN endpoint until the API is closed, the dongle pushes TX records between the responses.
+        '''
+        while not self.closing.is_set():
+            try:
+                packet = bytes(self.dongle_endpoint_in.read(MAX_PACKET_SIZE, timeout=IN_READ_TIMEOUT_MS))
+            except usb.core.USBTimeoutError:
+                continue
+            except usb.core.USBError as err:
+                if not self.closing.is_set():
+                    logger.error(f'Dongle IN endpoint error: {err}')
+                    self.reader_error = err
+                    self.responses.put(None)
+                return
+            if packet and packet[0] == TX_RECORD_HEADER:
+                self.tx_records.put(TxRecord.from_bytes(packet))
+            else:
+                self.responses.put(packet)
+
+    def command(self, cmd: int, payload: bytes = b'') -> Response:
+        return self.transact([Frame(cmd, payload)])[0]
+
+    def set_protocol(self, protocol: int | None = None):
+        '''
+        Selects the USB protocol, the newest one supported by the dongle firmware if None.
+        '''
+        self.__stop_reader()
+        self.protocol = PROTOCOL_V1
+        # Read once per enumeration, a reflashed or different dongle gets a new address
+        key = (self.dev.bus, self.dev.address)
+        if (version := firmware_versions.get(key)) is None:
+            version = firmware_versions[key] = parse_version(self.get_dongle_version())
+        supported = version >= PROTOCOL_V2_VERSION
+        if protocol is None:
+            protocol = PROTOCOL_V2 if supported else PROTOCOL_V1
+        if protocol not in (PROTOCOL_V1, PROTOCOL_V2):
+            raise RFTestDongleError(f'Unknown protocol {protocol}')
+        if protocol == PROTOCOL_V2 and not supported:
+            raise RFTestDongleError(f'Dongle firmware {".".join(map(str, version))} does not support protocol v2')
+        if supported:
+            # Always sent with protocol v1, which the dongle accepts in both protocols
+            self.write([protocol, 0, 0, 0, 0, 0, CMD_SET_PROTOCOL])
+        self.protocol = protocol
+        logger.debug(f'Using dongle protocol v{protocol}')
+        if protocol == PROTOCOL_V2 and version >= TX_RECORDS_VERSION and self.reader is None:
+            self.reader = threading.Thread(target=self.__read_in, name='dongle IN', daemon=True)
+            self.reader.start()
+
+    def __stop_reader(self):
+        if self.reader is None:
+            return
+        self.closing.set()
+        if self.reader is not threading.current_thread():
+            self.reader.join()
+        self.reader = None
+        self.closing.clear()
+
+    def get_status(self) -> bool:
+        '''
+        Reads and clears the dongle's sent successfully flag.
+        With protocol v2 the ACK payload is read in the same transfer and kept for get_ack_payload.
+        '''
+        if self.protocol == PROTOCOL_V2:
+            status, ack_payload = self.transact([Frame(CMD_STATUS_PACKET), Frame(CMD_ACK_PAYLOAD)])
+            sent = bool(status.payload[0])
+            # The ACK can arrive between the two frames, its payload is then read before the flag
+            if ack_payload.payload or (sent and self.acked_payload is None):
+                self.acked_payload = ack_payload.payload
+            return sent
+        self.write([0, 0, 0, 0, 0, 0, CMD_STATUS_PACKET])
+        return bool(self.read(1)[0])
+
+    def get_ack_payload(self) -> bytes:
+        '''
+        Reads and clears the payload of the last ESB ACK received by the dongle, empty if there was none.
+        '''
+        if self.protocol == PROTOCOL_V2:
+            if self.acked_payload is not None:
+                payload, self.acked_payload = self.acked_payload, None
+                return payload
+            return self.command(CMD_ACK_PAYLOAD).payload
+        self.write([0, 0, 0, 0, 0, 0, CMD_ACK_PAYLOAD])
+        ret = self.read(64)
+        return bytes(ret[1 : 1 + ret[0]])
+
+    def read_rx_stats(self, timeout: float = RX_STATS_READ_TIMEOUT) -> List[RxStatsRecord]:
+        '''
+        Reads back the RX statistics records measured by the DUT, one record is returned in the ESB ACK
+        of each read request. Requests are retried until all records are read or the timeout expires.
+        '''
+        records: dict[int, RxStatsRecord] = {}
+        count = None
+        deadline = time.monotonic() + timeout
+        while (count is None or len(records) < count) and time.monotonic() < deadline:
+            self.set_config(
+                RadioConfig(
+                    first_channel=0,
+                    last_channel=0,
+                    radio_power=0,
+                    data_rate=0,
+                    fem_config=0,
+                    rf_cmd=RF_CMD_RX_STATS_READ,
+                    usb_cmd=CMD_SEND_PACKET,
+                )
+            )
+            if self.send_cmd() and len(payload := self.get_ack_payload()) >= RX_STATS_RECORD.size:
+                record = RxStatsRecord.from_bytes(payload)
+                records[record.index] = record
+                count = record.count
+            else:
+                time.sleep(RX_STATS_RETRY_INTERVAL)
+        if count is None or len(records) < count:
+            logger.error(f'Read {len(records)} of {count if count is not None else "?"} RX stats records')
+        return [records[index] for index in sorted(records)]
+
+    def ping(self, timeout: float = ACK_TIMEOUT) -> PingResult | None:
+        '''
+        Measures the command latency through the dongle to the DUT's main loop. The DUT answers a ping in the
+        ESB ACK of the next ping, which is repeated until the answer is read or the timeout expires.
+        A test running on the DUT is stopped.
+        '''
+        config = self.radio_config
+        self.ping_seq = (self.ping_seq + 1) & 0xFF
+        self.radio_config = RadioConfig(
+            first_channel=self.ping_seq,
+            last_channel=0,
+            radio_power=0,
+            data_rate=0,
+            fem_config=0,
+            rf_cmd=RF_CMD_PING,
+            usb_cmd=CMD_SEND_PACKET,
+        )
+        try:
+            with span('ping', 'dongle', seq=self.ping_seq):
+                start = time.monotonic()
+                deadline = start + timeout
+                if not self.send_cmd(timeout, resend_interval=RESEND_INTERVAL):
+                    return None
+                ack_latency = self.ack_latency
+                while time.monotonic() < deadline:
+                    if not self.send_cmd(max(0.0, deadline - time.monotonic())):
+                        continue
+                    payload = self.get_ack_payload()
+                    if len(payload) < PING_RECORD.size:
+                        continue
+                    seq, rf_cmd, _, dispatch_us = PING_RECORD.unpack(payload[: PING_RECORD.size])
+                    if rf_cmd == RF_CMD_PING and seq == self.ping_seq:
+                        return PingResult(seq, time.monotonic() - start, ack_latency, dispatch_us / 1e6)
+                logger.error(f'No answer to ping {self.ping_seq} within {timeout * 1000:.0f} ms')
+                return None
+        finally:
+            self.radio_config = config
+
+    def set_esb_config(self, esb_config: EsbConfig):
+        '''
+        Moves the dongle to the ESB address and channel of the pair, the DUTs get the same config in UICR.
+        '''
+        logger.debug(f'Setting ESB pair: {esb_config.pair} channel: {esb_config.channel}')
+        if self.protocol == PROTOCOL_V2:
+            self.command(CMD_SET_ESB_CONFIG, bytes([esb_config.pair, esb_config.channel]))
+        else:
+            self.write([esb_config.pair, esb_config.channel, 0, 0, 0, 0, CMD_SET_ESB_CONFIG])
 
     def get_dongle_version(self):
-        command = [0, 0, 0, 0, 0, 0, 1]
+        if self.protocol == PROTOCOL_V2:
+            return '.'.join(str(part) for part in self.command(CMD_FIRMWARE_VERSION).payload)
+        command = [0, 0, 0, 0, 0, 0, CMD_FIRMWARE_VERSION]
         logger.debug(f'Sending command: {command}')
-        self.dongle_endpoint_out.write(command)
-        ret = self.dongle_endpoint_in.read(4)
+        self.write(command)
+        ret = self.read(4)
         version = f'{ret[1]}.{ret[2]}.{ret[3]}'
         return version
 
     def close(self):
+        self.__stop_reader()
         if self.dev:
             usb.util.dispose_resources(self.dev)
+            self.dev = None
 
     def __del__(self):
         self.close()
+
+
+class DongleSession:
+    '''
+    Long-lived connection to the dongle shared by all callers. Commands are queued and run one at a time on a
+    worker thread that owns the USB device, the device is reopened when a command fails with a USB error.
+    Only idempotent commands are run again on the reopened device, others fail so a test is not started twice.
+    The *_async methods await the same queue from an asyncio event loop, the loop never blocks on USB.
+    '''
+
+    def __init__(
+        self,
+        reconnect_attempts: int = 2,
+        backend=None,
+        dongle: str | None = None,
+        esb_config: EsbConfig | None = None,
+    ):
+        self.reconnect_attempts = reconnect_attempts
+        self.backend = backend
+        self.dongle = dongle
+        self.esb_config = esb_config
+        self.api: API | None = None
+        self.queue: queue.Queue = queue.Queue()
+        self.worker = threading.Thread(target=self.__work, name='DongleSession', daemon=True)
+        self.worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, execption_type, exception_value, exception_traceback):
+        self.close()
+
+    def submit(self, command: Callable[[API], Any], idempotent: bool = False) -> Future:
+        future = Future()
+        self.queue.put((command, idempotent, future))
+        return future
+
+    def run(self, command: Callable[[API], Any], timeout: float | None = None, idempotent: bool = False) -> Any:
+        return self.submit(command, idempotent).result(timeout)
+
+    async def run_async(self, command: Callable[[API], Any], idempotent: bool = False) -> Any:
+        return await asyncio.wrap_future(self.submit(command, idempotent))
+
+    def send_cmd(self, config: RadioConfig, **kwargs) -> bool:
+        return self.run(self.__send(config, **kwargs))
+
+    async def send_cmd_async(self, config: RadioConfig, **kwargs) -> bool:
+        return await self.run_async(self.__send(config, **kwargs))
+
+    def __send(self, config: RadioConfig, **kwargs) -> Callable[[API], bool]:
+        def send(dongle: API) -> bool:
+            dongle.set_config(config)
+            return dongle.send_cmd(**kwargs)
+
+        return send
+
+    def cancel_test(self, **kwargs) -> bool:
+        return self.run(lambda dongle: dongle.cancel_test(**kwargs), idempotent=True)
+
+    async def cancel_test_async(self, **kwargs) -> bool:
+        return await self.run_async(lambda dongle: dongle.cancel_test(**kwargs), idempotent=True)
+
+    def hop_sweep(self, config: RadioConfig, channels: List[int], **kwargs) -> bool:
+        return self.run(self.__hop_sweep(config, channels, **kwargs))
+
+    async def hop_sweep_async(self, config: RadioConfig, channels: List[int], **kwargs) -> bool:
+        return await self.run_async(self.__hop_sweep(config, channels, **kwargs))
+
+    def __hop_sweep(self, config: RadioConfig, channels: List[int], **kwargs) -> Callable[[API], bool]:
+        def sweep(dongle: API) -> bool:
+            dongle.set_config(config)
+            return dongle.hop_sweep(channels, **kwargs)
+
+        return sweep
+
+    def ping(self, **kwargs) -> PingResult | None:
+        return self.run(lambda dongle: dongle.ping(**kwargs))
+
+    async def ping_async(self, **kwargs) -> PingResult | None:
+        return await self.run_async(lambda dongle: dongle.ping(**kwargs))
+
+    def start_group(self, config: RadioConfig, addresses: List[bytes], **kwargs) -> dict[bytes, bool]:
+        def start(dongle: API) -> dict[bytes, bool]:
+            dongle.set_config(config)
+            return dongle.start_group(addresses, **kwargs)
+
+        return self.run(start)
+
+    def get_dongle_version(self) -> str:
+        return self.run(lambda dongle: dongle.get_dongle_version(), idempotent=True)
+
+    async def get_dongle_version_async(self) -> str:
+        return await self.run_async(lambda dongle: dongle.get_dongle_version(), idempotent=True)
+
+    def set_esb_config(self, esb_config: EsbConfig):
+        def set_config(dongle: API):
+            dongle.set_esb_config(esb_config)
+            self.esb_config = esb_config
+
+        self.run(set_config, idempotent=True)
+
+    def __work(self):
+        while (item := self.queue.get()) is not None:
+            command, idempotent, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.__execute(command, idempotent))
+            except Exception as err:
+                future.set_exception(err)
+        self.__disconnect()
+
+    def __execute(self, command: Callable[[API], Any], idempotent: bool) -> Any:
+        for attempt in range(self.reconnect_attempts + 1):
+            started = False
+            try:
+                if self.api is None:
+                    logger.debug(f'Opening dongle connection {self.dongle or ""}')
+                    with span('connect', 'dongle'):
+                        self.api = API(backend=self.backend, dongle=self.dongle)
+                        # The dongle starts on the default address after a reset
+                        if self.esb_config:
+                            self.api.set_esb_config(self.esb_config)
+                started = True
+                return command(self.api)
+            except usb.core.NoBackendError as err:
+                raise RFTestDongleError(err)
+            except usb.core.USBError as err:
+                logger.error(f'Dongle USB error: {err}')
+                self.__disconnect()
+                # The command may have reached the DUT already, the next command reconnects
+                if attempt == self.reconnect_attempts or (started and not idempotent):
+                    raise RFTestDongleError(err)
+
+    def __disconnect(self):
+        if self.api:
+            self.api.close()
+            self.api = None
+
+    def close(self):
+        if self.worker.is_alive():
+            self.queue.put(None)
+            self.worker.join()
+
+
+# Sessions by the bus and address of the dongle, so the serial number, path and None share one session
+sessions: dict[tuple[int, int], DongleSession] = {}
+session_lock = threading.Lock()
+# USB backend of the sessions created by get_session, None for the pyusb default
+session_backend = None
+
+
+def get_session(dongle: str | None = None, esb_config: EsbConfig | None = None) -> DongleSession:
+    '''
+    Returns the session of the dongle with the serial number or path, or of the first dongle found,
+    shared by the application. The dongle is moved to the ESB config if given.
+    '''
+    with session_lock:
+        dev = find_dongle(dongle, session_backend)
+        key = (dev.bus, dev.address)
+        session = sessions.get(key)
+        if session is None or not session.worker.is_alive():
+            session = sessions[key] = DongleSession(
+                backend=session_backend, dongle=usb_path(dev), esb_config=esb_config
+            )
+            return session
+    if esb_config and esb_config != session.esb_config:
+        session.set_esb_config(esb_config)
+    return session
@@ -0,0 +1,171 @@
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Callable, List
+
+DEFAULT_CAPACITY = 100000
+HISTOGRAM_BUCKETS_MS = [0.1, 1, 10, 100, 1000, 10000]
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    start: int
+    duration: int
+    thread_id: int
+    thread_name: str
+    args: dict = field(default_factory=dict)
+
+
+class Tracer:
+    '''
+    Records timing spans to a ring buffer, dumped as Chrome trace JSON (chrome://tracing, Perfetto) or
+    summarized as duration histograms. Recording is disabled until enable is called, spans are then nearly free.
+    '''
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.enabled = False
+        self.spans: deque[Span] = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter_ns()
+
+    def enable(self, capacity: int | None = None):
+        if capacity and capacity != self.spans.maxlen:
+            with self.lock:
+                self.spans = deque(self.spans, maxlen=capacity)
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self.lock:
+            self.spans.clear()
+
+    @contextmanager
+    def span(self, name: str, category: str = 'default', **args):
+        if not self.enabled:
+            yield args
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter_ns() - start
+            thread = threading.current_thread()
+            with self.lock:
+                self.spans.append(
+                    Span(
+                        name=name,
+                        category=category,
+                        start=start - self.origin,
+                        duration=duration,
+                        thread_id=thread.ident,
+                        thread_name=thread.name,
+                        args=args,
+                    )
+                )
+
+    def trace(self, category: str = 'default', name: str | None = None) -> Callable:
+        '''
+        Decorator recording a span for every call of the function, or until the coroutine completes.
+        '''
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            if inspect.iscoroutinefunction(func):
+
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name, category):
+                        return await func(*args, **kwargs)
+
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, category):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def get_spans(self) -> List[Span]:
+        with self.lock:
+            return list(self.spans)
+
+    def save_chrome_trace(self, file_path: str):
+        spans = self.get_spans()
+        events = []
+        for thread_id, thread_name in {span.thread_id: span.thread_name for span in spans}.items():
+            events.append(
+                {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread_id, 'args': {'name': thread_name}}
+            )
+        for span in spans:
+            events.append(
+                {
+                    'name': span.name,
+                    'cat': span.category,
+                    'ph': 'X',
+                    'ts': span.start / 1000,
+                    'dur': span.duration / 1000,
+                    'pid': os.getpid(),
+                    'tid': span.thread_id,
+                    'args': {key: str(value) for key, value in span.args.items()},
+                }
+            )
+        with open(file_path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def summary(self) -> dict:
+        '''
+        Returns count, total, mean, p50, p90, max in ms and a histogram per category and span name.
+        '''
+        durations: dict[tuple, list] = {}
+        for span in self.get_spans():
+            durations.setdefault((span.category, span.name), []).append(span.duration / 1e6)
+        summary = {}
+        for key, values in sorted(durations.items()):
+            values.sort()
+            histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+            for value in values:
+                histogram[next((i for i, edge in enumerate(HISTOGRAM_BUCKETS_MS) if value < edge), -1)] += 1
+            summary[key] = {
+                'count': len(values),
+                'total': sum(values),
+                'mean': sum(values) / len(values),
+                'p50': values[int(0.5 * (len(values) - 1))],
+                'p90': values[int(0.9 * (len(values) - 1))],
+                'max': values[-1],
+                'histogram': histogram,
+            }
+        return summary
+
+    def format_summary(self) -> str:
+        edges = [f'<{edge:g}' for edge in HISTOGRAM_BUCKETS_MS] + [f'>={HISTOGRAM_BUCKETS_MS[-1]:g}']
+        lines = [
+            f'{"span":<40}{"n":>6}{"total":>11}{"mean":>10}{"p50":>10}{"p90":>10}{"max":>10}  '
+            + ' '.join(f'{edge:>6}' for edge in edges)
+        ]
+        for (category, name), stats in self.summary().items():
+            lines.append(
+                f'{category + ":" + name:<40}{stats["count"]:>6}{stats["total"]:>11.1f}{stats["mean"]:>10.2f}'
+                f'{stats["p50"]:>10.2f}{stats["p90"]:>10.2f}{stats["max"]:>10.2f}  '
+                + ' '.join(f'{count:>6}' for count in stats['histogram'])
+            )
+        lines.append('Times in ms, histogram buckets in ms')
+        return '\n'.join(lines)
+
+
+tracer = Tracer()
+span = tracer.span
+trace = tracer.trace
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_nrfutil(tmp_path, monkeypatch):
+    '''
+    Puts bench/fake_nrfutil.py first on PATH as nrfutil, with its device memory kept in tmp_path.
+    '''
+    from bench.run_benchmarks import install_fake_nrfutil
+
+    monkeypatch.setenv('PATH', os.environ['PATH'])
+    monkeypatch.setenv('FAKE_NRFUTIL_ATTACH', '0')
+    monkeypatch.setenv('FAKE_NRFUTIL_OP', '0')
+    state = tmp_path / 'nrfutil_state'
+    state.mkdir()
+    monkeypatch.setenv('FAKE_NRFUTIL_STATE', str(state))
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    install_fake_nrfutil(str(bin_dir))
+    return monkeypatch
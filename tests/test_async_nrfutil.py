@@ -0,0 +1,65 @@
+import asyncio
+import time
+import pytest
+from src.modules.firmware_cache import FirmwareCache
+from src.modules.intel_hex import IntelHex
+from src.modules.nrfutil_wrapper import AsyncAPI, Core, NrfutilLowVoltageError
+import src.modules.nrfutil_wrapper as nrfutil
+
+SNRS = ['1000000001', '1000000002', '1000000003']
+
+
+@pytest.fixture
+def debuggers(fake_nrfutil):
+    fake_nrfutil.setenv('FAKE_NRFUTIL_SNRS', ','.join(SNRS))
+    return [int(snr) for snr in SNRS]
+
+
+def test_concurrent_device_versions(debuggers):
+    async def detect():
+        return await asyncio.gather(*(AsyncAPI(snr).get_device_version() for snr in debuggers))
+
+    assert asyncio.run(detect()) == ['NRF52840_xxAA_REV3'] * len(debuggers)
+
+
+def test_no_executor(debuggers, monkeypatch):
+    def run_in_executor(*args):
+        raise AssertionError('nrfutil must not run on an executor thread')
+
+    monkeypatch.setattr(asyncio.BaseEventLoop, 'run_in_executor', run_in_executor)
+
+    async def detect():
+        return await AsyncAPI().get_debuggers()
+
+    assert asyncio.run(detect()) == debuggers
+
+
+def test_fatal_error_stops_process(debuggers, fake_nrfutil):
+    fake_nrfutil.setenv('FAKE_NRFUTIL_LOW_VOLTAGE', SNRS[0])
+    fake_nrfutil.setenv('FAKE_NRFUTIL_TIMEOUT', '10')
+    start = time.perf_counter()
+    with pytest.raises(NrfutilLowVoltageError):
+        asyncio.run(AsyncAPI(debuggers[0]).reset())
+    assert time.perf_counter() - start < 5
+
+
+def test_session_writes_and_cache(debuggers, tmp_path):
+    image = IntelHex()
+    for offset in range(0, 64, 4):
+        image.write_word(offset, 0x12345678 + offset)
+    image.save(str(tmp_path / 'app.hex'))
+    testfw = [nrfutil.TestFW(str(tmp_path / 'app.hex'), Core.APPLICATION)]
+    cache = FirmwareCache(path=None)
+
+    async def flash():
+        debugger = AsyncAPI(debuggers[0])
+        async with debugger.session():
+            first = await debugger.program(testfw, cache)
+            await debugger.write_words({0x10001080: 0x0, 0x10001084: 0x1})
+        second = await debugger.program(testfw, cache)
+        return first, second, await debugger.read_words(0x10001080, 2), await debugger.read(0x4)
+
+    first, second, words, word = asyncio.run(flash())
+    assert not first[0].skipped and second[0].skipped
+    assert words == [0x0, 0x1]
+    assert word == 0x1234567C
@@ -0,0 +1,27 @@
+from argparse import ArgumentParser
+from src.cli import cli
+import src.core.logic as core
+
+
+def parse(*argv):
+    parser = ArgumentParser()
+    cli.add_subcommands(parser)
+    return parser.parse_args(argv)
+
+
+def test_missing_nrfutil(tmp_path, monkeypatch):
+    monkeypatch.setenv('PATH', str(tmp_path))
+    assert cli.execute(parse('debuggers')) == 1
+
+
+def test_unknown_device(monkeypatch):
+    def detect_device(snr):
+        raise KeyError('nRF00000')
+
+    monkeypatch.setattr(core, 'detect_device', detect_device)
+    assert cli.execute(parse('detect', '-s', '1000')) == 1
+
+
+def test_debuggers(fake_nrfutil, capsys):
+    assert cli.execute(parse('debuggers')) == 0
+    assert capsys.readouterr().out.split()
@@ -0,0 +1,95 @@
+import time
+import pytest
+from bench.fake_usb_backend import FakeBackend, FakeDongle, ESB_ATTEMPTS
+from src.modules import rf_test_dongle_api
+from src.modules.rf_test_dongle_api import API, RFTestDongleError, CMD_FIRMWARE_VERSION, PROTOCOL_V2
+import usb.core
+
+
+class LateDongle(FakeDongle):
+    '''
+    Holds back the protocol v2 responses while late is set, to release them after the host gave up.
+    '''
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.late = False
+        self.held = []
+
+    def handle_frames(self, data: bytes):
+        super().handle_frames(data)
+        if self.late:
+            self.held.append(self.in_queue.pop())
+
+    def release(self):
+        with self.lock:
+            self.in_queue.extend(self.held)
+            self.held.clear()
+            self.lock.notify_all()
+
+
+@pytest.fixture(params=[(1, 6, 0), (1, 5, 0)], ids=['tx records', 'polled'])
+def dongle(request, monkeypatch):
+    monkeypatch.setattr(rf_test_dongle_api, 'firmware_versions', {(1, 1): request.param})
+    monkeypatch.setattr(rf_test_dongle_api, 'RESPONSE_TIMEOUT', 0.1)
+    fake = LateDongle()
+    api = API(backend=FakeBackend([fake]))
+    assert api.protocol == PROTOCOL_V2
+    yield fake, api
+    api.close()
+
+
+def test_late_response_is_dropped(dongle):
+    fake, api = dongle
+    fake.late = True
+    with pytest.raises((RFTestDongleError, usb.core.USBError)):
+        api.command(CMD_FIRMWARE_VERSION)
+    fake.late = False
+    fake.release()
+    for _ in range(3):
+        assert api.command(CMD_FIRMWARE_VERSION).payload == bytes(rf_test_dongle_api.parse_version('1.6.0'))
+
+
+def test_dut_never_acks(monkeypatch):
+    monkeypatch.setattr(rf_test_dongle_api, 'firmware_versions', {(1, 1): (1, 6, 0)})
+    fake = FakeDongle()
+    fake.dut_present = False
+    with API(backend=FakeBackend([fake])) as api:
+        start = time.monotonic()
+        assert not api.send_cmd(timeout=0.05, resend_interval=0.005)
+        assert time.monotonic() - start < 0.5
+        assert not api.last_tx.acked and api.last_tx.attempts == ESB_ATTEMPTS
+        assert api.ack_latency is None
+        # The record of a resend arrives after the command gave up, with the sequence number of the next frame
+        # like after the numbers wrapped
+        time.sleep(0.02)
+        seq = (api.codec.seq + 1) & 0xFF
+        fake.push_tx_record(seq, False, time.monotonic() + 0.001)
+        deadline = time.monotonic() + 1
+        while seq not in [record.seq for record in api.tx_records.queue] and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert seq in [record.seq for record in api.tx_records.queue]
+        fake.dut_present = True
+        assert api.send_cmd()
+        assert api.last_tx.acked and api.last_tx.attempts == 1
+        assert api.tx_records.empty()
+
+
+def test_one_session_per_dongle(monkeypatch):
+    monkeypatch.setattr(rf_test_dongle_api, 'firmware_versions', {(1, 1): (1, 6, 0)})
+    monkeypatch.setattr(rf_test_dongle_api, 'sessions', {})
+    monkeypatch.setattr(
+        rf_test_dongle_api, 'session_backend', FakeBackend([FakeDongle(), FakeDongle(serial='FAKE0002', address=2)])
+    )
+    session = rf_test_dongle_api.get_session()
+    try:
+        assert rf_test_dongle_api.get_session('FAKE0001') is session
+        assert session.get_dongle_version() == '1.6.0'
+        assert rf_test_dongle_api.get_session('1-1') is session
+        assert rf_test_dongle_api.get_session('FAKE0002') is not session
+        assert len(rf_test_dongle_api.sessions) == 2
+        with pytest.raises(RFTestDongleError):
+            rf_test_dongle_api.get_session('FAKE0003')
+    finally:
+        for dongle_session in rf_test_dongle_api.sessions.values():
+            dongle_session.close()
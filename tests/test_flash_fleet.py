@@ -0,0 +1,96 @@
+import os
+import threading
+from contextlib import contextmanager
+import pytest
+import src.core.logic as core
+from src.modules.firmware_cache import FirmwareCache
+from src.modules.nrfutil_wrapper import NrfutilLowVoltageError, ProgramResult, VerifyType
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNRS = [1000000001, 1000000002, 1000000003, 1000000004]
+
+
+class StubNrfutil:
+    '''
+    Stands in for the nrfutil API, programming blocks on barrier until all devices program at the same time.
+    '''
+
+    failing: set[int] = set()
+    barrier: threading.Barrier | None = None
+    programmed: dict[int, list] = {}
+
+    def __init__(self, snr: int | None = None):
+        self.snr = snr
+
+    @contextmanager
+    def session(self):
+        yield self
+
+    def program(self, hex_files, cache=None, verify: VerifyType = VerifyType.READ):
+        if self.barrier:
+            self.barrier.wait()
+        if self.snr in self.failing:
+            raise NrfutilLowVoltageError(f'{self.snr}: LOW_VOLTAGE')
+        self.programmed[self.snr] = hex_files
+        return [ProgramResult(file=file, verify=verify) for file in hex_files]
+
+    def read_words(self, addr: int, count: int, core=None):
+        return [0xFFFFFFFF] * count
+
+    def write_words(self, words, core=None):
+        pass
+
+    def erase(self, type=None, core=None):
+        pass
+
+    def reset(self, type=None, core=None):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.chdir(REPO_DIR)
+    monkeypatch.setattr(core, 'Nrfutil', StubNrfutil)
+    monkeypatch.setattr(core, 'firmware_cache', FirmwareCache(path=None))
+    monkeypatch.setattr(core, 'detect_device', lambda snr, refresh=False: 'NRF5340')
+    monkeypatch.setattr(StubNrfutil, 'failing', set())
+    monkeypatch.setattr(StubNrfutil, 'barrier', None)
+    monkeypatch.setattr(StubNrfutil, 'programmed', {})
+    return StubNrfutil
+
+
+def test_devices_flash_in_parallel(stub):
+    stub.barrier = threading.Barrier(len(SNRS), timeout=5)
+    results = core.flash_fleet('', snrs=SNRS)
+    assert [result.snr for result in results] == SNRS
+    assert all(result.success and result.error is None for result in results)
+    assert sorted(stub.programmed) == SNRS
+
+
+def test_failing_device_does_not_stop_the_others(stub):
+    stub.failing = {SNRS[1]}
+    results = core.flash_fleet('', snrs=SNRS)
+    assert [result.snr for result in results] == SNRS
+    assert [result.success for result in results] == [True, False, True, True]
+    assert 'NrfutilLowVoltageError' in results[1].error and not results[1].programmed
+    assert sorted(stub.programmed) == [SNRS[0], SNRS[2], SNRS[3]]
+
+
+def test_aggregated_results(stub, monkeypatch):
+    monkeypatch.setattr(core, 'detect_device', lambda snr, refresh=False: 'NRF5340' if snr != SNRS[3] else 'NRF0000')
+    results = core.flash_fleet('', snrs=SNRS, max_workers=2)
+    for result in results[:3]:
+        assert result.device == 'NRF5340' and result.success and result.duration > 0
+        assert sorted(program.file.core.name for program in result.programmed) == ['APPLICATION', 'NETWORK']
+        assert not any(program.skipped for program in result.programmed)
+    # Unknown devices are reported in the result of their SNR
+    assert results[3].device == 'NRF0000' and not results[3].success and 'KeyError' in results[3].error
+
+
+def test_invalid_fem_config(stub):
+    results = core.flash_fleet('', {'pinPDN': 'x'}, snrs=SNRS[:2])
+    assert [(result.snr, result.success, result.error) for result in results] == [
+        (SNRS[0], False, 'Invalid FEM config'),
+        (SNRS[1], False, 'Invalid FEM config'),
+    ]
+    assert not stub.programmed
@@ -0,0 +1,107 @@
+import pytest
+from src.modules.rf_test_dongle_api import (
+    FrameCodec,
+    Frame,
+    FrameStatus,
+    Response,
+    RFTestDongleError,
+    FRAME_HEADER,
+    RESPONSE_HEADER,
+    PROTOCOL_V2_HEADER,
+    MAX_PACKET_SIZE,
+    CMD_FIRMWARE_VERSION,
+    CMD_SEND_PACKET,
+    CMD_SET_TARGET,
+)
+
+
+def parse_frames(packet: bytes) -> list[tuple[int, int, bytes]]:
+    '''
+    Splits a request packet into (seq, cmd, payload) like the dongle firmware.
+    '''
+    assert packet[0] == PROTOCOL_V2_HEADER
+    frames = []
+    offset = 1
+    while offset < len(packet):
+        length, seq, cmd = FRAME_HEADER.unpack_from(packet, offset)
+        offset += FRAME_HEADER.size
+        frames.append((seq, cmd, packet[offset : offset + length]))
+        offset += length
+    return frames
+
+
+def respond(packet: bytes, payloads: dict[int, bytes] = {}) -> bytes:
+    response = bytearray([PROTOCOL_V2_HEADER])
+    for seq, cmd, _ in parse_frames(packet):
+        payload = payloads.get(cmd, b'')
+        response += RESPONSE_HEADER.pack(len(payload), seq, cmd, FrameStatus.OK.value) + payload
+    return bytes(response)
+
+
+def test_round_trip():
+    codec = FrameCodec()
+    frames = [Frame(CMD_SET_TARGET, bytes(4)), Frame(CMD_SEND_PACKET, bytes(range(7))), Frame(CMD_FIRMWARE_VERSION)]
+    [(packet, packed)] = codec.encode(frames)
+    assert packed == frames
+    assert parse_frames(packet) == [(frame.seq, frame.cmd, frame.payload) for frame in frames]
+    responses = FrameCodec.decode(respond(packet, {CMD_FIRMWARE_VERSION: bytes([1, 6, 0])}))
+    assert [(response.seq, response.cmd) for response in responses] == [(frame.seq, frame.cmd) for frame in frames]
+    assert all(response.status == FrameStatus.OK for response in responses)
+    assert responses[-1].payload == bytes([1, 6, 0])
+
+
+def test_sequence_numbers_wrap():
+    codec = FrameCodec()
+    codec.seq = 0xFE
+    frames = [Frame(CMD_SEND_PACKET) for _ in range(3)]
+    codec.encode(frames)
+    assert [frame.seq for frame in frames] == [0xFF, 0, 1]
+
+
+def test_frames_are_split_over_packets():
+    frames = [Frame(CMD_SEND_PACKET, bytes(20)) for _ in range(3)]
+    packets = FrameCodec().encode(frames)
+    assert len(packets) == 2
+    assert all(len(packet) <= MAX_PACKET_SIZE for packet, _ in packets)
+    assert [frame for _, packed in packets for frame in packed] == frames
+
+
+def test_oversized_frame():
+    with pytest.raises(RFTestDongleError):
+        FrameCodec().encode([Frame(CMD_SEND_PACKET, bytes(MAX_PACKET_SIZE))])
+
+
+@pytest.mark.parametrize('packet', [b'', bytes([0x00, 0, 1, CMD_SEND_PACKET, 0]), bytes([0xA3, 0, 1, 11, 0])])
+def test_bad_header(packet):
+    with pytest.raises(RFTestDongleError):
+        FrameCodec.decode(packet)
+
+
+def test_unknown_status():
+    with pytest.raises(RFTestDongleError):
+        FrameCodec.decode(bytes([PROTOCOL_V2_HEADER]) + RESPONSE_HEADER.pack(0, 1, CMD_SEND_PACKET, 0xEE))
+
+
+def test_truncated_response():
+    packet = (
+        bytes([PROTOCOL_V2_HEADER]) + RESPONSE_HEADER.pack(3, 1, CMD_FIRMWARE_VERSION, FrameStatus.OK.value) + b'\x01'
+    )
+    with pytest.raises(RFTestDongleError):
+        FrameCodec.decode(packet)
+
+
+@pytest.mark.parametrize(
+    'sent, answered, stale',
+    [
+        (10, [9], True),
+        (10, [10], False),
+        (10, [11], False),
+        (2, [255], True),
+        (10, [100], False),
+        (10, [200], True),
+        (10, [], False),
+    ],
+)
+def test_stale_responses(sent, answered, stale):
+    responses = [Response(seq, CMD_FIRMWARE_VERSION, FrameStatus.OK, b'') for seq in answered]
+    assert FrameCodec.is_stale(responses, [Frame(CMD_FIRMWARE_VERSION, seq=sent)]) == stale
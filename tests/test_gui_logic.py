@@ -0,0 +1,30 @@
+import asyncio
+from src.modules.rf_test_dongle_api import RadioConfig
+import src.core.logic as core
+import src.gui.logic as gui_logic
+
+
+def radio_config() -> RadioConfig:
+    return RadioConfig(
+        first_channel='40',
+        last_channel='42',
+        radio_power='0',
+        data_rate='BLE 1 Mbit',
+        rf_cmd='RX sweep',
+        fem_config='0',
+        usb_cmd='0',
+    )
+
+
+def test_gui_tests_use_command_windows(monkeypatch):
+    calls = []
+
+    async def start(*args, **kwargs):
+        calls.append(kwargs)
+        return True
+
+    monkeypatch.setattr(core, 'start_test_async', start)
+    monkeypatch.setattr(core, 'start_hop_sweep_async', start)
+    asyncio.run(gui_logic.start_rf_test(radio_config()))
+    asyncio.run(gui_logic.start_hop_sweep(radio_config(), '', 10))
+    assert [call.get('command_windows') for call in calls] == [True, True]
@@ -0,0 +1,78 @@
+import pytest
+from src.modules.intel_hex import IntelHex, IntelHexError, _record
+from src.modules.nrfutil_wrapper import Core
+import src.modules.nrfutil_wrapper as nrfutil
+from src.core.logic import merge_uicr_config
+
+
+def write_hex(path, records: list[str]) -> str:
+    path.write_text('\n'.join(records + [_record(0, 0x01, b'')]) + '\n')
+    return str(path)
+
+
+def test_adjacent_records_form_one_segment(tmp_path):
+    file_path = write_hex(
+        tmp_path / 'image.hex', [_record(0x0000, 0x00, bytes(range(16))), _record(0x0010, 0x00, b'\xaa')]
+    )
+    assert IntelHex.from_file(file_path).segments() == [(0, bytes(range(16)) + b'\xaa')]
+
+
+def test_gap_splits_segments(tmp_path):
+    file_path = write_hex(
+        tmp_path / 'image.hex',
+        [
+            _record(0x0000, 0x00, b'\x01\x02'),
+            _record(0x0000, 0x04, b'\x10\x00'),
+            _record(0x0000, 0x00, b'\x03'),
+        ],
+    )
+    assert IntelHex.from_file(file_path).segments() == [(0, b'\x01\x02'), (0x10000000, b'\x03')]
+
+
+def test_overlapping_records_with_the_same_data(tmp_path):
+    file_path = write_hex(
+        tmp_path / 'image.hex', [_record(0x0000, 0x00, b'\x01\x02\x03\x04'), _record(0x0002, 0x00, b'\x03\x04\x05')]
+    )
+    assert IntelHex.from_file(file_path).segments() == [(0, b'\x01\x02\x03\x04\x05')]
+
+
+def test_overlapping_records_with_different_data(tmp_path):
+    file_path = write_hex(
+        tmp_path / 'image.hex', [_record(0x0000, 0x00, b'\x01\x02\x03\x04'), _record(0x0002, 0x00, b'\xff')]
+    )
+    with pytest.raises(IntelHexError):
+        IntelHex.from_file(file_path)
+
+
+def test_save_round_trip_across_64k(tmp_path):
+    image = IntelHex()
+    for index in range(8):
+        image.write_word(0xFFF0 + 4 * index, index)
+    image.start_address = 0x1234
+    image.save(str(tmp_path / 'image.hex'), record_size=32)
+    loaded = IntelHex.from_file(str(tmp_path / 'image.hex'))
+    assert loaded.data == image.data
+    assert loaded.start_address == 0x1234
+
+
+def test_merge_overrides_image_words(tmp_path):
+    image = IntelHex()
+    image.write_word(0x0000, 0x20001000)
+    image.write_word(0x10001080, 0x00000000)
+    image.save(str(tmp_path / 'app.hex'))
+    testfw = [
+        nrfutil.TestFW(str(tmp_path / 'app.hex'), Core.APPLICATION),
+        nrfutil.TestFW(str(tmp_path / 'net.hex'), Core.NETWORK),
+    ]
+    out_dir = tmp_path / 'out'
+    out_dir.mkdir()
+
+    merged = merge_uicr_config(testfw, {Core.APPLICATION: {0x10001080: 0x12345678, 0x10001084: 0x1}}, str(out_dir))
+
+    assert merged[1] == testfw[1]
+    assert merged[0].core == Core.APPLICATION and merged[0].file_path != testfw[0].file_path
+    result = IntelHex.from_file(merged[0].file_path)
+    assert result.read_word(0x0000) == 0x20001000
+    assert result.read_word(0x10001080) == 0x12345678
+    assert result.read_word(0x10001084) == 0x1
+    assert [addr for addr, _ in result.segments()] == [0x0000, 0x10001080]
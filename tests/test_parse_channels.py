@@ -0,0 +1,29 @@
+import pytest
+from src.core.logic import parse_channels, RFTestException
+
+
+@pytest.mark.parametrize(
+    'text, channels',
+    [
+        ('2, 26, 40-44, 80', [2, 26, 40, 41, 42, 43, 44, 80]),
+        ('80-78,2', [80, 79, 78, 2]),
+        ('5-5', [5]),
+        ('0,100', [0, 100]),
+        (' 1 ,, 2 ,', [1, 2]),
+        ('', []),
+    ],
+)
+def test_parse_channels(text, channels):
+    assert parse_channels(text) == channels
+
+
+@pytest.mark.parametrize('text', ['a', '1,b', '1-', '-5', '1-2-3', '1.5', '0x10', '2;3', '1 2'])
+def test_malformed_items(text):
+    with pytest.raises(RFTestException):
+        parse_channels(text)
+
+
+@pytest.mark.parametrize('text', ['101', '0-101', '200-1', '0-100000'])
+def test_channels_out_of_range(text):
+    with pytest.raises(RFTestException):
+        parse_channels(text)
@@ -0,0 +1,47 @@
+import pytest
+from src.core.rx_stats import RxStatsBuffer, packet_losses
+from src.modules.rf_test_dongle_api import RxStatsRecord, RX_STATS_RECORD
+
+
+def record(channel: int, packets: int, pattern_errors: int, crc_errors: int, window_ms: int = 100) -> RxStatsRecord:
+    return RxStatsRecord(0, 1, channel, 0, window_ms, packets, pattern_errors, crc_errors)
+
+
+def test_record_from_bytes():
+    data = RX_STATS_RECORD.pack(1, 3, 40, 2, 100, 90, 4, 7)
+    assert RxStatsRecord.from_bytes(data) == RxStatsRecord(1, 3, 40, 2, 100, 90, 4, 7)
+
+
+def test_mixed_errors_without_expected_rate():
+    buffer = RxStatsBuffer(16)
+    # 80 intact, 10 with a wrong pattern and 20 with a CRC error out of 110 received packets
+    buffer.append([record(2, packets=90, pattern_errors=10, crc_errors=20)])
+    lost, total = packet_losses(buffer.values())
+    assert lost.tolist() == [30] and total.tolist() == [110]
+    assert buffer.per_channel()['per'][0] == pytest.approx(30 / 110)
+
+
+def test_mixed_errors_with_expected_rate():
+    buffer = RxStatsBuffer(16)
+    # 1000 packets/s for 100 ms, 80 received intact
+    buffer.append([record(2, packets=90, pattern_errors=10, crc_errors=20)], expected_rate=1000)
+    lost, total = packet_losses(buffer.values())
+    assert lost.tolist() == [20] and total.tolist() == [100]
+
+
+def test_mostly_crc_errors_stay_below_one():
+    buffer = RxStatsBuffer(16)
+    buffer.append(
+        [record(5, packets=10, pattern_errors=2, crc_errors=50), record(5, packets=0, pattern_errors=0, crc_errors=8)]
+    )
+    stats = buffer.per_channel()
+    assert stats['per'][0] == pytest.approx(60 / 68)
+    assert stats['per_min'][0] == pytest.approx(52 / 60)
+    assert stats['per_max'][0] == pytest.approx(1)
+    assert stats['crc_errors'][0] == 58 and stats['pattern_errors'][0] == 2
+
+
+def test_more_intact_packets_than_expected():
+    buffer = RxStatsBuffer(16)
+    buffer.append([record(7, packets=120, pattern_errors=0, crc_errors=3)], expected_rate=1000)
+    assert buffer.per_channel()['per'][0] == 0
@@ -0,0 +1,63 @@
+import pytest
+from src.core.test_plan import load_test_plan, TestStep as Step, DEFAULT_DWELL
+from src.modules.rf_test_exception import RFTestException
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_csv_plan(tmp_path):
+    path = write(tmp_path, 'plan.csv', 'mode,channel,power,dwell\nModulated TX,2,4,0.5\nRX,,,\n')
+    assert load_test_plan(path) == [
+        Step(mode='Modulated_TX', channel=2, power=4, dwell=0.5),
+        Step(mode='RX'),
+    ]
+
+
+def test_yaml_steps_and_matrix(tmp_path):
+    text = 'dwell: 2\nsteps:\n  - mode: RX\nmatrix:\n  mode: Modulated TX\n  channel: [2, 80]\n  power: [0, 4]\n'
+    steps = load_test_plan(write(tmp_path, 'plan.yaml', text))
+    assert steps[0] == Step(mode='RX', dwell=2.0)
+    assert [(step.channel, step.power) for step in steps[1:]] == [(2, 0), (2, 4), (80, 0), (80, 4)]
+    assert all(step.mode == 'Modulated_TX' and step.dwell == 2.0 for step in steps[1:])
+
+
+def test_empty_yaml_plan(tmp_path):
+    assert load_test_plan(write(tmp_path, 'plan.yaml', '')) == []
+
+
+def test_default_dwell(tmp_path):
+    assert load_test_plan(write(tmp_path, 'plan.yaml', 'steps:\n  - mode: RX\n'))[0].dwell == DEFAULT_DWELL
+
+
+@pytest.mark.parametrize(
+    'name, text',
+    [
+        ('plan.csv', 'mode,speed\nRX,3\n'),
+        ('plan.csv', 'mode,channel\nRX,2,3\n'),
+        ('plan.csv', 'mode,channel\nRX,two\n'),
+        ('plan.csv', 'mode,dwell\nRX,long\n'),
+        ('plan.csv', 'channel\n2\n'),
+        ('plan.csv', 'mode\nTX\n'),
+        ('plan.csv', 'mode,data_rate\nRX,BLE 3 Mbit\n'),
+        ('plan.yaml', 'steps: [\n'),
+        ('plan.yaml', '- mode: RX\n'),
+        ('plan.yaml', 'steps: RX\n'),
+        ('plan.yaml', 'steps:\n  - RX\n'),
+        ('plan.yaml', 'steps:\n  - channel: 2\n'),
+        ('plan.yaml', 'steps:\n  - mode: RX\n    power: [1, 2]\n'),
+        ('plan.yaml', 'matrix: [RX]\n'),
+        ('plan.yaml', 'matrix:\n  mode: RX\n  channel: [2, x]\n'),
+    ],
+)
+def test_invalid_plan(tmp_path, name, text):
+    with pytest.raises(RFTestException):
+        load_test_plan(write(tmp_path, name, text))
+
+
+def test_missing_plan(tmp_path):
+    with pytest.raises(RFTestException):
+        load_test_plan(str(tmp_path / 'missing.yaml'))
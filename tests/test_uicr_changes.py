@@ -0,0 +1,70 @@
+from src.core.logic import get_uicr_changes, read_uicr_words, UicrChanges
+from src.modules.device_cache import DeviceCache
+from src.modules.firmware_cache import FirmwareCache
+from src.modules.nrfutil_wrapper import API as Nrfutil, EraseType
+
+LOAD_CAP = 0x10001080
+FEM_CONFIG = 0x10001084
+ESB_CONFIG = 0x10001090
+
+
+def test_matching_config_has_no_changes():
+    words = {LOAD_CAP: 0x12, FEM_CONFIG: 0x0A0B0C0D}
+    assert get_uicr_changes(dict(words), words) == UicrChanges()
+
+
+def test_erased_words_are_written():
+    changes = get_uicr_changes({LOAD_CAP: 0xFFFFFFFF, FEM_CONFIG: 0xFFFFFFFF}, {LOAD_CAP: 0x12, FEM_CONFIG: 0x34})
+    assert changes.writes == {LOAD_CAP: 0x12, FEM_CONFIG: 0x34}
+    assert changes.erase == {}
+
+
+def test_only_clearing_bits_is_written():
+    changes = get_uicr_changes({LOAD_CAP: 0xFF00FF00}, {LOAD_CAP: 0x0F000F00})
+    assert changes.writes == {LOAD_CAP: 0x0F000F00}
+    assert changes.erase == {}
+
+
+def test_setting_a_bit_needs_an_erase():
+    changes = get_uicr_changes({LOAD_CAP: 0x12, FEM_CONFIG: 0xFFFFFFFF}, {LOAD_CAP: 0x13, FEM_CONFIG: 0x01})
+    assert changes.erase == {LOAD_CAP: 0x13}
+    assert changes.writes == {FEM_CONFIG: 0x01}
+
+
+def test_unread_words_are_treated_as_erased():
+    changes = get_uicr_changes({}, {ESB_CONFIG: 0x00002801})
+    assert changes.writes == {ESB_CONFIG: 0x00002801}
+    assert changes.erase == {}
+
+
+class FakeDebugger:
+    def __init__(self, memory: dict[int, int]):
+        self.memory = memory
+        self.reads = []
+
+    def read_words(self, addr, count, core):
+        self.reads.append((addr, count))
+        return [self.memory.get(addr + 4 * index, 0xFFFFFFFF) for index in range(count)]
+
+
+def test_config_words_are_read_in_one_range():
+    debugger = FakeDebugger({LOAD_CAP: 0x12, ESB_CONFIG: 0x2801})
+    words = read_uicr_words(debugger, [ESB_CONFIG, LOAD_CAP, FEM_CONFIG], None)
+    assert words == {LOAD_CAP: 0x12, FEM_CONFIG: 0xFFFFFFFF, ESB_CONFIG: 0x2801}
+    assert debugger.reads == [(LOAD_CAP, 5)]
+
+
+def test_uicr_erase_keeps_firmware_cache(fake_nrfutil):
+    firmware_cache = FirmwareCache(path=None)
+    device_cache = DeviceCache()
+    fake_nrfutil.setattr(Nrfutil, 'invalidate_callbacks', [])
+    fake_nrfutil.setattr(Nrfutil, 'uicr_invalidate_callbacks', [])
+    Nrfutil.register_invalidate_callback(firmware_cache.invalidate)
+    Nrfutil.register_invalidate_callback(device_cache.invalidate, uicr=True)
+    for cache in (firmware_cache.images, device_cache.devices):
+        cache['1000000001'] = {'APPLICATION': {}}
+    Nrfutil(1000000001).erase(EraseType.UICR)
+    assert '1000000001' in firmware_cache.images
+    assert '1000000001' not in device_cache.devices
+    Nrfutil(1000000001).erase(EraseType.ALL)
+    assert '1000000001' not in firmware_cache.images